@@ -0,0 +1,49 @@
+"""
+Micro-benchmarks for hot paths in the domain model.
+
+Each module can be run on its own, e.g.:
+    python -m benchmarks.bench_tracking_state_machine
+"""
+import timeit
+
+
+def measure(func, number=10000, repeat=5):
+    """
+    Return the best time per call, in microseconds, of running func.
+    """
+    best = min(timeit.repeat(func, number=number, repeat=repeat))
+    return best / number * 1e6
+
+
+def report(label, value):
+    print("{0:<50} {1:>12.2f}".format(label, value))
+
+
+def deep_sizeof(obj, seen=None):
+    """
+    Approximate the memory, in bytes, held by obj and everything it references.
+    Classes and modules are shared and not counted, functions are counted but their code is not followed.
+    """
+    import sys
+    import types
+
+    seen = seen if seen is not None else set()
+    if id(obj) in seen or isinstance(obj, (type, types.ClassType, types.ModuleType)):
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, types.FunctionType):
+        return size
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.iteritems())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(v, seen) for v in obj)
+
+    if hasattr(obj, "__dict__"):
+        size += deep_sizeof(obj.__dict__, seen)
+    for cls in type(obj).__mro__:
+        for name in cls.__dict__.get("__slots__", ()):
+            if hasattr(obj, name):
+                size += deep_sizeof(getattr(obj, name), seen)
+    return size
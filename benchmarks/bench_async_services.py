@@ -0,0 +1,68 @@
+"""
+Benchmark creating orders against repositories with simulated I/O latency,
+one at a time through OrderingService and concurrently through AsyncOrderingService.
+"""
+import time
+
+from benchmarks import report
+from benchmarks.bench_ordering_service import build_service, build_batch
+from domain.shared.concurrency import AsyncExecutor, StripedLockTable
+from domain.service.async_services import AsyncOrderingService
+
+ORDERS = 200
+LATENCY = 0.002
+
+
+class SlowRepository(object):
+    """
+    Wraps a repository so that every lookup takes LATENCY seconds, as if it went to a database.
+    """
+
+    def __init__(self, repository):
+        self.repository = repository
+
+    def find(self, *key):
+        time.sleep(LATENCY)
+        return self.repository.find(*key)
+
+    def __getattr__(self, name):
+        return getattr(self.repository, name)
+
+
+def build_slow_service():
+    service, repositories = build_service()
+    # Orders are created from many threads, so inventory items must be locked
+    service.locks = StripedLockTable()
+    for sku, inventory_item in repositories["inventory"].entities.iteritems():
+        inventory_item.lock = service.locks.lock_for(sku)
+    service.customer_repository = SlowRepository(service.customer_repository)
+    service.product_repository = SlowRepository(service.product_repository)
+    service.inventory_repository = SlowRepository(service.inventory_repository)
+    service.pricing_service.discount_repository = SlowRepository(service.pricing_service.discount_repository)
+    return service
+
+
+def main():
+    batch = build_batch()[:ORDERS]
+
+    service = build_slow_service()
+    start = time.time()
+    for customer, order_descriptors, customer_reference in batch:
+        service.create_order(customer, order_descriptors, customer_reference)
+    report("create_order() per order (ms)", (time.time() - start) / ORDERS * 1e3)
+
+    for workers in (1, 4):
+        executor = AsyncExecutor(workers=workers, lookup_workers=16)
+        service = AsyncOrderingService(build_slow_service(), executor)
+        start = time.time()
+        results = [service.create_order(customer, order_descriptors, customer_reference)
+                   for customer, order_descriptors, customer_reference in batch]
+        for result in results:
+            result.get()
+        report("async create_order(), {0} workers per order (ms)".format(workers),
+               (time.time() - start) / ORDERS * 1e3)
+        executor.close()
+
+
+if __name__ == "__main__":
+    main()
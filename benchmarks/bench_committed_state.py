@@ -0,0 +1,40 @@
+"""
+Benchmark memory and quantity() totals for a CommittedState and BackorderState with many open orders.
+"""
+from datetime import datetime, timedelta
+
+from benchmarks import deep_sizeof, measure, report
+from domain.model.inventory.tracking_state_machine import CommittedState, BackorderState
+
+ORDERS = 200000
+
+
+def main():
+    start = datetime.now()
+    committed = CommittedState("Committed")
+    backorders = BackorderState("Backorder")
+
+    for n in xrange(ORDERS):
+        order_id = "ORD{0:06d}".format(n)
+        date = start + timedelta(seconds=n)
+        committed.track({"quantity": 2, "unverified_quantity": 1 if n % 1000 == 0 else 0,
+                         "order_id": order_id, "date": date})
+        backorders.track({"quantity": 2, "allocated": 0, "order_id": order_id, "date": date})
+
+    report("Committed bytes per open commitment (bytes)", deep_sizeof(committed) / float(ORDERS))
+    report("Backorder bytes per open backorder (bytes)", deep_sizeof(backorders) / float(ORDERS))
+    report("CommittedState.quantity() (us)", measure(committed.quantity, number=10))
+    report("BackorderState.quantity() (us)", measure(backorders.quantity, number=10))
+    report("CommittedState.get(order_id) (us)", measure(lambda: committed.get("ORD000123"), number=10000))
+    report("CommittedState.is_verified(order_id) (us)",
+           measure(lambda: committed.is_verified("ORD000123"), number=10))
+    report("CommittedState.get_unverified() (us)", measure(committed.get_unverified, number=10))
+
+    # A count of nothing leaves every commitment unverified, the worst case for is_verified of a verified order
+    committed.verify({"quantity": 0})
+    report("is_verified(order_id), all unverified (us)", measure(lambda: committed.is_verified("ORD999999"),
+                                                                  number=10))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark CommittedState.verify after a stock count with many open commitments,
+tracked in date order and shuffled, and again after a short count has already made most of them unverified.
+"""
+import copy
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks import report
+from domain.model.inventory.tracking_state_machine import CommittedState
+
+COMMITMENTS = 100000
+
+
+def timed_verify(state, quantity, repeat=3):
+    best = None
+    for _ in xrange(repeat):
+        scratch = copy.deepcopy(state)
+        start = time.time()
+        scratch.verify({"quantity": quantity})
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e6
+
+
+def build(days):
+    start = datetime.now()
+    committed = CommittedState("Committed")
+    for n in days:
+        committed.track({"quantity": 2, "unverified_quantity": 1 if n % 100 == 0 else 0,
+                         "order_id": "ORD{0:06d}".format(n), "date": start + timedelta(minutes=n)})
+    return committed
+
+
+def main():
+    in_order = range(COMMITMENTS)
+    shuffled = list(in_order)
+    random.Random(0).shuffle(shuffled)
+
+    for label, days in (("in date order", in_order), ("shuffled", shuffled)):
+        start = time.time()
+        committed = build(days)
+        report("track() {0} per commitment (us)".format(label), (time.time() - start) / COMMITMENTS * 1e6)
+
+        total = committed.quantity()
+        report("verify() full count, {0} (us)".format(label), timed_verify(committed, total))
+        report("verify() 10% short count, {0} (us)".format(label), timed_verify(committed, int(total * 0.9)))
+        report("verify() count of 10, {0} (us)".format(label), timed_verify(committed, 10))
+
+        committed.verify({"quantity": 10})
+        report("verify() count of 10 again, {0} (us)".format(label), timed_verify(committed, 10))
+
+
+if __name__ == "__main__":
+    main()
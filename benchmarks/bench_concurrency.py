@@ -0,0 +1,78 @@
+"""
+Stress test creating multi-SKU orders from many threads against shared inventory items,
+with and without striped locks, reporting throughput, stock which was oversold and orders
+which were only partly committed because another thread changed an item between reserve and commit.
+"""
+import random
+import sys
+import threading
+import time
+
+from benchmarks import report
+from benchmarks.bench_ordering_service import build_service
+from domain.shared.concurrency import StripedLockTable
+from domain.model.inventory.inventory_items import InventoryItem
+from domain.model.inventory.tracking_state_machine import TransitionValidationError
+from domain.service.ordering_service import OrderingService
+
+ORDERS_PER_THREAD = 1000
+THREADS = (1, 2, 4, 8)
+
+
+def build_batch(seed):
+    rand = random.Random(seed)
+    return [("Customer {0}".format(rand.randrange(10)),
+             [("PROD{0:03d}".format(rand.randrange(20)), rand.randint(1, 3)) for _ in xrange(rand.randint(1, 4))])
+            for _ in xrange(ORDERS_PER_THREAD)]
+
+
+def run(threads, locks):
+    service, repositories = build_service()
+    inventory = repositories["inventory"].entities
+
+    # Little enough stock that orders compete for it
+    stock = dict((sku, 200) for sku in inventory)
+    for sku in stock:
+        inventory[sku] = InventoryItem(sku, lock=locks.lock_for(sku) if locks else None)
+        inventory[sku].enter_stock_on_hand(stock[sku])
+
+    service = OrderingService(service.customer_repository, service.product_repository, service.order_repository,
+                              service.inventory_repository, service.pricing_service, locks=locks)
+    batches = [build_batch(seed) for seed in xrange(threads)]
+    torn = []
+
+    def create_orders(batch):
+        for customer, order_descriptors in batch:
+            try:
+                service.create_order(customer, order_descriptors)
+            except TransitionValidationError:
+                torn.append(customer)
+            except Exception:
+                pass
+
+    workers = [threading.Thread(target=create_orders, args=(batch,)) for batch in batches]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - start
+
+    oversold = sum(max(0, inventory[sku].quantity_committed() - stock[sku]) for sku in stock)
+    return threads * ORDERS_PER_THREAD / elapsed, oversold, len(torn)
+
+
+def main():
+    # Switch threads as often as possible to expose races
+    sys.setcheckinterval(1)
+
+    for label, locks in (("striped locks", StripedLockTable), ("no locks", lambda: None)):
+        for threads in THREADS:
+            orders_per_second, oversold, torn = run(threads, locks())
+            report("{0} threads, {1} (orders/s)".format(threads, label), orders_per_second)
+            report("{0} threads, {1} oversold (units)".format(threads, label), oversold)
+            report("{0} threads, {1} partly committed (orders)".format(threads, label), torn)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark importing customer master data, each customer with an address and 2 contacts, into a file backed
+SQLite database: storing and committing each customer, storing in a UnitOfWork and with insert_many.
+Each is timed per customer and scaled up to an import of 100k customers.
+"""
+import os
+import shutil
+import tempfile
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks import report
+from domain.model.customer.address import Address
+from domain.model.customer.contact import Contact
+from domain.model.customer.customer import Customer
+from infrastructure.persistence import metadata, create_engine
+from infrastructure.persistence.customer_repository import CustomerRepository
+from infrastructure.persistence.unit_of_work import UnitOfWork
+
+IMPORT_SIZE = 100000
+BATCH_SIZE = 1000
+
+
+def build_customers(count, start):
+    customers = []
+    for n in xrange(start, start + count):
+        customer = Customer("Customer {0}".format(n), "GRADE-A", "GST")
+        customer.add_address(Address("1 Street St", None, "Suburb", "2000", "NSW", "BILLING", "Australia"))
+        for role in ("SALES", "ACCOUNTS"):
+            contact = Contact("First", "Last", "first.last@example.com")
+            contact.add_role(role)
+            contact.add_phone("OFFICE", "+6129000000")
+            customer.add_contact(contact)
+        customers.append(customer)
+    return customers
+
+
+def run(session, label, count, start, import_customers):
+    customers = build_customers(count, start)
+
+    begin = time.time()
+    import_customers(customers)
+    elapsed = time.time() - begin
+
+    session.expunge_all()
+    report("{0} per customer (us)".format(label), elapsed / count * 1e6)
+    report("{0} {1}k customers (s)".format(label, IMPORT_SIZE / 1000), elapsed / count * IMPORT_SIZE)
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        engine = create_engine("sqlite:///{0}".format(os.path.join(directory, "import.db")))
+        metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+
+        repository = CustomerRepository(session)
+
+        def store_each(customers):
+            for customer in customers:
+                repository.store(customer)
+
+        def store_in_unit_of_work(customers):
+            with UnitOfWork(session, batch_size=BATCH_SIZE) as unit_of_work:
+                batched = CustomerRepository(session, unit_of_work=unit_of_work)
+                for customer in customers:
+                    batched.store(customer)
+
+        def insert_many(customers):
+            for start in xrange(0, len(customers), BATCH_SIZE):
+                repository.insert_many(customers[start:start + BATCH_SIZE])
+
+        run(session, "store() commit each", 1000, 0, store_each)
+        run(session, "store() unit of work", 10000, 1000, store_in_unit_of_work)
+        run(session, "insert_many()", IMPORT_SIZE, 11000, insert_many)
+        session.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
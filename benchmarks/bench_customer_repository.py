@@ -0,0 +1,86 @@
+"""
+Benchmark listing customers with their addresses and contacts from an in-memory SQLite database of 10k customers,
+one at a time and with find_many, under each loading profile, counting the queries each makes.
+"""
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks import report
+from infrastructure.persistence import metadata, create_engine
+from infrastructure.persistence.models import customer, address, contact, contact_roles, \
+    contact_roles_association, contact_phones
+from infrastructure.persistence.customer_repository import CustomerRepository
+
+CUSTOMERS = 10000
+CONTACTS_PER_CUSTOMER = 2
+ONE_AT_A_TIME = 1000
+
+
+def build_database():
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+
+    with engine.begin() as connection:
+        connection.execute(contact_roles.insert(), [{"id": 1, "role": "SALES"}, {"id": 2, "role": "ACCOUNTS"}])
+        connection.execute(customer.insert(), [
+            {"id": n, "name": "Customer {0}".format(n), "discount_tier": "GRADE-A", "tax_category": "GST"}
+            for n in xrange(CUSTOMERS)])
+        connection.execute(address.insert(), [
+            {"customer_id": n, "type": "BILLING", "line1": "1 Street St", "suburb": "Suburb", "postcode": "2000",
+             "state": "NSW", "country": "Australia"} for n in xrange(CUSTOMERS)])
+
+        contacts = [(n * CONTACTS_PER_CUSTOMER + c, n) for n in xrange(CUSTOMERS) for c in xrange(CONTACTS_PER_CUSTOMER)]
+        connection.execute(contact.insert(), [
+            {"id": contact_id, "customer_id": customer_id, "firstname": "First", "lastname": "Last",
+             "email": "first.last@example.com"} for contact_id, customer_id in contacts])
+        connection.execute(contact_roles_association.insert(), [
+            {"contact_id": contact_id, "contact_roles_id": 1 + contact_id % 2} for contact_id, _ in contacts])
+        connection.execute(contact_phones.insert(), [
+            {"contact_id": contact_id, "type": phone, "number": "+6129000000"}
+            for contact_id, _ in contacts for phone in ("OFFICE", "MOBILE")])
+
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(1))
+    return engine, queries
+
+
+def use_all_details(customer_entity):
+    for contact_entity in customer_entity.contacts:
+        contact_entity.has_role("SALES")
+        contact_entity.get_phone("OFFICE")
+    return len(customer_entity.addresses)
+
+
+def run(engine, queries, label, find_customers, count):
+    session = sessionmaker(bind=engine)()
+    repository = CustomerRepository(session)
+    del queries[:]
+
+    start = time.time()
+    for customer_entity in find_customers(repository):
+        use_all_details(customer_entity)
+    elapsed = time.time() - start
+
+    report("{0} per customer (us)".format(label), elapsed / count * 1e6)
+    report("{0} queries per 1000 customers".format(label), len(queries) * 1000.0 / count)
+    session.close()
+
+
+def main():
+    engine, queries = build_database()
+    names = ["Customer {0}".format(n) for n in xrange(CUSTOMERS)]
+
+    for profile in ("lazy", "joined"):
+        run(engine, queries, "find() {0}".format(profile),
+            lambda repository: [repository.find(name, profile=profile) for name in names[:ONE_AT_A_TIME]],
+            ONE_AT_A_TIME)
+
+    for profile in ("lazy", "joined", "subquery"):
+        run(engine, queries, "find_many() {0}".format(profile),
+            lambda repository: repository.find_many(names, profile=profile).values(), CUSTOMERS)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark a morning dispatch run, creating a delivery for each of 2000 customers one at a time and with
+plan_deliveries, counting the repository lookups each makes, each of which takes LATENCY seconds as if it
+went to a database.
+"""
+import random
+import time
+from datetime import datetime
+
+from benchmarks import report
+from benchmarks.bench_ordering_service import CountingRepository
+from domain.shared.concurrency import AsyncExecutor
+from domain.model.customer.customer import Customer
+from domain.model.inventory.inventory_items import InventoryItem
+from domain.model.sales.order import Order
+from domain.service.delivery_service import DeliveryService
+
+CUSTOMERS = 2000
+ORDERS_PER_CUSTOMER = 3
+SKUS = 200
+LATENCY = 0.0001
+
+
+class SlowRepository(CountingRepository):
+
+    def find(self, *key):
+        time.sleep(LATENCY)
+        return super(SlowRepository, self).find(*key)
+
+    def find_many(self, keys):
+        time.sleep(LATENCY)
+        return super(SlowRepository, self).find_many(keys)
+
+
+def build_service():
+    rand = random.Random(0)
+    now = datetime.now()
+
+    inventory = {}
+    for n in xrange(SKUS):
+        sku = "PROD{0:03d}".format(n)
+        inventory[sku] = InventoryItem(sku)
+        inventory[sku].enter_stock_on_hand(CUSTOMERS * ORDERS_PER_CUSTOMER * 20)
+
+    customers = {}
+    orders = {}
+    customer_order_map = {}
+    for n in xrange(CUSTOMERS):
+        customer = "Customer {0}".format(n)
+        customers[customer] = Customer(customer, "GRADE-A")
+        customer_order_map[customer] = []
+        for _ in xrange(ORDERS_PER_CUSTOMER):
+            order = Order("ORD{0:06d}".format(len(orders)), customer, now)
+            for sku in rand.sample(sorted(inventory), 3):
+                quantity = rand.randint(1, 5)
+                order.add_line_item(sku, quantity, 10.00, 0.0)
+                inventory[sku].commit(quantity, order.order_id)
+            orders[order.order_id] = order
+            customer_order_map[customer].append(order.order_id)
+
+    repositories = {
+        "customer": SlowRepository(customers),
+        "order": SlowRepository(orders),
+        "inventory": SlowRepository(inventory),
+    }
+    service = DeliveryService(repositories["customer"], repositories["order"], repositories["inventory"])
+    return service, repositories, customer_order_map
+
+
+def main():
+    service, repositories, customer_order_map = build_service()
+
+    start = time.time()
+    for customer, order_ids in customer_order_map.iteritems():
+        service.create_delivery(customer, order_ids)
+    report("create_delivery() per customer (us)", (time.time() - start) / CUSTOMERS * 1e6)
+    report("create_delivery() repository lookups", sum(r.lookups for r in repositories.values()))
+
+    executor = AsyncExecutor(workers=4, lookup_workers=1)
+    for label, plan_executor in (("inline", None), ("4 workers", executor)):
+        for repository in repositories.values():
+            repository.lookups = 0
+        start = time.time()
+        service.plan_deliveries(customer_order_map, executor=plan_executor)
+        report("plan_deliveries() {0} per customer (us)".format(label), (time.time() - start) / CUSTOMERS * 1e6)
+        report("plan_deliveries() {0} repository lookups".format(label),
+               sum(r.lookups for r in repositories.values()))
+    executor.close()
+
+
+if __name__ == "__main__":
+    main()
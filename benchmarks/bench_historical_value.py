@@ -0,0 +1,60 @@
+"""
+Benchmark a HistoricalValueCollection of 100k daily prices: building it, in date order and shuffled,
+finding the price at a date and finding every price in a range,
+and the current price of a product with that history.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks import measure, report
+from domain.model.product.price_value import PriceValue
+from domain.model.product.product import Product
+from domain.shared.historical_value import HistoricalValueCollection
+
+POINTS = 100000
+RANGE_DAYS = 30
+
+
+def build(values):
+    collection = HistoricalValueCollection()
+    start = time.time()
+    for value in values:
+        collection.append(value)
+    # Any values appended out of order are only sorted in by the first query
+    collection.at_date(values[0].date)
+    return collection, (time.time() - start) / len(values) * 1e6
+
+
+def main():
+    first = datetime(1800, 1, 1)
+    values = [PriceValue(float(n), first + timedelta(days=n)) for n in xrange(POINTS)]
+    shuffled = values[:]
+    random.Random(0).shuffle(shuffled)
+
+    collection, per_append = build(values)
+    report("append in date order (us)", per_append)
+    _, per_append = build(shuffled)
+    report("append shuffled (us)", per_append)
+
+    rand = random.Random(1)
+    dates = [first + timedelta(days=rand.randrange(POINTS), hours=12) for _ in xrange(1000)]
+
+    def at_dates():
+        for date in dates:
+            collection.at_date(date)
+    report("at_date (us)", measure(at_dates, number=10) / len(dates))
+
+    def in_ranges():
+        for date in dates:
+            collection.in_range(date, date + timedelta(days=RANGE_DAYS))
+    report("in_range {0} days (us)".format(RANGE_DAYS), measure(in_ranges, number=10) / len(dates))
+
+    product = Product("PROD001", "Product", values[0])
+    product.price_history = collection
+    report("Product.get_price() current (us)", measure(product.get_price))
+    report("Product.get_price(date) (us)", measure(lambda: product.get_price(dates[0])))
+
+
+if __name__ == "__main__":
+    main()
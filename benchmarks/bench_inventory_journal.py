@@ -0,0 +1,47 @@
+"""
+Benchmark journalling movements on an InventoryItem and rebuilding it from a long journal.
+"""
+import time
+
+from benchmarks import deep_sizeof, measure, report
+from domain.model.inventory.inventory_items import InventoryItem
+from domain.model.inventory.inventory_journal import InventoryJournal
+
+HISTORY = (10000, 100000, 1000000)
+SNAPSHOT_INTERVAL = 1000
+
+
+def timed_rebuild(journal, repeat=3):
+    best = None
+    for _ in xrange(repeat):
+        start = time.time()
+        InventoryItem.rebuild("PROD001", journal)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e6
+
+
+def main():
+    item = InventoryItem("PROD001")
+    report("enter_stock_on_hand() without journal (us)", measure(lambda: item.enter_stock_on_hand(1)))
+
+    item = InventoryItem("PROD001", journal=InventoryJournal(snapshot_interval=max(HISTORY) + 1))
+    report("enter_stock_on_hand() with journal (us)", measure(lambda: item.enter_stock_on_hand(1)))
+    report("Bytes per journal entry (bytes)", deep_sizeof(item.journal.entries) / float(len(item.journal)))
+
+    item = InventoryItem("PROD001", journal=InventoryJournal(snapshot_interval=SNAPSHOT_INTERVAL))
+    unsnapshotted = InventoryItem("PROD001", journal=InventoryJournal(snapshot_interval=max(HISTORY) + 1))
+    for movements in HISTORY:
+        while len(item.journal) < movements:
+            item.enter_stock_on_hand(1)
+        report("rebuild() from {0} movements (us)".format(movements), timed_rebuild(item.journal))
+
+        if movements <= 100000:
+            while len(unsnapshotted.journal) < movements:
+                unsnapshotted.enter_stock_on_hand(1)
+            report("rebuild() from {0} movements, no snapshot (us)".format(movements),
+                   timed_rebuild(unsnapshotted.journal, repeat=1))
+
+
+if __name__ == "__main__":
+    main()
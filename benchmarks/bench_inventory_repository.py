@@ -0,0 +1,50 @@
+"""
+Benchmark storing an inventory item with a long history of fulfillments after one more order is fulfilled,
+in an in-memory SQLite database, counting the rows each store writes.
+"""
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks import report
+from domain.model.inventory.inventory_items import InventoryItem
+from infrastructure.persistence import metadata, create_engine
+from infrastructure.persistence.inventory_repository import InventoryRepository
+
+HISTORY = (1000, 10000)
+
+
+def main():
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    repository = InventoryRepository(session)
+
+    written = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, parameters, context, executemany:
+                 written.append(len(parameters) if executemany else 1))
+
+    for fulfillments in HISTORY:
+        sku = "PROD{0}".format(fulfillments)
+        item = InventoryItem(sku)
+        item.enter_stock_on_hand(fulfillments + 1)
+        for n in xrange(fulfillments + 1):
+            item.commit(1, "ORD{0:06d}".format(n))
+        for n in xrange(fulfillments):
+            item.fulfill_commitment(1, "ORD{0:06d}".format(n), "INV{0:06d}".format(n))
+        repository.store(item)
+
+        item = repository.find(sku)
+        item.fulfill_commitment(1, "ORD{0:06d}".format(fulfillments), "INV{0:06d}".format(fulfillments))
+
+        del written[:]
+        start = time.time()
+        repository.store(item)
+        report("store() after 1 fulfillment, {0} history (us)".format(fulfillments), (time.time() - start) * 1e6)
+        report("store() after 1 fulfillment, {0} history (statements + rows)".format(fulfillments), sum(written))
+
+
+if __name__ == "__main__":
+    main()
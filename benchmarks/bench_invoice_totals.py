@@ -0,0 +1,52 @@
+"""
+Benchmark month-end reporting over a large set of invoices: totalling every invoice line by line,
+and totalling by customer with InvoiceLines.
+"""
+import random
+from datetime import datetime
+
+from benchmarks import measure, report
+from domain.model.sales.invoice import Invoice
+from domain.model.sales.invoice_lines import InvoiceLines
+
+INVOICES = 20000
+LINES_PER_INVOICE = 10
+
+
+def build_invoices():
+    rand = random.Random(0)
+    now = datetime.now()
+    invoices = []
+    for n in xrange(INVOICES):
+        invoice = Invoice("INV{0:06d}".format(n), "Customer {0}".format(rand.randrange(100)), now)
+        for _ in xrange(LINES_PER_INVOICE):
+            invoice.add_line_item("PROD{0:03d}".format(rand.randrange(200)), rand.randint(1, 10),
+                                  rand.uniform(1, 100), rand.choice([0.0, 0.1, 0.2]),
+                                  tax_rate=rand.choice([None, 0.1, 0.2]))
+        invoices.append(invoice)
+    return invoices
+
+
+def main():
+    invoices = build_invoices()
+    lines = INVOICES * LINES_PER_INVOICE
+
+    def invoice_methods():
+        totals = {}
+        for invoice in invoices:
+            subtotal, tax, total = totals.get(invoice.customer, (0.00, 0.00, 0.00))
+            totals[invoice.customer] = (subtotal + invoice.subtotal(), tax + invoice.tax(),
+                                        total + invoice.total_amount())
+        return totals
+
+    report("Invoice methods by customer per line (us)", measure(invoice_methods, number=1, repeat=3) / lines)
+    report("InvoiceLines.aggregate by customer per line (us)",
+           measure(lambda: InvoiceLines.aggregate(invoices, "customer"), number=1, repeat=3) / lines)
+
+    invoice_lines = InvoiceLines(invoices)
+    report("InvoiceLines.totals_by customer per line (us)",
+           measure(lambda: invoice_lines.totals_by("customer"), number=1, repeat=3) / lines)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark invoicing a 300 order delivery for one customer, counting the repository lookups it makes.
+"""
+import random
+import time
+from datetime import datetime
+
+from benchmarks import report
+from benchmarks.bench_ordering_service import CountingRepository
+from domain.model.customer.customer import Customer
+from domain.model.delivery.delivery import Delivery
+from domain.model.inventory.inventory_items import InventoryItem
+from domain.model.pricing.tax_rate import TaxRate
+from domain.model.sales.order import Order
+from domain.service.invoicing_service import InvoicingService
+
+ORDERS = 300
+SKUS = 50
+
+
+def build_service():
+    rand = random.Random(0)
+    now = datetime.now()
+
+    inventory = {}
+    for n in xrange(SKUS):
+        sku = "PROD{0:03d}".format(n)
+        inventory[sku] = InventoryItem(sku)
+        inventory[sku].enter_stock_on_hand(ORDERS * 10)
+
+    orders = {}
+    delivery = Delivery("DEL001", "Customer", now)
+    for n in xrange(ORDERS):
+        order = Order("ORD{0:04d}".format(n), "Customer", now)
+        for sku in rand.sample(sorted(inventory), 3):
+            quantity = rand.randint(1, 5)
+            order.add_line_item(sku, quantity, 10.00, 0.1)
+            inventory[sku].commit(quantity, order.order_id)
+            delivery.add_item(sku, quantity, order.order_id)
+            delivery.adjust_deliver_quantity(sku, quantity, order.order_id)
+        order.acknowledge(now)
+        orders[order.order_id] = order
+
+    repositories = {
+        "customer": CountingRepository({"Customer": Customer("Customer", "GRADE-A", tax_category="GST")}),
+        "invoice": CountingRepository({}),
+        "order": CountingRepository(orders),
+        "inventory": CountingRepository(inventory),
+        "tax_rate": CountingRepository({"GST": TaxRate("GST", 0.1)}),
+    }
+    service = InvoicingService(repositories["customer"], repositories["invoice"], repositories["order"],
+                               repositories["inventory"], repositories["tax_rate"])
+    return service, repositories, delivery
+
+
+def main():
+    service, repositories, delivery = build_service()
+
+    start = time.time()
+    service.invoice_delivery(delivery)
+    elapsed = time.time() - start
+
+    report("invoice_delivery() {0} orders (ms)".format(ORDERS), elapsed * 1e3)
+    for name in ("customer", "tax_rate", "order", "inventory"):
+        report("invoice_delivery() {0} lookups".format(name), repositories[name].lookups)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark creating an EDI-sized batch of orders one at a time and with create_orders,
+counting the repository lookups each makes.
+"""
+import itertools
+import random
+import time
+from datetime import datetime
+
+from benchmarks import report
+from domain.model.customer.customer import Customer
+from domain.model.inventory.inventory_items import InventoryItem
+from domain.model.pricing.discount import Discount
+from domain.model.product.price_value import PriceValue
+from domain.model.product.product import Product
+from domain.service.ordering_service import OrderingService
+from domain.service.pricing_service import PricingService
+
+ORDERS = 5000
+SKUS = 200
+CUSTOMERS = 100
+
+
+class CountingRepository(object):
+    """
+    An in-memory repository which counts the lookups made on it.
+    """
+
+    def __init__(self, entities):
+        self.entities = entities
+        self.lookups = 0
+        self.ids = itertools.count(1)
+
+    def find(self, *key):
+        self.lookups += 1
+        return self.entities.get(key[0] if len(key) == 1 else key)
+
+    def find_many(self, keys):
+        self.lookups += 1
+        return dict((key, self.entities[key]) for key in keys if key in self.entities)
+
+    def store_many(self, entities):
+        pass
+
+    def next_id(self):
+        return "ORD{0:06d}".format(next(self.ids))
+
+
+def build_service():
+    now = datetime.now()
+    skus = ["PROD{0:03d}".format(n) for n in xrange(SKUS)]
+    categories = ["MANF-{0}".format(c) for c in "ABCD"]
+
+    products = dict((sku, Product(sku, sku, PriceValue(10.00, now), categories[n % len(categories)]))
+                    for n, sku in enumerate(skus))
+    customers = dict(("Customer {0}".format(n), Customer("Customer {0}".format(n), "GRADE-A"))
+                     for n in xrange(CUSTOMERS))
+    discounts = dict(((category, "GRADE-A"), Discount(0.1, category, "GRADE-A")) for category in categories)
+
+    inventory = {}
+    for sku in skus:
+        inventory[sku] = InventoryItem(sku)
+        inventory[sku].enter_stock_on_hand(ORDERS * 10)
+
+    repositories = {
+        "customer": CountingRepository(customers),
+        "product": CountingRepository(products),
+        "order": CountingRepository({}),
+        "inventory": CountingRepository(inventory),
+        "discount": CountingRepository(discounts),
+    }
+    service = OrderingService(repositories["customer"], repositories["product"], repositories["order"],
+                              repositories["inventory"], PricingService(repositories["discount"]))
+    return service, repositories
+
+
+def build_batch():
+    rand = random.Random(0)
+    return [("Customer {0}".format(rand.randrange(CUSTOMERS)),
+             [("PROD{0:03d}".format(rand.randrange(SKUS)), rand.randint(1, 3)) for _ in xrange(rand.randint(1, 5))],
+             None)
+            for _ in xrange(ORDERS)]
+
+
+def main():
+    batch = build_batch()
+
+    service, repositories = build_service()
+    start = time.time()
+    for customer, order_descriptors, customer_reference in batch:
+        service.create_order(customer, order_descriptors, customer_reference)
+    elapsed = time.time() - start
+    report("create_order() per order (us)", elapsed / ORDERS * 1e6)
+    report("create_order() repository lookups per order", sum(r.lookups for r in repositories.values()) / float(ORDERS))
+
+    service, repositories = build_service()
+    start = time.time()
+    service.create_orders(batch)
+    elapsed = time.time() - start
+    report("create_orders() per order (us)", elapsed / ORDERS * 1e6)
+    report("create_orders() repository lookups per order",
+           sum(r.lookups for r in repositories.values()) / float(ORDERS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark pricing order lines with and without the discount cache, counting the repository lookups each makes,
+and pricing a whole catalogue for every tier one product at a time and with price_list.
+"""
+import time
+from datetime import datetime
+
+from benchmarks import measure, report
+from benchmarks.bench_ordering_service import CountingRepository
+from domain.model.customer.customer import Customer
+from domain.model.pricing.discount import Discount
+from domain.model.product.price_value import PriceValue
+from domain.model.product.product import Product
+from domain.service.pricing_service import PricingService
+
+CATEGORIES = ["MANF-{0}".format(c) for c in "ABCDEFGH"]
+TIERS = ["GRADE-{0}".format(c) for c in "ABCD"]
+CALLS = 10000
+CATALOGUE = 20000
+
+
+def main():
+    discounts = dict(((category, tier), Discount(0.1, category, tier)) for category in CATEGORIES for tier in TIERS)
+    products = [Product(category, category, PriceValue(10.00, None), category) for category in CATEGORIES]
+    customers = [Customer(tier, tier) for tier in TIERS]
+    lines = [(products[n % len(products)], customers[n % len(customers)]) for n in xrange(CALLS)]
+
+    for label, cache_size in (("uncached", 0), ("cached", 1024)):
+        repository = CountingRepository(discounts)
+        service = PricingService(repository, discount_cache_size=cache_size)
+
+        def price_lines():
+            for product, customer in lines:
+                service.get_customer_discount(product, customer)
+
+        report("{0} per discount (us)".format(label), measure(price_lines, number=1, repeat=5) / CALLS)
+        report("{0} repository lookups per discount".format(label), repository.lookups / (5.0 * CALLS))
+
+    repository = CountingRepository(discounts)
+    repository.find_all = lambda: discounts.values()
+    since = datetime(2000, 1, 1)
+    catalogue = [Product("PROD{0:06d}".format(n), "", PriceValue(1.00 + n % 100, since), CATEGORIES[n % len(CATEGORIES)])
+                 for n in xrange(CATALOGUE)]
+
+    service = PricingService(repository, discount_cache_size=1024)
+    start = time.time()
+    for product in catalogue:
+        price = product.get_price()
+        [price * (1 - service.get_customer_discount(product, customer)) for customer in customers]
+    report("price each product per product (us)", (time.time() - start) / CATALOGUE * 1e6)
+
+    start = time.time()
+    for chunk in service.price_list(catalogue, chunk_size=1000):
+        pass
+    report("price_list() per product (us)", (time.time() - start) / CATALOGUE * 1e6)
+
+
+if __name__ == "__main__":
+    main()
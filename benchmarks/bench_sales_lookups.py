@@ -0,0 +1,39 @@
+"""
+Benchmark finding the line items of a 5k line order by SKU, and adjusting every item of a 5k item delivery
+as a warehouse picker would.
+"""
+import time
+from datetime import datetime
+
+from benchmarks import report
+from domain.model.delivery.delivery import Delivery
+from domain.model.sales.order import Order
+
+LINES = 5000
+
+
+def main():
+    now = datetime.now()
+    skus = ["PROD{0:05d}".format(n) for n in xrange(LINES)]
+
+    order = Order("ORD001", "Customer", now)
+    for sku in skus:
+        order.add_line_item(sku, 1, 10.00, 0.00)
+
+    start = time.time()
+    for sku in skus:
+        order.get_line_items_for_sku(sku)
+    report("Order.get_line_items_for_sku {0} lines (us)".format(LINES), (time.time() - start) / LINES * 1e6)
+
+    delivery = Delivery("DEL001", "Customer", now)
+    for n, sku in enumerate(skus):
+        delivery.add_item(sku, 2, "ORD{0:03d}".format(n % 100))
+
+    start = time.time()
+    for n, sku in enumerate(skus):
+        delivery.adjust_deliver_quantity(sku, 1, "ORD{0:03d}".format(n % 100))
+    report("Delivery.adjust_deliver_quantity {0} items (us)".format(LINES), (time.time() - start) / LINES * 1e6)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""
+Benchmark constructing and validating TrackingItems, which happens twice on every transition.
+"""
+from datetime import datetime
+
+from benchmarks import measure, report
+from domain.model.inventory.tracking_state_machine import OnHandState, CommittedState, FulfilledState
+
+
+def main():
+    now = datetime.now()
+    committed = {"quantity": 1, "unverified_quantity": 0, "order_id": "ORD001", "date": now}
+    fulfilled = {"quantity": 1, "order_id": "ORD001", "invoice_id": "INV001", "date": now}
+
+    report("OnHandItem construct + validate (us)",
+           measure(lambda: OnHandState.OnHandItem({"quantity": 1}).validate(), number=100000))
+    report("CommittedItem construct + validate (us)",
+           measure(lambda: CommittedState.CommittedItem(committed).validate(), number=100000))
+    report("FulfilledItem construct + validate (us)",
+           measure(lambda: FulfilledState.FulfilledItem(fulfilled).validate(), number=100000))
+    report("CommittedItem export (us)",
+           measure(CommittedState.CommittedItem(committed).export, number=100000))
+
+
+if __name__ == "__main__":
+    main()
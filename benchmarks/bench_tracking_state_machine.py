@@ -0,0 +1,80 @@
+"""
+Benchmark the cost of a single transition through the TrackingStateMachine, and of a batch of 10 commits with
+transition_many against 10 transition() calls on a machine already tracking 50k commitments.
+Also benchmark an InventoryItem commit which backorders part of the order, again with 50k commitments.
+"""
+from datetime import datetime
+import itertools
+
+from benchmarks import measure, report
+from domain.model.inventory.inventory_items import InventoryItem
+from domain.model.inventory.tracking_state_machine import TrackingStateMachine, OnHandState, CommittedState
+
+COMMITMENTS = 50000
+BATCH = 10
+
+
+def build_machine():
+    machine = TrackingStateMachine()
+    machine.add_state(OnHandState("OnHand"))
+    machine.add_state(CommittedState("Committed"))
+    machine.add_transition("commit", "OnHand", "Committed")
+    machine.state("OnHand").track({"quantity": 10 ** 9})
+    return machine
+
+
+def main():
+    machine = build_machine()
+    now = datetime.now()
+
+    def commit(dry_run=None):
+        machine.transition("commit",
+                           {"quantity": 1},
+                           {"quantity": 1, "unverified_quantity": 0, "order_id": "ORD001", "date": now},
+                           dry_run=dry_run)
+
+    def prepare():
+        return machine.prepare("commit",
+                               {"quantity": 1},
+                               {"quantity": 1, "unverified_quantity": 0, "order_id": "ORD001", "date": now})
+
+    report("transition('commit') (us)", measure(commit, number=50000))
+    report("transition('commit', dry_run=True) (us)", measure(lambda: commit(dry_run=True), number=50000))
+    report("prepare('commit') then discard (us)", measure(prepare, number=50000))
+    report("prepare('commit') then apply (us)", measure(lambda: prepare().apply(), number=50000))
+
+    machine = build_machine()
+    for n in xrange(COMMITMENTS):
+        machine.transition("commit", {"quantity": 1},
+                           {"quantity": 1, "unverified_quantity": 0, "order_id": "OLD{0:06d}".format(n), "date": now})
+    order_ids = ("ORD{0:07d}".format(n) for n in itertools.count())
+
+    def batch():
+        return [("commit", {"quantity": 1}, {"quantity": 1, "unverified_quantity": 0, "order_id": next(order_ids),
+                                             "date": now}) for _ in xrange(BATCH)]
+
+    def one_at_a_time():
+        for name, from_item_dict, to_item_dict in batch():
+            machine.transition(name, from_item_dict, to_item_dict)
+
+    report("{0} x transition('commit'), {1} committed (us)".format(BATCH, COMMITMENTS),
+           measure(one_at_a_time, number=100))
+    report("transition_many({0} commits), {1} committed (us)".format(BATCH, COMMITMENTS),
+           measure(lambda: machine.transition_many(batch()), number=100))
+
+    item = InventoryItem("PROD001")
+    item.enter_stock_on_hand(COMMITMENTS)
+    for n in xrange(COMMITMENTS):
+        item.commit(1, "OLD{0:06d}".format(n))
+
+    def backordering_commit():
+        # Only 1 of the 2 is on hand, so the reservation both backorders and commits
+        item.enter_stock_on_hand(1)
+        item.commit(2, next(order_ids))
+
+    report("commit() with a backorder, {0} committed (us)".format(COMMITMENTS),
+           measure(backordering_commit, number=100))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,3 +4,10 @@ from domain.shared.repository import Repository
 class CustomerRepository(Repository):
     def find(self, customer_id):
         raise NotImplementedError()
+
+    def find_many(self, customer_ids):
+        """
+        Find many customers at once.
+        Returns a dict of customer ID to Customer, IDs without a customer are left out.
+        """
+        raise NotImplementedError()
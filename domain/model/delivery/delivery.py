@@ -7,6 +7,8 @@ class Delivery(Entity):
         self.customer = customer
         self.date = date
         self.items = []
+        # (SKU, order ID) to the first item added for them, kept in step with items by add_item
+        self._items_by_key = {}
         self.invoice_ids = []
 
     def is_finalised(self):
@@ -16,17 +18,16 @@ class Delivery(Entity):
         return len(self.invoice_ids) > 0
 
     def _find_item(self, sku, order_id):
-        for item in self.items:
-            if item["sku"] == sku and item["order_id"] == order_id:
-                return item
-        return None
+        return self._items_by_key.get((sku, order_id))
 
     def add_item(self, sku, quantity, order_id):
-        self.items.append({"sku": sku,
-                           "quantity": quantity,
-                           "deliver_quantity": 0,
-                           "order_id": order_id,
-                           })
+        item = {"sku": sku,
+                "quantity": quantity,
+                "deliver_quantity": 0,
+                "order_id": order_id,
+                }
+        self.items.append(item)
+        self._items_by_key.setdefault((sku, order_id), item)
 
     def adjust_deliver_quantity(self, sku, quantity, order_id):
         if self.is_finalised():
@@ -1,12 +1,15 @@
+from collections import namedtuple
 from datetime import datetime
 import operator
 
 from domain.shared.entity import Entity
+from domain.shared.concurrency import NullLock, synchronized
 
 from domain.model.inventory.tracking_state_machine import TrackingStateMachine, TransitionParameter
 from domain.model.inventory.tracking_state_machine import OnHandState, CommittedState, BackorderState, \
     FulfilledState, PurchaseOrderState, LostAndFoundState
-from domain.model.inventory.tracking_state_machine import TransitionValidationError
+from domain.model.inventory.tracking_state_machine import TransitionValidationError, apply_all, check_all
+from domain.model.inventory.inventory_journal import InventoryJournal
 
 
 class InventoryItem(Entity):
@@ -25,10 +28,22 @@ class InventoryItem(Entity):
     - Fulfill backorders -> commit for sale
     - Create purchase order for expected delivery of stock
     - Track lost & found stock
+
+    Every successful movement increments the item's version. An item given a journal also appends every movement to
+    it, so the item can be rebuilt, see InventoryJournal and rebuild. Journalling is off by default, it costs memory
+    for every movement and the journal is not persisted.
+
+    An item shared between threads must be given a lock, e.g. from a StripedLockTable keyed by SKU, which is held
+    for every movement. Movements made of several steps (e.g. commit) hold it throughout.
     """
 
-    def __init__(self, sku, on_hand_buffer=None):
+    def __init__(self, sku, on_hand_buffer=None, journal=None, lock=None, version=0):
         self.sku = sku
+        self.journal = journal
+        self.version = version
+        # The version a repository last found or stored this item at, None if it has never been stored
+        self.persisted_version = None
+        self.lock = lock if lock is not None else NullLock()
 
         # Minimum on hand quantity before we need to physically verify stock levels, off by default
         self.on_hand_buffer = on_hand_buffer if on_hand_buffer else 0
@@ -70,14 +85,82 @@ class InventoryItem(Entity):
         self.lost = self.tracker.state("Lost")
         self.found = self.tracker.state("Found")
 
-    def transition(self, *args, **kwargs):
-        self.tracker.transition(*args, **kwargs)
+    @classmethod
+    def rebuild(cls, sku, journal, on_hand_buffer=None, lock=None):
+        """
+        Rebuild an inventory item from its journal, by restoring the latest snapshot and replaying any later entries.
+        """
+        item = cls(sku, on_hand_buffer=on_hand_buffer, journal=journal, lock=lock)
+        if journal.snapshot is not None:
+            item.tracker.restore(journal.snapshot)
+
+        for entry in journal.entries_since(journal.snapshot_sequence):
+            item._replay(entry)
+
+        item.version = len(journal)
+        return item
+
+    def _replay(self, entry):
+        item_dicts = entry.item_dicts()
+        if entry.kind == InventoryJournal.TRACK:
+            self.tracker.state(entry.name).track(*item_dicts)
+        elif entry.kind == InventoryJournal.TRANSITION:
+            self.tracker.transition(entry.name, *item_dicts)
+        else:
+            self.tracker.action(entry.name, *item_dicts)()
+
+    def _record(self, kind, name, *item_dicts):
+        self.version += 1
+        if self.journal is not None:
+            self.journal.append(kind, name, *item_dicts)
+            if self.journal.snapshot_due():
+                self.journal.take_snapshot(self.tracker.snapshot())
+
+    @synchronized
+    def track(self, state, item_dict, dry_run=None):
+        self.tracker.state(state).track(item_dict, dry_run=dry_run)
+        # A state treats any dry_run given to track() as a dry run
+        if dry_run is None:
+            self._record(InventoryJournal.TRACK, state, item_dict)
+
+    @synchronized
+    def transition(self, name, from_item_dict, to_item_dict, dry_run=None):
+        # The tracker fills in any TransitionParameters, so keep the dicts as they were given
+        self.tracker.transition(name, dict(from_item_dict), dict(to_item_dict), dry_run=dry_run)
+        if not dry_run:
+            self._record(InventoryJournal.TRANSITION, name, from_item_dict, to_item_dict)
+
+    @synchronized
+    def action(self, name, args):
+        self.tracker.action(name, dict(args))()
+        self._record(InventoryJournal.ACTION, name, args)
+
+    @synchronized
+    def transition_many(self, movements, dry_run=None):
+        """
+        Apply a batch of (name, from_item_dict, to_item_dict) movements in one call.
+        Movements without a date share a single date for the whole batch.
+        Returns a validation result per movement, see TrackingStateMachine.transition_many.
+        """
+        now = datetime.now()
+        movements = [(name, _dated(from_item_dict, now), _dated(to_item_dict, now))
+                     for name, from_item_dict, to_item_dict in movements]
+        results = self.tracker.transition_many([(name, dict(from_item_dict), dict(to_item_dict))
+                                                for name, from_item_dict, to_item_dict in movements],
+                                               dry_run=dry_run)
+
+        if not dry_run:
+            for (name, from_item_dict, to_item_dict), result in zip(movements, results):
+                if result.succeeded():
+                    self._record(InventoryJournal.TRANSITION, name, from_item_dict, to_item_dict)
+
+        return results
 
     # On Hand methods
 
     def enter_stock_on_hand(self, quantity):
         try:
-            self.on_hand.track({"quantity": quantity})
+            self.track("OnHand", {"quantity": quantity})
         except TransitionValidationError:
             return False
 
@@ -99,40 +182,69 @@ class InventoryItem(Entity):
     def quantity_committed(self):
         return self.committed.quantity()
 
+    @synchronized
     def commit(self, quantity, order_id, dry_run=None):
-        result = True
-        effective_quantity = self.effective_quantity_on_hand()
+        reservation = self.reserve(quantity, order_id)
+        if reservation is None:
+            return False
 
-        backordered_quantity = max(0, quantity - effective_quantity)
-        if backordered_quantity > 0:
-            try:
-                # Create a backorder for quantity we know is impossible to commit
-                self.backorders.track({"quantity": backordered_quantity,
-                                       "date": datetime.now(),
-                                       "order_id": order_id},
-                                      dry_run=dry_run)
-            except TransitionValidationError:
-                result = False
-
-        # Short circuit, we know we cannot commit anything
-        if backordered_quantity == quantity:
-            return result
-
-        maximum_committable_quantity = quantity - backordered_quantity
-        maximum_verified_quantity = max(0, effective_quantity - self.on_hand_buffer)
-        verified_quantity = min(maximum_verified_quantity, maximum_committable_quantity)
-        unverified_quantity = max(0, maximum_committable_quantity - maximum_verified_quantity)
+        if not dry_run:
+            self.commit_reservation(reservation)
+        return True
+
+    @synchronized
+    def reserve(self, quantity, order_id):
+        """
+        Validate committing quantity to an order without changing anything, backordering what is not on hand.
+        Returns a Reservation for commit_reservation to commit without validating again, or None if the quantity
+        cannot be committed. A reservation is only valid for the version of this item it was made at.
+        """
+        now = datetime.now()
+        effective_quantity = self.effective_quantity_on_hand()
+        movements = []
 
         try:
-            self.transition("commit",
-                            {"quantity": verified_quantity + unverified_quantity},
-                            {"quantity": verified_quantity, "unverified_quantity": unverified_quantity,
-                             "order_id": order_id, "date": datetime.now()},
-                            dry_run=dry_run)
+            backordered_quantity = max(0, quantity - effective_quantity)
+            if backordered_quantity > 0:
+                # Create a backorder for quantity we know is impossible to commit
+                item_dict = {"quantity": backordered_quantity, "date": now, "order_id": order_id}
+                movements.append((self.backorders.prepare(item_dict), InventoryJournal.TRACK, "Backorder",
+                                  (item_dict,)))
+
+            maximum_committable_quantity = quantity - backordered_quantity
+            if maximum_committable_quantity > 0:
+                maximum_verified_quantity = max(0, effective_quantity - self.on_hand_buffer)
+                verified_quantity = min(maximum_verified_quantity, maximum_committable_quantity)
+                unverified_quantity = max(0, maximum_committable_quantity - maximum_verified_quantity)
+
+                item_dicts = ({"quantity": verified_quantity + unverified_quantity},
+                              {"quantity": verified_quantity, "unverified_quantity": unverified_quantity,
+                               "order_id": order_id, "date": now})
+                mutation = self.tracker.prepare("commit", *[dict(item_dict) for item_dict in item_dicts])
+                movements.append((mutation, InventoryJournal.TRANSITION, "commit", item_dicts))
         except TransitionValidationError:
-            result = False
+            return None
+
+        return Reservation(order_id, quantity, self.version, tuple(movements))
+
+    @synchronized
+    def commit_reservation(self, reservation):
+        """
+        Commit a reservation made by reserve, either all of its movements are made or none are.
+        """
+        if reservation.version != self.version:
+            message = "Reservation for order {0} is out of date".format(reservation.order_id)
+            raise TransitionValidationError(message)
 
-        return result
+        # Every movement is checked before any is made, so one which is out of date changes nothing. The movements
+        # are of different states, so making one cannot affect the check of another.
+        mutations = [mutation for mutation, _, _, _ in reservation.movements]
+        check_all(mutations)
+        apply_all(mutations)
+
+        # Only journal the movements once every one of them has been made
+        for _, kind, name, item_dicts in reservation.movements:
+            self._record(kind, name, *item_dicts)
 
     def fulfill_commitment(self, quantity, order_id, invoice_id):
         try:
@@ -170,14 +282,13 @@ class InventoryItem(Entity):
     def needs_stock_verified(self, order_id):
         return not self.committed.is_verified(order_id)
 
+    @synchronized
     def verify_stock_level(self, quantity):
-        # XXX: Ensure atomicity
-
         expected_quantity = self.physical_quantity_on_hand()
         now = datetime.now()
 
         # Verify the quantity which was physically counted
-        self.tracker.action("verify", {"quantity": quantity})()
+        self.action("verify", {"quantity": quantity})
 
         # Propagate any lost stock into backorders
         if quantity < expected_quantity:
@@ -202,6 +313,7 @@ class InventoryItem(Entity):
     def quantity_backordered(self, order_id=None):
         return self.backorders.quantity(order_id=order_id)
 
+    @synchronized
     def fulfill_backorder(self, quantity, order_id):
         now = datetime.now()
 
@@ -245,7 +357,7 @@ class InventoryItem(Entity):
 
     def purchase_item(self, quantity, purchase_order_id, eta_date=None):
 
-        self.purchase_orders.track({
+        self.track("PurchaseOrder", {
             "quantity": quantity,
             "purchase_order_id": purchase_order_id,
             "date": datetime.now(),
@@ -262,7 +374,7 @@ class InventoryItem(Entity):
         return True
 
     def cancel_purchase_order(self, purchase_order_id):
-        self.tracker.action("cancel_purchase_order", {"purchase_order_id": purchase_order_id})()
+        self.action("cancel_purchase_order", {"purchase_order_id": purchase_order_id})
 
     # Lost and Found methods
 
@@ -280,4 +392,16 @@ class InventoryItem(Entity):
     def found_stock(self, quantity):
         self.transition("found",
                         {"quantity": quantity, "date": datetime.now()},
-                        {"quantity": quantity})
\ No newline at end of file
+                        {"quantity": quantity})
+
+
+class Reservation(namedtuple("Reservation", "order_id quantity version movements")):
+    """
+    Stock validated for commitment to an order, see InventoryItem.reserve.
+    Each movement is a PendingMutation with what to journal once it is applied.
+    """
+    __slots__ = ()
+
+
+def _dated(item_dict, date):
+    return item_dict if "date" in item_dict else dict(item_dict, date=date)
@@ -0,0 +1,68 @@
+from collections import namedtuple
+
+
+class InventoryJournal(object):
+    """
+    A record of every successful movement made on an InventoryItem, from which it can be rebuilt.
+    A snapshot of the item's states is taken every snapshot_interval entries, and only the entries made since the
+    latest snapshot are kept, so rebuilding restores the snapshot and replays at most snapshot_interval entries
+    regardless of how long the history is.
+
+    The journal is only kept in memory, no repository stores it. Items found from a repository start without a
+    journal, so an item can only be rebuilt in the process which journalled its movements.
+    """
+
+    TRACK = "track"
+    TRANSITION = "transition"
+    ACTION = "action"
+
+    class Entry(namedtuple("Entry", "kind name items")):
+        """
+        A single movement: a track into the named state, or the named transition or action.
+        Items are the item dicts the movement was made with, each stored as a tuple of (property, value) pairs.
+        """
+        __slots__ = ()
+
+        def item_dicts(self):
+            return [dict(item) for item in self.items]
+
+    def __init__(self, snapshot_interval=1000):
+        self.snapshot_interval = snapshot_interval
+        # Entries made since the latest snapshot
+        self.entries = []
+
+        # Only the latest snapshot is kept, along with the number of movements it includes
+        self.snapshot = None
+        self.snapshot_sequence = 0
+
+    def __len__(self):
+        """
+        The number of movements journalled, including those only kept in the snapshot.
+        """
+        return self.snapshot_sequence + len(self.entries)
+
+    def append(self, kind, name, *item_dicts):
+        """
+        Record a movement, returns its sequence number.
+        """
+        self.entries.append(self.Entry(kind, name, tuple(tuple(item.iteritems()) for item in item_dicts)))
+        return len(self)
+
+    def snapshot_due(self):
+        return len(self.entries) >= self.snapshot_interval
+
+    def take_snapshot(self, snapshot):
+        """
+        Keep a snapshot of the states as of the latest entry, see TrackingStateMachine.snapshot.
+        The entries it includes are dropped.
+        """
+        self.snapshot = snapshot
+        self.snapshot_sequence += len(self.entries)
+        self.entries = []
+
+    def entries_since(self, sequence):
+        if sequence < self.snapshot_sequence:
+            raise ValueError("Entries before {0} were dropped by the latest snapshot".format(self.snapshot_sequence))
+
+        for n in xrange(sequence - self.snapshot_sequence, len(self.entries)):
+            yield self.entries[n]
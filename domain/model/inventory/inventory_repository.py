@@ -4,8 +4,8 @@ from domain.model.inventory.inventory_items import InventoryItem
 
 class InventoryRepository(Repository):
 
-    def add_to_inventory(self, product, warehouse):
-        item = InventoryItem(on_hand=0, warehouse=warehouse.id)
+    def add_to_inventory(self, product, on_hand_buffer=None):
+        item = InventoryItem(product.sku, on_hand_buffer=on_hand_buffer)
         self.create(item)
 
     def find_by_sku(self, SKU):
@@ -17,5 +17,23 @@ class InventoryRepository(Repository):
         item.repository = self
         return item
 
+    def find_many(self, skus):
+        """
+        Find the inventory items for many SKUs at once.
+        Every call must return new InventoryItems, as they were last stored, rather than items handed out before:
+        movements made on items which then fail to store are not undone, so retrying a conflict relies on finding
+        the items again.
+        Returns a dict of SKU to InventoryItem, SKUs without an inventory item are left out.
+        """
+        raise NotImplementedError()
+
+    def store_many(self, items):
+        """
+        Store many inventory items together, either all of them are stored or none are.
+        Raises ConcurrencyConflictError if any was stored by someone else since it was found, the items keep the
+        movements made on them and should be discarded, see find_many.
+        """
+        raise NotImplementedError()
+
     def find_backorders_by_sku(self, sku):
         return NotImplementedError()
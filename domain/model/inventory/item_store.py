@@ -0,0 +1,138 @@
+from array import array
+from datetime import datetime, timedelta
+
+EPOCH = datetime(1970, 1, 1)
+
+# array has no 64 bit typecode in Python 2 and 'l' is only 32 bits on Windows and 32 bit builds, too small for
+# microseconds since the epoch. Doubles hold every integer exactly up to 2 ** 53, long past any date or quantity.
+TYPECODE = 'l' if array('l').itemsize >= 8 else 'd'
+
+
+def to_microseconds(date):
+    """
+    Microseconds since the epoch, timezone aware dates are taken as their UTC time.
+    """
+    offset = date.utcoffset()
+    if offset is not None:
+        date = date.replace(tzinfo=None) - offset
+    delta = date - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def from_microseconds(microseconds):
+    return EPOCH + timedelta(microseconds=int(microseconds))
+
+
+class ColumnarItemStore(object):
+    """
+    Compact storage for the items tracked by a state, keyed on one of their properties (e.g. order_id).
+    Each quantity is kept in a typed array column and the date as microseconds in another, one row per item,
+    with an index from key to row. Items are only materialised when they are read via get() or itervalues().
+
+    Materialised items are copies, changes must be made through the store. Dates are read back naive, so timezone
+    aware dates come back as their UTC time.
+    """
+
+    def __init__(self, item_type, key, columns, date_column="date"):
+        self.item_type = item_type
+        self.key = key
+        self.date_column = date_column
+
+        self.columns = dict((name, array(TYPECODE)) for name in columns + (date_column,))
+        self.keys = []
+        self.rows = {}
+
+        # Items whose properties are exactly the columns and key are materialised without going through __init__
+        self._quantity_columns = tuple((name, self.columns[name]) for name in columns)
+        self._direct = set(getattr(item_type, "fields", ())) == set(columns + (date_column, key))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def __iter__(self):
+        return iter(self.keys)
+
+    def column(self, name):
+        return self.columns[name]
+
+    def value(self, key, name, default=None):
+        row = self.rows.get(key, None)
+        if row is None:
+            return default
+        value = self.columns[name][row]
+        if name == self.date_column:
+            return from_microseconds(value)
+        return value if TYPECODE == 'l' else int(value)
+
+    def add_value(self, key, name, value):
+        self.columns[name][self.rows[key]] += value
+
+    def set_value(self, key, name, value):
+        self.columns[name][self.rows[key]] = value
+
+    def put(self, item):
+        """
+        Store an item, replacing any existing item with the same key.
+        """
+        key = getattr(item, self.key)
+        row = self.rows.get(key, None)
+
+        if row is None:
+            self.rows[key] = len(self.keys)
+            self.keys.append(key)
+            for name, column in self.columns.iteritems():
+                column.append(self._stored_value(item, name))
+        else:
+            for name, column in self.columns.iteritems():
+                column[row] = self._stored_value(item, name)
+
+    def remove(self, key):
+        """
+        Remove an item by moving the last row into its place.
+        """
+        row = self.rows.pop(key)
+        last_key = self.keys.pop()
+
+        for column in self.columns.itervalues():
+            last_value = column.pop()
+            if last_key != key:
+                column[row] = last_value
+
+        if last_key != key:
+            self.keys[row] = last_key
+            self.rows[last_key] = row
+
+    def get(self, key, default=None):
+        row = self.rows.get(key, None)
+        return default if row is None else self._materialise(row)
+
+    def itervalues(self):
+        for row in xrange(len(self.keys)):
+            yield self._materialise(row)
+
+    def values(self):
+        return list(self.itervalues())
+
+    def _stored_value(self, item, name):
+        value = getattr(item, name)
+        return to_microseconds(value) if name == self.date_column else value
+
+    def _materialise(self, row):
+        date = from_microseconds(self.columns[self.date_column][row])
+
+        if self._direct:
+            item = self.item_type.__new__(self.item_type)
+            for name, column in self._quantity_columns:
+                setattr(item, name, column[row] if TYPECODE == 'l' else int(column[row]))
+            setattr(item, self.date_column, date)
+            setattr(item, self.key, self.keys[row])
+            return item
+
+        properties = dict((name, column[row] if TYPECODE == 'l' else int(column[row]))
+                          for name, column in self._quantity_columns)
+        properties[self.date_column] = date
+        properties[self.key] = self.keys[row]
+        return self.item_type(properties)
@@ -1,5 +1,14 @@
+from array import array
+from collections import namedtuple
+import copy
+import datetime
 import functools
+import heapq
+import itertools
 import operator
+import os
+
+from domain.model.inventory.item_store import ColumnarItemStore
 
 
 class TrackingStateMachine(object):
@@ -18,51 +27,60 @@ class TrackingStateMachine(object):
 
     def transition(self, name, from_item_dict, to_item_dict, dry_run=None):
         """
-        Retrieve the transition function and curry in the to_state.
+        Perform the named transition using the plan compiled when it was added.
         Validate the items being passed into each state.
         """
-        if name not in self.transitions:
+        plan = self.transitions.get(name, None)
+        if plan is None:
             raise TransitionValidationError("Unknown transition: {0}".format(name))
-        from_state, to_state = self.transitions.get(name)
 
-        from_item = from_state._validated_item(from_item_dict)
-        if not from_item:
-            raise TransitionValidationError("Could not validate {0}".format(from_item_dict))
+        return plan(from_item_dict, to_item_dict, dry_run=dry_run)
 
-        # Perform all pre-transition validations on initiating state
-        transition = getattr(from_state, name)(from_item)
-        validation_parameters = {}
-        for validation in transition:
-            if not validation.succeeded():
-                raise TransitionValidationError(validation.message)
-            else:
-                validation_parameters = validation.parameters
-                break  # Halt
+    def prepare(self, name, from_item_dict, to_item_dict):
+        """
+        Validate the named transition without performing it.
+        Returns a PendingMutation which performs the transition when applied, or can simply be discarded.
+        """
+        plan = self.transitions.get(name, None)
+        if plan is None:
+            raise TransitionValidationError("Unknown transition: {0}".format(name))
 
-        # Update any TransitionParameters with their values and validate to_item
-        to_item = to_state._validated_item(to_item_dict, parameters=validation_parameters)
-        if not to_item:
-            raise TransitionValidationError("Could not validate {0}".format(to_item_dict))
+        return plan.prepare(from_item_dict, to_item_dict)
 
-        # Ensure receiving state is able to track item
-        track = to_state._track(to_item)
-        for validation in track:
-            if not validation.succeeded():
-                raise TransitionValidationError(validation.message)
+    def transition_many(self, movements, dry_run=None):
+        """
+        Perform a batch of movements, each a (name, from_item_dict, to_item_dict) tuple.
+        Returns a TransitionValidationResult per movement instead of raising on the first failure,
+        movements which fail are skipped and do not affect the rest of the batch.
+        A movement which fails validation changes nothing, so each is performed in place as it is validated.
+        Only a dry run, whose later movements still need to see the earlier ones, is made on a scratch copy of
+        the states.
+        """
+        machine = copy.deepcopy(self) if dry_run else self
+        results = []
+
+        for name, from_item_dict, to_item_dict in movements:
+            try:
+                machine.transition(name, from_item_dict, to_item_dict)
+            except TransitionValidationError as e:
+                results.append(TrackingState.TransitionValidationResult(False, str(e)))
             else:
-                break  # Halt
+                results.append(TrackingState.TransitionValidationResult(True, None))
 
-        dry_run = True if dry_run else False
-        if not dry_run:
-            # Run to completion
-            for validation in transition:  # pragma: no cover
-                if validation:
-                    raise TransitionFatalError("Transition from-state encountered fatal error")
-            for validation in track:  # pragma: no cover
-                if validation:
-                    raise TransitionFatalError("Transition to-state encountered fatal error")
+        return results
 
-        return True
+    def snapshot(self):
+        """
+        Capture the contents of every state, see restore.
+        """
+        return dict((name, state.snapshot()) for name, state in self.states.iteritems())
+
+    def restore(self, snapshot):
+        """
+        Return every state to its contents when the snapshot was taken.
+        """
+        for name, state in self.states.iteritems():
+            state.restore(snapshot[name])
 
     def add_transition(self, name, from_state, to_state):
         """
@@ -77,7 +95,7 @@ class TrackingStateMachine(object):
                 raise StateValidationError("State {0} does not exist.".format(state))
 
         if hasattr(from_state, name) and callable(getattr(from_state, name)):
-            self.transitions.update({name: (from_state, to_state)})
+            self.transitions.update({name: TransitionPlan(name, from_state, to_state)})
         else:
             raise TransitionValidationError("State {0} does not define transition {1}".format(from_state, name))
 
@@ -107,6 +125,71 @@ class TrackingStateMachine(object):
             raise TransitionActionError("State {0} does not define action {1}".format(state, name))
 
 
+class TransitionPlan(object):
+    """
+    A transition compiled once when it is added to a TrackingStateMachine.
+    The from-state handler, the item constructors and the to-state tracker are bound up front,
+    so performing the transition is a single call with no further lookups.
+    """
+
+    def __init__(self, name, from_state, to_state):
+        self.name = name
+        self.from_state = from_state
+        self.to_state = to_state
+
+        self._handler = getattr(from_state, name)
+        self._from_item_type = from_state.item_type
+        self._to_item_type = to_state.item_type
+        self._to_validated_item = to_state._validated_item
+        self._track = to_state._track
+
+    def __call__(self, from_item_dict, to_item_dict, dry_run=None):
+        mutation = self.prepare(from_item_dict, to_item_dict)
+        if not dry_run:
+            mutation.apply()
+
+        return True
+
+    def prepare(self, from_item_dict, to_item_dict):
+        from_item = self._from_item_type(from_item_dict)
+        if not from_item.validate():
+            raise TransitionValidationError("Could not validate {0}".format(from_item_dict))
+
+        # Perform all pre-transition validations on initiating state
+        from_mutation = self._handler(from_item)
+
+        # Update any TransitionParameters with their values and validate to_item
+        if from_mutation.parameters:
+            to_item = self._to_validated_item(to_item_dict, parameters=from_mutation.parameters)
+        else:
+            to_item = self._to_item_type(to_item_dict)
+            to_item = to_item if to_item.validate() else None
+        if not to_item:
+            raise TransitionValidationError("Could not validate {0}".format(to_item_dict))
+
+        # Ensure receiving state is able to track item
+        to_mutation = self._track(to_item)
+
+        # Both states are checked before either changes, so a stale transition is not left half made
+        return TrackingState.PendingMutation(apply_all, ((from_mutation, to_mutation),), {}, check_all)
+
+
+def apply_all(mutations):
+    """
+    Apply a sequence of PendingMutations, e.g. a batch prepared across many inventory items, in order.
+    """
+    for mutation in mutations:
+        mutation.apply()
+
+
+def check_all(mutations):
+    """
+    Check a sequence of PendingMutations can still be applied, without applying any of them.
+    """
+    for mutation in mutations:
+        mutation.check_applicable()
+
+
 class StateValidationError(Exception):
     """
     An exception to indicate that the transition failed validation and will not be committed.
@@ -127,6 +210,13 @@ class TransitionFatalError(Exception):
     """
 
 
+class StateConsistencyError(Exception):
+    """
+    A state's running total has diverged from the items it tracks.
+    """
+    pass
+
+
 class TransitionActionError(Exception):
     """
     An exception to indicate that the action failed validation and will not be enacted.
@@ -149,24 +239,61 @@ class TransitionParameter(object):
         self.value = value if value else None
 
 
+class TrackingItemType(type):
+    """
+    Metaclass for TrackingItems which checks the validations declared on each item class.
+    Validations are declared once per class as (property, operator, value) rules, e.g. ("quantity", ">=", 0),
+    and kept as (property, comparison, value) for validate() to apply in turn.
+    The properties of an item are its __slots__, including those of its base classes.
+    """
+    OPERATORS = {
+        "<": operator.lt,
+        "<=": operator.le,
+        ">": operator.gt,
+        ">=": operator.ge,
+        "==": operator.eq,
+        "!=": operator.ne,
+        "is": operator.is_,
+        "is not": operator.is_not,
+    }
+
+    def __new__(mcs, name, bases, namespace):
+        cls = super(TrackingItemType, mcs).__new__(mcs, name, bases, namespace)
+        cls.fields = tuple(field for klass in reversed(cls.__mro__) for field in klass.__dict__.get("__slots__", ()))
+        if "validations" in namespace:
+            cls.rules = tuple(mcs._rule(name, validation) for validation in namespace["validations"])
+        return cls
+
+    @classmethod
+    def _rule(mcs, name, validation):
+        field, operator_, value = validation
+        if operator_ not in mcs.OPERATORS:
+            raise ValueError("Unsupported operator {0} in validations of {1}".format(operator_, name))
+        return field, mcs.OPERATORS[operator_], value
+
+
 class TrackingState(object):
     class TrackingItem(object):
-        def __init__(self):
-            self.validations = []
+        __metaclass__ = TrackingItemType
+        __slots__ = ()
+
+        # Rules every item must satisfy, as (property, operator, value)
+        validations = ()
 
         def validate(self):
             """
             Apply each rule to the item and only succeed if all validations pass.
             """
-            return reduce(operator.and_, map(lambda f: f(self), self.validations), True)
+            for field, compare, value in self.rules:
+                if not compare(getattr(self, field), value):
+                    return False
+            return True
 
         def export(self):
             """
             TrackingItems export themself to the world as a dict, so external consumers can determine their properties.
             """
-            item_dict = self.__dict__.copy()
-            item_dict.pop("validations")
-            return item_dict
+            return {field: getattr(self, field) for field in self.fields}
 
     class TransitionValidationResult(object):
         """
@@ -184,9 +311,31 @@ class TrackingState(object):
         def add_parameter(self, name, value):
             self.parameters.update({name: value})
 
+    class PendingMutation(namedtuple("PendingMutation", "mutate args parameters check")):
+        """
+        A validated change to a state which has not been made yet.
+        apply() makes the change and should be called at most once, a mutation which is not needed is discarded.
+        Any parameters are emitted to the "to" state of a transition, see TransitionParameter.
+        The state may change between prepare and apply, so check (if any) is called with the same args first and
+        raises TransitionFatalError, before anything is changed, if the mutation can no longer be made.
+        """
+        __slots__ = ()
+
+        def apply(self):
+            self.check_applicable()
+            self.mutate(*self.args)
+
+        def check_applicable(self):
+            if self.check is not None:
+                self.check(*self.args)
+
+    # Cross-check running totals against a full recount of the tracked items on every quantity() query
+    check_totals = os.getenv("INVENTORY_CHECK_TOTALS", False) == "1"
+
     def __init__(self, name, item_type):
         self.name = name
         self.item_type = item_type
+        self.total = 0
 
     def _validated_item(self, item_dict, parameters=None):
         parameters = parameters if parameters else {}
@@ -206,32 +355,96 @@ class TrackingState(object):
         If a dictionary, we must perform any necessary validations before tracking is allowed.
         Do not override, see _track method instead.
         """
+        mutation = self.prepare(item)
+
+        dry_run = True if dry_run is not None else False
+        if not dry_run:
+            mutation.apply()
+
+        return True
+
+    def prepare(self, item):
+        """
+        Validate tracking an item in this state without tracking it.
+        Returns a PendingMutation which tracks the item when applied.
+        """
         if not isinstance(item, self.item_type):
             item = self._validated_item(item)
         if not item:
             raise TransitionValidationError("Could not validate item {0} to track it.".format(item))
 
-        dry_run = True if dry_run is not None else False
-        for validation in self._track(item):
-            if not validation.succeeded():
-                raise TransitionValidationError(validation.message)
-            elif dry_run:
-                return True
-
-        return True
+        return self._track(item)
 
     def _track(self, item):
         """
         Internal track method all implementors provide.
+        Validates the item can be tracked and returns a PendingMutation which tracks it.
         """
         raise NotImplementedError()  # pragma: no cover
 
+    def _pending(self, mutate, *args, **parameters):
+        """
+        Create a PendingMutation which calls mutate with args when applied.
+        """
+        return self.PendingMutation(mutate, args, parameters, None)
+
+    def _checked(self, check, mutate, *args, **parameters):
+        """
+        Create a PendingMutation which calls check and then mutate with args when applied, see PendingMutation.
+        """
+        return self.PendingMutation(mutate, args, parameters, check)
+
     def quantity(self, key=None):
         """
         Quantity of items tracked, most implementors will have additional keys to filter on.
         """
         raise NotImplementedError()  # pragma: no cover
 
+    def _total(self):
+        """
+        The running total quantity, kept up to date as items are tracked and transitioned.
+        """
+        if self.check_totals:
+            recounted = self._recount()
+            if self.total != recounted:
+                raise StateConsistencyError("State {0} has running total {1} but tracks {2}".format(
+                    self.name, self.total, recounted))
+        return self.total
+
+    def _recount(self):
+        """
+        Recount the total quantity from every tracked item, see check_totals.
+        """
+        raise NotImplementedError()  # pragma: no cover
+
+    def tracked_items(self):
+        """
+        Every item tracked by this state, e.g. so they can be stored.
+        """
+        raise NotImplementedError()  # pragma: no cover
+
+    def load(self, item_dicts):
+        """
+        Track items read back from storage.
+        Items were validated when first tracked and transitions may have changed them since (e.g. a commitment with
+        all of its quantity unverified), so they are tracked as they are.
+        """
+        for item_dict in item_dicts:
+            self._track(self.item_type(item_dict)).apply()
+
+    def snapshot(self):
+        """
+        A copy of the items tracked by this state, unaffected by any later changes.
+        """
+        return copy.deepcopy(self.__dict__)
+
+    def restore(self, snapshot):
+        """
+        Replace the items tracked by this state with those of a snapshot, which can be restored again later.
+        Compiled transitions remain bound to this state.
+        """
+        self.__dict__.update(copy.deepcopy(snapshot))
+
     def get(self, key):
         obj = self._get(key)
         if obj:
@@ -248,33 +461,49 @@ class TrackingState(object):
 
 class OnHandState(TrackingState):
     class OnHandItem(TrackingState.TrackingItem):
+        __slots__ = ("quantity",)
+
+        validations = (
+            ("quantity", ">=", 0),
+        )
+
         def __init__(self, properties):
-            super(self.__class__, self).__init__()
             self.quantity = properties.get("quantity", 0)
 
-            self.validations.extend([
-                (lambda i: i.quantity >= 0),
-            ])
-
     def __init__(self, name):
         super(self.__class__, self).__init__(name, self.OnHandItem)
         self.item = self.OnHandItem({"quantity": 0})
 
     def _track(self, item):
-        yield self.TransitionValidationResult(True, None)
-        self.item.quantity += item.quantity
+        return self._pending(self._add_quantity, item.quantity)
+
+    def _add_quantity(self, quantity):
+        self.item.quantity += quantity
 
     def quantity(self, key=None):
         return self.item.quantity
 
+    def tracked_items(self):
+        return [self.item]
+
     def _reduce_quantity_by(self, quantity):
-        current_quantity = self.item.quantity
-        if quantity > current_quantity:
-            yield self.TransitionValidationResult(False, "Cannot commit quantity greater than on hand")
+        if quantity > self.item.quantity:
+            raise TransitionValidationError("Cannot commit quantity greater than on hand")
+
+        return self._checked(self._check_take_quantity, self._take_quantity, quantity)
+
+    def _check_take_quantity(self, quantity):
+        # The on hand quantity may have been reduced since the mutation was prepared
+        if quantity > self.item.quantity:
+            raise TransitionFatalError("Cannot commit quantity {0} greater than on hand {1}, it changed since "
+                                       "the transition was prepared".format(quantity, self.item.quantity))
 
-        # Halt before committing transition
-        yield self.TransitionValidationResult(True, None)
-        self.item.quantity = max(0, current_quantity - quantity)
+    def _take_quantity(self, quantity):
+        self.item.quantity -= quantity
+
+    def _subtract_quantity(self, quantity):
+        # Lost stock may be more than was thought to be on hand
+        self.item.quantity = max(0, self.item.quantity - quantity)
 
     def commit(self, item):
         return self._reduce_quantity_by(item.quantity)
@@ -283,8 +512,7 @@ class OnHandState(TrackingState):
         return self._reduce_quantity_by(item.quantity)
 
     def lost(self, item):
-        yield self.TransitionValidationResult(True, None)
-        self.item.quantity = max(0, self.item.quantity - item.quantity)
+        return self._pending(self._subtract_quantity, item.quantity)
 
 
 class CommittedState(TrackingState):
@@ -295,80 +523,236 @@ class CommittedState(TrackingState):
         As a safe-guard, a quantity can be marked as unverified until a physical count can confirm its existence.
         """
 
-        def __init__(self, properties):
-            import datetime
+        __slots__ = ("quantity", "unverified_quantity", "date", "order_id")
+
+        validations = (
+            ("quantity", ">", 0),
+            ("unverified_quantity", ">=", 0),
+            ("date", "is not", None),
+            ("order_id", "is not", None),
+        )
 
-            super(self.__class__, self).__init__()
+        def __init__(self, properties):
             self.quantity = properties.get("quantity", 0)
             self.unverified_quantity = properties.get("unverified_quantity", 0)
-            self.date = properties.get("date", datetime.datetime.now())
+            self.date = properties["date"] if "date" in properties else datetime.datetime.now()
             self.order_id = properties.get("order_id", None)
 
-            self.validations.extend([
-                (lambda i: i.quantity > 0),
-                (lambda i: i.unverified_quantity >= 0),
-                (lambda i: i.date is not None),
-                (lambda i: i.order_id is not None),
-            ])
-
         def __repr__(self):
             return "{0} quantity={1} unverified_quantity={2} order_id={3}".format(
                 self.__class__, self.quantity, self.unverified_quantity, self.order_id)
 
     def __init__(self, name):
         super(self.__class__, self).__init__(name, self.CommittedItem)
-        self.items = {}
-        # items is dict, keyed by order_id: { order_id: item }
+        self.items = ColumnarItemStore(self.CommittedItem, "order_id", ("quantity", "unverified_quantity"))
+        # items are stored in columns, keyed by order_id
+        self.unverified = set()
+        # order_ids of items with an unverified quantity
+        self.verified = bytearray()
+        # 1 for each row of an item with a verified quantity, otherwise 0
+        self.oldest_first = array("i")
+        # heap of rows, ordered by the (date, order_id) of their items
+        self.heap_positions = array("i")
+        # position in oldest_first of each row, so the entry of a removed item can be taken out of the heap
 
     def _track(self, item):
-        yield self.TransitionValidationResult(True, None)
+        return self._pending(self._add_item, item)
+
+    def _add_item(self, item):
         if item.order_id in self.items:
-            self.items.get(item.order_id).quantity += item.quantity
+            self.items.add_value(item.order_id, "quantity", item.quantity)
+            self.total += item.quantity
+            self._index_verified(item.order_id, self.items.value(item.order_id, "quantity"))
         else:
-            self.items[item.order_id] = item
+            self.items.put(item)
+            self.total += item.quantity + item.unverified_quantity
+            self._index_unverified(item.order_id, item.unverified_quantity)
+            self.verified.append(1 if item.quantity > 0 else 0)
+
+            row = len(self.oldest_first)
+            self.oldest_first.append(row)
+            self.heap_positions.append(row)
+            self._sift_up(row)
+
+    def _remove_item(self, order_id):
+        """
+        Remove an item and its heap entry.
+        The store moves its last row into the removed row, so the entries of that row are moved with it.
+        """
+        heap = self.oldest_first
+        positions = self.heap_positions
+        row = self.items.rows[order_id]
+
+        # Fill the removed entry's place in the heap with the last entry and restore the heap around it
+        position = positions[row]
+        last_entry = heap.pop()
+        if position < len(heap):
+            heap[position] = last_entry
+            positions[last_entry] = position
+            self._sift_down(position)
+            self._sift_up(positions[last_entry])
+
+        self.items.remove(order_id)
+        self.unverified.discard(order_id)
+
+        last_row = len(self.items)
+        if last_row != row:
+            heap[positions[last_row]] = row
+            positions[row] = positions[last_row]
+            self.verified[row] = self.verified[last_row]
+        positions.pop()
+        self.verified.pop()
+
+    def _sift_up(self, position):
+        """
+        Move the heap entry at position towards the root until its parent is older.
+        """
+        heap = self.oldest_first
+        positions = self.heap_positions
+        dates = self.items.column("date")
+        keys = self.items.keys
+
+        row = heap[position]
+        entry = (dates[row], keys[row])
+        while position > 0:
+            parent = (position - 1) >> 1
+            parent_row = heap[parent]
+            if (dates[parent_row], keys[parent_row]) <= entry:
+                break
+            heap[position] = parent_row
+            positions[parent_row] = position
+            position = parent
+        heap[position] = row
+        positions[row] = position
+
+    def _sift_down(self, position):
+        """
+        Move the heap entry at position away from the root until both its children are newer.
+        """
+        heap = self.oldest_first
+        positions = self.heap_positions
+        dates = self.items.column("date")
+        keys = self.items.keys
+        size = len(heap)
+
+        row = heap[position]
+        entry = (dates[row], keys[row])
+        child = 2 * position + 1
+        while child < size:
+            child_row = heap[child]
+            child_entry = (dates[child_row], keys[child_row])
+            if child + 1 < size:
+                right_row = heap[child + 1]
+                right_entry = (dates[right_row], keys[right_row])
+                if right_entry < child_entry:
+                    child, child_row, child_entry = child + 1, right_row, right_entry
+            if entry <= child_entry:
+                break
+            heap[position] = child_row
+            positions[child_row] = position
+            position = child
+            child = 2 * position + 1
+        heap[position] = row
+        positions[row] = position
+
+    def _iter_oldest_first(self):
+        """
+        Iterate the rows of every item, oldest first, without changing the heap.
+        The heap is walked from its root, each time taking the oldest entry whose parent has already been taken, so
+        the first k rows cost O(k log k). Once more than a sixteenth of the heap has been taken, sorting the rest is
+        cheaper.
+        """
+        heap = self.oldest_first
+        dates = self.items.column("date")
+        keys = self.items.keys
+        size = len(heap)
+        limit = size // 16
+        taken = 0
+
+        frontier = [(dates[heap[0]], keys[heap[0]], 0)] if size else []
+        while frontier and taken <= limit:
+            _, _, position = heapq.heappop(frontier)
+            yield heap[position]
+            taken += 1
+
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < size:
+                    row = heap[child]
+                    heapq.heappush(frontier, (dates[row], keys[row], child))
+
+        if frontier:
+            # Everything taken is older than the rest
+            ordered = sorted(heap, key=lambda row: (dates[row], keys[row]))
+            for row in itertools.islice(ordered, taken, None):
+                yield row
+
+    def _index_unverified(self, order_id, unverified_quantity):
+        if unverified_quantity > 0:
+            self.unverified.add(order_id)
+        else:
+            self.unverified.discard(order_id)
+
+    def _index_verified(self, order_id, quantity):
+        self.verified[self.items.rows[order_id]] = 1 if quantity > 0 else 0
 
     def _get(self, order_id):
         return self.items.get(order_id, None)
 
-    def is_verified(self, order_id):
-        for key, item in self.items.iteritems():
-            if order_id in key and item.unverified_quantity > 0:
-                return False
-        return True
+    def tracked_items(self):
+        return self.items.itervalues()
 
-    def get_unverified(self):
-        unverified_items = []
+    def is_verified(self, order_id):
+        # Commitments are keyed by their whole order_id, so there is nothing else to match
+        return order_id not in self.unverified
 
-        for item in self.items.itervalues():
-            if item.unverified_quantity > 0:
-                unverified_items.append(item)
+    def has_unverified(self):
+        """
+        Whether any commitment has an unverified quantity, without listing them as get_unverified does.
+        """
+        return bool(self.unverified)
 
-        return unverified_items
+    def get_unverified(self):
+        """
+        Commitments with an unverified quantity, oldest first.
+        """
+        dates = self.items.column("date")
+        rows = self.items.rows
+        order_ids = sorted(self.unverified, key=lambda order_id: (dates[rows[order_id]], order_id))
+        return [self.items.get(order_id) for order_id in order_ids]
 
     def quantity(self, key=None):
-        quantity = 0
-
-        for item in self.items.itervalues():
-            quantity += item.quantity
-            quantity += item.unverified_quantity
+        return self._total()
 
-        return quantity
+    def _recount(self):
+        return sum(self.items.column("quantity")) + sum(self.items.column("unverified_quantity"))
 
     def _reduce_quantity_for(self, order_id, quantity):
-        item = self.items.get(order_id, None)
-        if not item:
+        committed_quantity = self.items.value(order_id, "quantity")
+        if committed_quantity is None:
             message = "Could not find commitment for {0}".format(order_id)
-            yield self.TransitionValidationResult(False, message)
-
-        if quantity > item.quantity:
-            message = "Cannot commit {0} (maximum {1} for commitment for {2}".format(quantity, item.quantity, order_id)
-            yield self.TransitionValidationResult(False, message)
-
-        yield self.TransitionValidationResult(True, None)
-        if item.quantity == quantity:
-            del self.items[order_id]
+            raise TransitionValidationError(message)
+
+        if quantity > committed_quantity:
+            message = "Cannot commit {0} (maximum {1} for commitment for {2}".format(
+                quantity, committed_quantity, order_id)
+            raise TransitionValidationError(message)
+
+        return self._checked(self._check_remove_quantity, self._remove_quantity, order_id, quantity)
+
+    def _check_remove_quantity(self, order_id, quantity):
+        # The commitment may have been reduced or removed since the mutation was prepared
+        committed_quantity = self.items.value(order_id, "quantity")
+        if committed_quantity is None or quantity > committed_quantity:
+            raise TransitionFatalError("Cannot take quantity {0} from commitment for {1} (now {2}), it changed since "
+                                       "the transition was prepared".format(quantity, order_id, committed_quantity))
+
+    def _remove_quantity(self, order_id, quantity):
+        if self.items.value(order_id, "quantity") == quantity:
+            self.total -= quantity + self.items.value(order_id, "unverified_quantity")
+            self._remove_item(order_id)
         else:
-            item.quantity -= quantity
+            self.items.add_value(order_id, "quantity", -quantity)
+            self.total -= quantity
 
     def backorder_commitment(self, item):
         return self._reduce_quantity_for(item.order_id, item.quantity)
@@ -380,37 +764,102 @@ class CommittedState(TrackingState):
         return self._reduce_quantity_for(item.order_id, item.quantity)
 
     def verify(self, item):
+        """
+        Allocate a count of the stock committed to the oldest commitments first, any quantity which was not counted
+        becomes unverified.
+        Commitments are taken oldest first until the count runs out, then every newer commitment which still has a
+        verified quantity has it moved to unverified. Only commitments which change are visited, so a count of k
+        commitments costs O(k log k) plus the commitments it makes unverified, see _iter_oldest_first.
+        """
         verified_quantity = item.get("quantity", None)
         if verified_quantity is None:
             raise KeyError()
 
-        for item in self.items.itervalues():
-            # TODO: Verify oldest orders first
-
-            if item.quantity <= verified_quantity:
-                verified_quantity -= item.quantity
-
-                if item.unverified_quantity <= verified_quantity:
-                    verified_quantity -= item.unverified_quantity
-                    item.quantity += item.unverified_quantity
-                    item.unverified_quantity = 0
+        quantities = self.items.column("quantity")
+        unverified_quantities = self.items.column("unverified_quantity")
+        rows = self.items.rows
+        verified = self.verified
+
+        if verified_quantity >= self.total:
+            # Everything committed was counted, only unverified quantities need to change
+            for order_id in self.unverified:
+                row = rows[order_id]
+                quantities[row] += unverified_quantities[row]
+                unverified_quantities[row] = 0
+                verified[row] = 1
+            self.unverified.clear()
+            return
+
+        # Allocate the counted stock to the oldest commitments first
+        keys = self.items.keys
+        unverified = self.unverified
+        allocated_rows = bytearray(len(self.items))
+        for row in self._iter_oldest_first():
+            if verified_quantity == 0:
+                break
+            allocated_rows[row] = 1
+
+            quantity = quantities[row]
+            unverified_quantity = unverified_quantities[row]
+
+            if quantity <= verified_quantity:
+                verified_quantity -= quantity
+
+                if unverified_quantity <= verified_quantity:
+                    verified_quantity -= unverified_quantity
+                    quantities[row] = quantity + unverified_quantity
+                    unverified_quantities[row] = 0
                 else:
                     verified_quantity = 0
 
             else:
                 # Move falsely committed quantity to unverified
-                item.unverified_quantity += max(0, item.quantity - verified_quantity)
-                item.quantity = verified_quantity
+                unverified_quantities[row] = unverified_quantity + max(0, quantity - verified_quantity)
+                quantities[row] = verified_quantity
                 verified_quantity = 0
 
+            # Inline _index_unverified and _index_verified, this loop can run for every commitment
+            if unverified_quantities[row]:
+                unverified.add(keys[row])
+            else:
+                unverified.discard(keys[row])
+            verified[row] = 1 if quantities[row] else 0
+
+        # The counted stock ran out, so everything newer is unverified; order no longer matters
+        row = verified.find("\x01")
+        while row != -1:
+            if not allocated_rows[row]:
+                unverified_quantities[row] += quantities[row]
+                quantities[row] = 0
+                verified[row] = 0
+                unverified.add(keys[row])
+            row = verified.find("\x01", row + 1)
+
     def verify_out_of_stock(self, verify_item):
-        item = self.items.get(verify_item.order_id, None)
-        if not item:
+        unverified_quantity = self.items.value(verify_item.order_id, "unverified_quantity")
+        if unverified_quantity is None:
             message = "Could not find commitment for {0}".format(verify_item.order_id)
-            yield self.TransitionValidationResult(False, message)
+            raise TransitionValidationError(message)
+
+        if verify_item.quantity > unverified_quantity:
+            message = "Cannot backorder {0} (maximum {1} unverified for commitment for {2})".format(
+                verify_item.quantity, unverified_quantity, verify_item.order_id)
+            raise TransitionValidationError(message)
+
+        return self._checked(self._check_remove_unverified_quantity, self._remove_unverified_quantity,
+                             verify_item.order_id, verify_item.quantity)
 
-        yield self.TransitionValidationResult(True, None)
-        item.unverified_quantity -= verify_item.quantity
+    def _check_remove_unverified_quantity(self, order_id, quantity):
+        unverified_quantity = self.items.value(order_id, "unverified_quantity")
+        if unverified_quantity is None or quantity > unverified_quantity:
+            raise TransitionFatalError("Cannot take unverified quantity {0} from commitment for {1} (now {2}), it "
+                                       "changed since the transition was prepared".format(
+                                           quantity, order_id, unverified_quantity))
+
+    def _remove_unverified_quantity(self, order_id, quantity):
+        self.items.add_value(order_id, "unverified_quantity", -quantity)
+        self.total -= quantity
+        self._index_unverified(order_id, self.items.value(order_id, "unverified_quantity"))
 
 
 class BackorderState(TrackingState):
@@ -420,76 +869,106 @@ class BackorderState(TrackingState):
         It tracks which order triggered its creation.
         """
 
+        __slots__ = ("quantity", "date", "order_id", "allocated")
+
+        validations = (
+            ("quantity", ">=", 0),
+            ("date", "is not", None),
+            ("order_id", "is not", None),
+            ("allocated", ">=", 0),
+        )
+
         def __init__(self, properties):
-            super(self.__class__, self).__init__()
             self.quantity = properties.get("quantity", 0)
             self.date = properties.get("date", None)
             self.order_id = properties.get("order_id", None)
             self.allocated = properties.get("allocated", 0)
 
-            self.validations.extend([
-                (lambda i: i.quantity >= 0),
-                (lambda i: i.date is not None),
-                (lambda i: i.order_id is not None),
-                (lambda i: i.allocated >= 0),
-            ])
-
     def __init__(self, name):
         super(self.__class__, self).__init__(name, self.BackorderedItem)
-        self.items = {}
+        self.items = ColumnarItemStore(self.BackorderedItem, "order_id", ("quantity", "allocated"))
 
     def _track(self, item):
         # Only allow tracking allocations if they already exist
         if item.allocated > 0 and item.order_id not in self.items:
             message = "Cannot allocate quantity {0} since backorder for order {1} does not exist".format(
                 item.allocated, item.order_id)
-            yield self.TransitionValidationResult(False, message)
+            raise TransitionValidationError(message)
+
+        return self._checked(self._check_merge_item, self._merge_item, item)
 
-        yield self.TransitionValidationResult(True, None)
+    def _check_merge_item(self, item):
+        if item.allocated > 0 and item.order_id not in self.items:
+            raise TransitionFatalError("Cannot allocate quantity {0} since backorder for order {1} was removed after "
+                                       "the transition was prepared".format(item.allocated, item.order_id))
+
+    def _merge_item(self, item):
+        self.total += item.quantity
         if item.order_id in self.items:
-            existing = self.items.get(item.order_id)
-            item.quantity += existing.quantity
-            item.allocated += existing.allocated
-        self.items.update({item.order_id: item})
+            item.quantity += self.items.value(item.order_id, "quantity")
+            item.allocated += self.items.value(item.order_id, "allocated")
+        self.items.put(item)
 
     def _get(self, order_id):
         return self.items.get(order_id, None)
 
+    def tracked_items(self):
+        return self.items.itervalues()
+
     def quantity(self, order_id=None):
         if order_id:
-            return 0 if order_id not in self.items else self.items.get(order_id).quantity
+            return self.items.value(order_id, "quantity", 0)
         else:
-            return reduce(operator.add, [item.quantity for item in self.items.values()], 0)
+            return self._total()
+
+    def _recount(self):
+        return sum(self.items.column("quantity"))
 
     def fulfill_backorder(self, item):
-        backorder = self.items.get(item.order_id, None)
-        if not backorder:
+        backorder_quantity = self.items.value(item.order_id, "quantity")
+        if backorder_quantity is None:
             message = "Could not find backorder for order {0}.".format(item.order_id)
-            yield self.TransitionValidationResult(False, message)
+            raise TransitionValidationError(message)
 
-        if item.quantity > backorder.quantity:
+        if item.quantity > backorder_quantity:
             message = "Cannot fulfill quantity {0}, greater than backorder quantity {1}.".format(
-                item.quantity, backorder.quantity)
-            yield self.TransitionValidationResult(False, message)
+                item.quantity, backorder_quantity)
+            raise TransitionValidationError(message)
+
+        return self._checked(self._check_remove_allocated, self._remove_allocated, item.order_id, item.allocated)
+
+    def _check_remove_allocated(self, order_id, allocated):
+        backorder_quantity = self.items.value(order_id, "quantity")
+        if backorder_quantity is None or allocated > backorder_quantity:
+            raise TransitionFatalError("Cannot fulfill quantity {0} from backorder for order {1} (now {2}), it "
+                                       "changed since the transition was prepared".format(
+                                           allocated, order_id, backorder_quantity))
 
-        yield self.TransitionValidationResult(True, None)
+    def _remove_allocated(self, order_id, allocated):
+        self.total -= allocated
         # If completely fulfilled, backorder can be removed
-        if backorder.quantity == item.allocated:
-            del self.items[item.order_id]
+        if self.items.value(order_id, "quantity") == allocated:
+            self.items.remove(order_id)
         else:
-            backorder.quantity -= item.allocated
-            backorder.allocated -= item.allocated
+            self.items.add_value(order_id, "quantity", -allocated)
+            self.items.add_value(order_id, "allocated", -allocated)
 
     def cancel_backorder(self, item):
         if item.order_id not in self.items:
             message = "Cannot find order {0} in backorders.".format(item.order_id)
-            yield self.TransitionValidationResult(False, message)
+            raise TransitionValidationError(message)
 
-        success = self.TransitionValidationResult(True, None)
         # Return the allocated quantity which needs to be returned to On Hand state.
-        success.add_parameter("allocated", item.allocated)
-        yield success
-        del self.items[item.order_id]
+        return self._checked(self._check_remove_item, self._remove_item, item.order_id, allocated=item.allocated)
+
+    def _check_remove_item(self, order_id):
+        if order_id not in self.items:
+            raise TransitionFatalError("Cannot find order {0} in backorders, it was removed after the transition was "
+                                       "prepared".format(order_id))
+
+    def _remove_item(self, order_id):
+        self.total -= self.items.value(order_id, "quantity")
+        self.items.remove(order_id)
 
 
 class FulfilledState(TrackingState):
@@ -499,20 +978,21 @@ class FulfilledState(TrackingState):
         This item tracks when it was fulfilled and how.
         """
 
+        __slots__ = ("quantity", "date", "order_id", "invoice_id")
+
+        validations = (
+            ("quantity", ">=", 0),
+            ("date", "is not", None),
+            ("order_id", "is not", None),
+            ("invoice_id", "is not", None),
+        )
+
         def __init__(self, properties):
-            super(self.__class__, self).__init__()
             self.quantity = properties.get("quantity", 0)
             self.date = properties.get("date", None)
             self.order_id = properties.get("order_id", None)
             self.invoice_id = properties.get("invoice_id", None)
 
-            self.validations.extend([
-                (lambda i: i.quantity >= 0),
-                (lambda i: i.date is not None),
-                (lambda i: i.order_id is not None),
-                (lambda i: i.invoice_id is not None),
-            ])
-
     def __init__(self, name):
         super(self.__class__, self).__init__(name, self.FulfilledItem)
         self.items = {}
@@ -520,19 +1000,33 @@ class FulfilledState(TrackingState):
     def _track(self, item):
         # Invoices are immutable once entered
         if item.invoice_id in self.items:
-            yield self.TransitionValidationResult(False, "Invoice {0} already exists.".format(item.invoice_id))
+            raise TransitionValidationError("Invoice {0} already exists.".format(item.invoice_id))
+
+        return self._checked(self._check_add_item, self._add_item, item)
+
+    def _check_add_item(self, item):
+        if item.invoice_id in self.items:
+            raise TransitionFatalError("Invoice {0} was entered after the transition was prepared.".format(
+                item.invoice_id))
 
-        yield self.TransitionValidationResult(True, None)
+    def _add_item(self, item):
         self.items.update({item.invoice_id: item})
+        self.total += item.quantity
 
     def _get(self, invoice_id):
         return self.items.get(invoice_id, None)
 
+    def tracked_items(self):
+        return self.items.itervalues()
+
     def quantity(self, invoice_id=None):
         if invoice_id:
             return 0 if invoice_id not in self.items else self.items.get(invoice_id).quantity
         else:
-            return reduce(operator.add, [item.quantity for item in self.items.values()], 0)
+            return self._total()
+
+    def _recount(self):
+        return sum(item.quantity for item in self.items.itervalues())
 
 
 class PurchaseOrderState(TrackingState):
@@ -542,19 +1036,20 @@ class PurchaseOrderState(TrackingState):
         This item tracks when it was issue and when we expect it.
         """
 
+        __slots__ = ("quantity", "date", "eta_date", "purchase_order_id")
+
+        validations = (
+            ("quantity", ">=", 0),
+            ("date", "is not", None),
+            ("purchase_order_id", "is not", None),
+        )
+
         def __init__(self, properties):
-            super(self.__class__, self).__init__()
             self.quantity = properties.get("quantity", 0)
             self.date = properties.get("date", None)
             self.eta_date = properties.get("eta_date", None)
             self.purchase_order_id = properties.get("purchase_order_id", None)
 
-            self.validations.extend([
-                (lambda i: i.quantity >= 0),
-                (lambda i: i.date is not None),
-                (lambda i: i.purchase_order_id is not None),
-            ])
-
     def __init__(self, name):
         super(self.__class__, self).__init__(name, self.PurchasedItem)
         self.items = {}
@@ -562,37 +1057,60 @@ class PurchaseOrderState(TrackingState):
     def _track(self, item):
         # Purchase Orders are immutable once entered
         if item.purchase_order_id in self.items:
-            yield self.TransitionValidationResult(False, "Purchase {0} already exists.".format(item.purchase_order_id))
+            raise TransitionValidationError("Purchase {0} already exists.".format(item.purchase_order_id))
+
+        return self._checked(self._check_add_item, self._add_item, item)
 
-        yield self.TransitionValidationResult(True, None)
+    def _check_add_item(self, item):
+        if item.purchase_order_id in self.items:
+            raise TransitionFatalError("Purchase {0} was entered after the transition was prepared.".format(
+                item.purchase_order_id))
+
+    def _add_item(self, item):
         self.items.update({item.purchase_order_id: item})
+        self.total += item.quantity
 
     def _get(self, purchase_order_id):
         return self.items.get(purchase_order_id, None)
 
+    def tracked_items(self):
+        return self.items.itervalues()
+
     def quantity(self, purchase_order_id=None):
         if purchase_order_id:
             return 0 if purchase_order_id not in self.items else self.items.get(purchase_order_id).quantity
         else:
-            return reduce(operator.add, [item.quantity for item in self.items.values()], 0)
+            return self._total()
+
+    def _recount(self):
+        return sum(item.quantity for item in self.items.itervalues())
 
     def delivery(self, item):
-        purchase_order = self.items.get(item.purchase_order_id)
-        if not purchase_order:
+        if item.purchase_order_id not in self.items:
             message = "Could not find Purchase Order {0}.".format(item.purchase_order_id)
-            yield self.TransitionValidationResult(False, message)
+            raise TransitionValidationError(message)
 
-        yield self.TransitionValidationResult(True, None)
-        if purchase_order.quantity == item.quantity:
-            del self.items[purchase_order.purchase_order_id]
+        return self._checked(self._check_remove_quantity, self._remove_quantity, item.purchase_order_id,
+                             item.quantity)
+
+    def _check_remove_quantity(self, purchase_order_id, quantity):
+        if purchase_order_id not in self.items:
+            raise TransitionFatalError("Purchase Order {0} was removed after the transition was prepared.".format(
+                purchase_order_id))
+
+    def _remove_quantity(self, purchase_order_id, quantity):
+        purchase_order = self.items.get(purchase_order_id)
+        self.total -= quantity
+        if purchase_order.quantity == quantity:
+            del self.items[purchase_order_id]
         else:
-            purchase_order.quantity -= item.quantity
+            purchase_order.quantity -= quantity
 
     def cancel_purchase_order(self, args):
         # We don't usually allow this, but there is no logical transition for it
         if "purchase_order_id" not in args:
             raise TransitionActionError("Purchase Order ID not specified.")
-        self.items.pop(args["purchase_order_id"])
+        self.total -= self.items.pop(args["purchase_order_id"]).quantity
 
 
 class LostAndFoundState(TrackingState):
@@ -601,27 +1119,36 @@ class LostAndFoundState(TrackingState):
         Lost and Found items, due to mis-count or other mistake.
         """
 
+        __slots__ = ("quantity", "date")
+
+        validations = (
+            ("quantity", ">=", 0),
+            ("date", "is not", None),
+        )
+
         def __init__(self, properties):
-            super(self.__class__, self).__init__()
             self.quantity = properties.get("quantity", 0)
             self.date = properties.get("date", None)
 
-            self.validations.extend([
-                (lambda i: i.quantity >= 0),
-                (lambda i: i.date is not None),
-            ])
-
     def __init__(self, name):
         super(self.__class__, self).__init__(name, self.LostAndFoundItem)
         self.items = []
 
     def _track(self, item):
-        yield self.TransitionValidationResult(True, None)
+        return self._pending(self._add_item, item)
+
+    def _add_item(self, item):
         self.items.append(item)
+        self.total += item.quantity
 
     def quantity(self, key=None):
-        return reduce(operator.add, [item.quantity for item in self.items], 0)
+        return self._total()
+
+    def tracked_items(self):
+        return iter(self.items)
+
+    def _recount(self):
+        return sum(item.quantity for item in self.items)
 
     def found(self, item):
-        yield self.TransitionValidationResult(True, None)
-        self.track(item)
+        return self._track(item)
@@ -0,0 +1,60 @@
+from array import array
+from collections import namedtuple
+
+NO_DISCOUNT = float("nan")
+
+
+class DiscountMatrix(object):
+    """
+    Every discount held densely, a row per product price category and a column per customer discount tier.
+    Rows hold the multiplier taking a price to its net price (1 - discount), or NaN where there is no discount.
+    """
+
+    def __init__(self, discounts, tiers=None):
+        discounts = list(discounts)
+        self.tiers = list(tiers) if tiers is not None else \
+            sorted(set(discount.customer_discount_tier for discount in discounts))
+        self.categories = sorted(set(discount.product_price_category for discount in discounts))
+
+        columns = dict((tier, column) for column, tier in enumerate(self.tiers))
+        self.rows = dict((category, array("d", [NO_DISCOUNT] * len(self.tiers))) for category in self.categories)
+        for discount in discounts:
+            column = columns.get(discount.customer_discount_tier)
+            if column is not None:
+                self.rows[discount.product_price_category][column] = 1.0 - discount.value
+
+        self._no_discounts = array("d", [NO_DISCOUNT] * len(self.tiers))
+
+    def multipliers(self, price_category):
+        return self.rows.get(price_category, self._no_discounts)
+
+    def price(self, skus, prices, price_categories):
+        """
+        Net prices for many products in every tier, given their SKUs, prices and price categories.
+        Returns a PriceListChunk, products without a price or discount are priced as NaN.
+        """
+        width = len(self.tiers)
+        net_prices = array("d")
+        for price, price_category in zip(prices, price_categories):
+            if price is None:
+                net_prices.extend(self._no_discounts)
+            else:
+                net_prices.extend(price * multiplier for multiplier in self.multipliers(price_category))
+        return PriceListChunk(list(skus), self.tiers, width, net_prices)
+
+
+class PriceListChunk(namedtuple("PriceListChunk", "skus tiers width net_prices")):
+    """
+    Net prices for a run of products, net_prices holds a row of len(tiers) prices for each SKU, in order.
+    """
+    __slots__ = ()
+
+    def net_price(self, sku_index, tier):
+        return self.net_prices[sku_index * self.width + self.tiers.index(tier)]
+
+    def rows(self):
+        """
+        Yields (sku, [net price in each tier]) for each product.
+        """
+        for index, sku in enumerate(self.skus):
+            yield sku, self.net_prices[index * self.width:(index + 1) * self.width].tolist()
@@ -0,0 +1,18 @@
+from domain.shared.repository import Repository
+
+
+class DiscountRepository(Repository):
+
+    def find(self, price_category, discount_tier):
+        """
+        Find the discount for a product price category and customer discount tier.
+        Returns a Discount, or None if there is none.
+        """
+        raise NotImplementedError()
+
+    def find_all(self):
+        """
+        Find every discount, the whole matrix of price categories and discount tiers.
+        Returns a list of Discounts.
+        """
+        raise NotImplementedError()
@@ -7,11 +7,14 @@ from domain.model.product.price_value import PriceValue
 from domain.model.product.product_collection import ProductCollection
 
 class Product(Entity):
+
     def __init__(self, sku, name, price, price_category=None):
         self.sku = sku
         self.name = name
         self.collections = []
         self.flags = {}
+        # (price, valid from, valid until or None) of the current price, see get_price
+        self._current_price = None
 
         if not isinstance(price, PriceValue):
             raise TypeError()
@@ -25,11 +28,27 @@ class Product(Entity):
             raise TypeError()
 
         self.price_history.append(price)
+        self._current_price = None
 
     def get_price(self, date=None):
-        date = date if date else datetime.now()
-        price = self.price_history[date]
-        return price.value if price else None
+        """
+        The price at date, or the current price.
+        The current price is cached until the next scheduled price takes effect, or a price is set.
+        """
+        if date:
+            price = self.price_history[date]
+            return price.value if price else None
+
+        now = datetime.now()
+        current = self._current_price
+        if current is None or now < current[1] or (current[2] is not None and now >= current[2]):
+            current = self._current_price = self._find_current_price(now)
+        return current[0]
+
+    def _find_current_price(self, now):
+        price = self.price_history[now]
+        scheduled = self.price_history.after(now)
+        return price.value if price else None, now, scheduled.date if scheduled else None
 
     def get_prices_between(self, start, end):
         return map(lambda p: p.value, self.price_history[start:end])
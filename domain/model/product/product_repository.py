@@ -12,6 +12,14 @@ class ProductRepository(Repository):
         model = ProductModel.objects.get(sku=sku)
         return self.to_entity(model)
 
+    def find_many(self, skus):
+        """
+        Find many products at once.
+        Returns a dict of SKU to Product, SKUs without a product are left out.
+        """
+        models = ProductModel.objects.filter(sku__in=list(skus))
+        return dict((model.sku, self.to_entity(model)) for model in models)
+
     def add_price_category(self, name):
         category = ProductPriceCategory(name=name)
         category.save()
\ No newline at end of file
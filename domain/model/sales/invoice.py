@@ -1,5 +1,3 @@
-import operator
-
 from domain.shared.entity import Entity
 from domain.model.sales.line_item import LineItem
 
@@ -12,16 +10,23 @@ class Invoice(Entity):
         self.order_id = order_id if order_id else None
         self.customer_reference = customer_reference if customer_reference else None
         self.line_items = []
+        # SKU to its line items, kept in step with line_items by add_line_item
+        self._line_items_by_sku = {}
         self.finalised = False
 
     def tax(self):
-        return reduce(operator.add, [i.tax() for i in self.line_items], 0.00)
+        return sum((i.tax() for i in self.line_items), 0.00)
 
     def subtotal(self):
-        return reduce(operator.add, [i.subtotal() for i in self.line_items], 0.00)
+        return sum((i.subtotal() for i in self.line_items), 0.00)
 
     def total_amount(self):
-        return reduce(operator.add, [i.total() for i in self.line_items], 0.00)
+        return sum((i.total() for i in self.line_items), 0.00)
 
     def add_line_item(self, sku, quantity, price, discount, tax_rate=None):
-        self.line_items.append(LineItem(sku, quantity, price, discount, tax_rate=tax_rate))
+        line_item = LineItem(sku, quantity, price, discount, tax_rate=tax_rate)
+        self.line_items.append(line_item)
+        self._line_items_by_sku.setdefault(sku, []).append(line_item)
+
+    def get_line_items_for_sku(self, sku):
+        return list(self._line_items_by_sku.get(sku, ()))
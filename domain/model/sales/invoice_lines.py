@@ -0,0 +1,112 @@
+from array import array
+from collections import namedtuple
+
+
+class Totals(namedtuple("Totals", "subtotal tax total")):
+    """
+    Amounts summed over a set of invoice lines.
+    """
+    __slots__ = ()
+
+
+class InvoiceLines(object):
+    """
+    The line items of many invoices held as columns, for reporting over large sets of invoices.
+    Each line also records its invoice's customer, so lines can be totalled by customer, SKU or tax rate.
+    Amounts are calculated as LineItem calculates them, untaxed lines have a tax rate of None.
+    """
+
+    GROUP_BY = ("customer", "sku", "tax_rate")
+
+    def __init__(self, invoices=()):
+        self.customers = []
+        self.skus = []
+        self.quantities = array("d")
+        self.prices = array("d")
+        self.discounts = array("d")
+        self.tax_rates = array("d")
+        self.extend(invoices)
+
+    def __len__(self):
+        return len(self.skus)
+
+    def extend(self, invoices):
+        for invoice in invoices:
+            line_items = invoice.line_items
+            self.customers.extend([invoice.customer] * len(line_items))
+            self.skus.extend([line_item.sku for line_item in line_items])
+            self.quantities.extend([line_item.quantity for line_item in line_items])
+            self.prices.extend([line_item.price for line_item in line_items])
+            self.discounts.extend([line_item.discount for line_item in line_items])
+            self.tax_rates.extend([line_item.tax_rate or 0.00 for line_item in line_items])
+
+    def subtotals(self):
+        return array("d", [max(0, (price * (1.0 - discount)) * quantity)
+                           for price, discount, quantity in zip(self.prices, self.discounts, self.quantities)])
+
+    def taxes(self, subtotals=None):
+        subtotals = subtotals if subtotals is not None else self.subtotals()
+        return array("d", [subtotal * tax_rate for subtotal, tax_rate in zip(subtotals, self.tax_rates)])
+
+    def totals(self):
+        """
+        Returns the Totals of every line.
+        """
+        subtotals = self.subtotals()
+        taxes = self.taxes(subtotals)
+        return Totals(sum(subtotals, 0.00), sum(taxes, 0.00),
+                      sum([subtotal + tax for subtotal, tax in zip(subtotals, taxes)], 0.00))
+
+    def totals_by(self, group_by):
+        """
+        Returns a dict of customer, SKU or tax rate (None for untaxed lines) to the Totals of its lines.
+        """
+        if group_by not in self.GROUP_BY:
+            raise ValueError("Cannot group invoice lines by {0}".format(group_by))
+
+        if group_by == "customer":
+            keys = self.customers
+        elif group_by == "sku":
+            keys = self.skus
+        else:
+            keys = [tax_rate or None for tax_rate in self.tax_rates]
+
+        sums = {}
+        for key, subtotal, tax_rate in zip(keys, self.subtotals(), self.tax_rates):
+            tax = subtotal * tax_rate
+            amounts = sums.get(key)
+            if amounts is None:
+                amounts = sums[key] = [0.00, 0.00, 0.00]
+            amounts[0] += subtotal
+            amounts[1] += tax
+            amounts[2] += subtotal + tax
+        return dict((key, Totals(*amounts)) for key, amounts in sums.iteritems())
+
+    @classmethod
+    def aggregate(cls, invoices, group_by):
+        """
+        Total any number of invoices by customer, SKU or tax rate, see totals_by.
+        Each invoice is totalled straight from its LineItems as invoices is consumed, so no lines are held in memory.
+        """
+        if group_by not in cls.GROUP_BY:
+            raise ValueError("Cannot group invoice lines by {0}".format(group_by))
+
+        sums = {}
+        for invoice in invoices:
+            for line_item in invoice.line_items:
+                if group_by == "customer":
+                    key = invoice.customer
+                elif group_by == "sku":
+                    key = line_item.sku
+                else:
+                    key = line_item.tax_rate
+
+                subtotal = line_item.subtotal()
+                tax = subtotal * line_item.tax_rate if line_item.tax_rate else 0.00
+                amounts = sums.get(key)
+                if amounts is None:
+                    amounts = sums[key] = [0.00, 0.00, 0.00]
+                amounts[0] += subtotal
+                amounts[1] += tax
+                amounts[2] += subtotal + tax
+        return dict((key, Totals(*amounts)) for key, amounts in sums.iteritems())
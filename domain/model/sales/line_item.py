@@ -29,4 +29,5 @@ class LineItem(object):
         return max(0, (self.price * (1.0 - self.discount)) * self.quantity)
 
     def total(self):
-        return self.subtotal() + self.tax()
\ No newline at end of file
+        subtotal = self.subtotal()
+        return subtotal + subtotal * self.tax_rate if self.is_taxable() else subtotal
\ No newline at end of file
@@ -10,6 +10,8 @@ class Order(Entity):
         self.customer = customer
         self.order_date = order_date
         self.line_items = []
+        # SKU to its line items, kept in step with line_items by add_line_item
+        self._line_items_by_sku = {}
         self.acknowledgement_date = None
         self.customer_reference = customer_reference if customer_reference else None
 
@@ -23,10 +25,12 @@ class Order(Entity):
         return reduce(operator.add, [i.total() for i in self.line_items], 0.00)
 
     def add_line_item(self, sku, quantity, price, discount):
-        self.line_items.append(LineItem(sku, quantity, price, discount))
+        line_item = LineItem(sku, quantity, price, discount)
+        self.line_items.append(line_item)
+        self._line_items_by_sku.setdefault(sku, []).append(line_item)
 
     def get_line_items_for_sku(self, sku):
-        return [line_item for line_item in self.line_items if line_item.sku == sku]
+        return list(self._line_items_by_sku.get(sku, ()))
 
     def get_order_descriptor(self):
         item_descriptors = []
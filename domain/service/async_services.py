@@ -0,0 +1,120 @@
+from collections import OrderedDict
+
+from domain.shared.service import Service
+from domain.shared.concurrency import AsyncExecutor
+
+
+class AsyncService(Service):
+    """
+    Base class for asynchronous front-ends to a domain service.
+    Every call returns a future, whose get() waits for and returns the result or raises the service's error.
+    The wrapped service, and the domain model beneath it, is used unchanged and can still be called directly.
+    """
+
+    def __init__(self, service, executor=None):
+        self.service = service
+        self.executor = executor if executor is not None else AsyncExecutor()
+
+
+class AsyncOrderingService(AsyncService):
+    """
+    Creates orders in the background, with the repository lookups for each order made concurrently.
+    """
+
+    def create_order(self, customer, order_descriptors, customer_reference=None):
+        """
+        See OrderingService.create_order, returns a future of the order.
+        """
+        return self.executor.submit(self._create_order, customer, order_descriptors, customer_reference)
+
+    def create_orders(self, batch):
+        """
+        See OrderingService.create_orders, returns a future of the list of OrderResults.
+        """
+        return self.executor.submit(self.service.create_orders, batch)
+
+    def _create_order(self, customer, order_descriptors, customer_reference):
+        service = self.service
+        skus = list(OrderedDict.fromkeys(sku for sku, _ in order_descriptors))
+
+        # Start every lookup before waiting on any of them
+        customer_entity = self.executor.lookup(service.customer_repository, customer)
+        products = dict((sku, self.executor.lookup(service.product_repository, sku)) for sku in skus)
+        inventory_items = self._lookup_inventory_items(skus)
+
+        customer_entity = customer_entity.get()
+        products = self.executor.gather(products)
+
+        # Discounts only depend on the product's price category and the customer's discount tier
+        discounts = {}
+        if customer_entity:
+            for product in products.itervalues():
+                if product:
+                    key = (product.price_category, customer_entity.discount_tier)
+                    if key not in discounts:
+                        discounts[key] = self.executor.lookup_call(service.pricing_service.get_customer_discount,
+                                                                   product, customer_entity)
+
+        def find_discount(product, customer_entity):
+            return discounts[(product.price_category, customer_entity.discount_tier)].get()
+
+        inventory_items = self.executor.gather(inventory_items)
+
+        def refresh_inventory_items(skus):
+            inventory_items.update(self.executor.gather(self._lookup_inventory_items(skus)))
+
+        return service._create_order(customer, customer_entity, order_descriptors, customer_reference,
+                                     products.get, find_discount, inventory_items.get, refresh_inventory_items)
+
+    def _lookup_inventory_items(self, skus):
+        return dict((sku, self.executor.lookup(self.service.inventory_repository, sku)) for sku in skus)
+
+
+class AsyncInvoicingService(AsyncService):
+    """
+    Creates invoices in the background, finding the orders of a delivery concurrently.
+    """
+
+    def invoice_order(self, order_id):
+        """
+        See InvoicingService.invoice_order, returns a future of the invoice.
+        """
+        return self.executor.submit(self.service.invoice_order, order_id)
+
+    def invoice_delivery(self, delivery):
+        """
+        See InvoicingService.invoice_delivery, returns a future of the list of invoices.
+        """
+        return self.executor.submit(self._invoice_delivery, delivery)
+
+    def _invoice_delivery(self, delivery):
+        # Only the orders are found concurrently, invoices take IDs and share inventory items so are built here
+        orders = self.executor.gather(dict(
+            (order_id, self.executor.lookup(self.service.order_repository, order_id))
+            for order_id in delivery.get_order_descriptors()))
+
+        return self.service.invoice_delivery(delivery, orders=orders)
+
+
+class AsyncDeliveryService(AsyncService):
+    """
+    Creates deliveries in the background.
+    """
+
+    def create_delivery(self, customer, order_ids):
+        """
+        See DeliveryService.create_delivery, returns a future of the delivery.
+        """
+        return self.executor.submit(self.service.create_delivery, customer, order_ids)
+
+
+class AsyncPricingService(AsyncService):
+    """
+    Looks up prices in the background.
+    """
+
+    def get_customer_discount(self, product, customer):
+        """
+        See PricingService.get_customer_discount, returns a future of the discount.
+        """
+        return self.executor.lookup_call(self.service.get_customer_discount, product, customer)
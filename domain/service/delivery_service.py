@@ -1,4 +1,5 @@
 import datetime
+from collections import namedtuple
 
 from domain.shared.service import Service
 from domain.model.delivery.delivery import Delivery
@@ -15,27 +16,85 @@ class DeliveryService(Service):
         self.inventory_repository = inventory_repository
 
     def create_delivery(self, customer, order_ids):
+        return self._create_delivery(customer, self.customer_repository.find(customer), order_ids,
+                                     self.order_repository.find, self.inventory_repository.find,
+                                     lambda inventory_item: inventory_item.committed.has_unverified())
 
-        if not self.customer_repository.find(customer):
+    def plan_deliveries(self, customer_order_map, executor=None):
+        """
+        Creates a delivery for each customer, e.g. for the morning's dispatch run.
+        customer_order_map is a dict of customer to the list of order IDs to deliver to them, see create_delivery.
+        Customers and inventory items are each found with a single find_many, and orders once each, before the
+        deliveries are built. Building them is cheap, so they are built one after another unless given an
+        AsyncExecutor to build them on its pool, which must not be called from one of that pool's own workers.
+        Each delivery is created, or fails, on its own and a dict of customer to DeliveryResult is returned.
+        """
+        customers = self.customer_repository.find_many(customer_order_map)
+        order_ids = set(order_id for order_ids in customer_order_map.itervalues() for order_id in order_ids)
+        orders = dict((order_id, self.order_repository.find(order_id)) for order_id in order_ids)
+
+        skus = set(line_item.sku for order in orders.itervalues() if order for line_item in order.line_items)
+        inventory_items = self.inventory_repository.find_many(skus)
+        # Whether an item has unverified commitments only needs to be checked once, not for every order
+        unverified = set(sku for sku, inventory_item in inventory_items.iteritems()
+                         if inventory_item.committed.has_unverified())
+
+        def plan(customer):
+            try:
+                delivery = self._create_delivery(customer, customers.get(customer), customer_order_map[customer],
+                                                 orders.get, inventory_items.get,
+                                                 lambda inventory_item: inventory_item.sku in unverified)
+            except (ValueError, DeliveryError) as e:
+                return DeliveryResult(None, str(e))
+            return DeliveryResult(delivery, None)
+
+        if executor is None:
+            return dict((customer, plan(customer)) for customer in customer_order_map)
+
+        return executor.gather(dict((customer, executor.submit(plan, customer)) for customer in customer_order_map))
+
+    def _create_delivery(self, customer, customer_entity, order_ids, find_order, find_inventory_item,
+                         has_unverified):
+
+        if not customer_entity:
             raise ValueError("Cannot find specified customer for delivery")
 
         delivery = Delivery(None, customer, datetime.datetime.now())
 
         for order_id in order_ids:
-            order = self.order_repository.find(order_id)
+            order = find_order(order_id)
+            if not order:
+                raise DeliveryError("Cannot find Order with ID {0}".format(order_id))
 
             for line_item in order.line_items:
-                inventory_item = self.inventory_repository.find(line_item.sku)
+                inventory_item = find_inventory_item(line_item.sku)
+                if not inventory_item:
+                    raise DeliveryError("Cannot find Inventory Item for SKU={0}".format(line_item.sku))
 
-                if inventory_item.committed.get_unverified():
+                if has_unverified(inventory_item):
                     raise DeliveryError("Cannot create delivery from unverified order")
 
                 commitment = inventory_item.find_committed_for_order(order_id)
+                if not commitment:
+                    raise DeliveryError("Cannot find commitment of SKU={0} for Order ID {1}".format(line_item.sku,
+                                                                                                   order_id))
+
                 delivery.add_item(line_item.sku, commitment["quantity"], commitment["order_id"])
 
         return delivery
 
 
+class DeliveryResult(namedtuple("DeliveryResult", "delivery message")):
+    """
+    The result of planning one customer's delivery.
+    If unsuccessful, delivery is None and the failure message can be checked for a reason.
+    """
+    __slots__ = ()
+
+    def succeeded(self):
+        return self.delivery is not None
+
+
 class DeliveryError(Exception):
     """
     A generic exception which is thrown when delivery creation fails.
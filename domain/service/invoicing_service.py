@@ -1,21 +1,25 @@
 from datetime import datetime
 
 from domain.shared.service import Service
+from domain.shared.concurrency import RetryPolicy
 from domain.model.sales.invoice import Invoice
 
 
 class InvoicingService(Service):
     """
     A domain service which creates invoices from orders, but also indirectly via delivieries.
+    Fulfilling commitments on inventory items which were stored by someone else in the meantime is retried with
+    fresh items, according to retry_policy.
     """
 
     def __init__(self, customer_repository, invoice_repository, order_repository, inventory_repository,
-                 tax_rate_repository):
+                 tax_rate_repository, retry_policy=None):
         self.customer_repository = customer_repository
         self.invoice_repository = invoice_repository
         self.order_repository = order_repository
         self.inventory_repository = inventory_repository
         self.tax_rate_repository = tax_rate_repository
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
 
     def _validate_order_descriptor(self, order_descriptor):
         for descriptor in order_descriptor:
@@ -25,27 +29,29 @@ class InvoicingService(Service):
             if not descriptor_keys.issubset(expected_keys):
                 raise OrderDescriptorError("Invalid order descriptor: %s" % descriptor)
 
-    def _invoice_order(self, order_id, descriptors=None):
+    def _invoice_order(self, order_id, descriptors=None, lookups=None):
         """
         Create an invoice for the given order ID.
         Optionally invoice only the items in the provided descriptor.
         Otherwise, entire order will be invoiced.
+        Orders, customers, tax rates and inventory items are found through lookups, when shared with other invoices.
 
         An order descriptor has the format: [ { sku: X, quantity: Y }, ... ]
         """
+        lookups = lookups if lookups is not None else _Lookups(self)
 
-        order = self.order_repository.find(order_id)
+        order = lookups.order(order_id)
         if not order:
             raise InvoicingError("Cannot find Order with ID {0}".format(order_id))
         if not order.is_acknowledged():
             raise OrderUnacknowledgedError("Order {0} is not acknowledged".format(order_id))
 
-        customer = self.customer_repository.find(order.customer)
+        customer = lookups.customer(order.customer)
         if not customer:
             raise InvoicingError("Cannot find customer {0} for delivery for order {1}".format(order.customer,
                                                                                           order.order_id))
 
-        tax_rate = self.tax_rate_repository.find(customer.tax_category)
+        tax_rate = lookups.tax_rate(customer.tax_category)
 
         invoice_id = self.invoice_repository.next_id()
         invoice = Invoice(invoice_id, order.customer, datetime.now(), order_id=order_id,
@@ -60,7 +66,7 @@ class InvoicingService(Service):
             sku = descriptor.get("sku")
             quantity = descriptor.get("quantity")
 
-            inventory_item = self.inventory_repository.find(sku)
+            inventory_item = lookups.inventory_item(sku)
             if not inventory_item:
                 raise InvoicingError("Could not find SKU %s in Inventory" % sku)
 
@@ -77,9 +83,19 @@ class InvoicingService(Service):
 
         return invoice
 
-    def _finalise_invoice(self, invoice):
+    def _finalise_invoice(self, invoice, lookups=None):
+        lookups = lookups if lookups is not None else _Lookups(self)
+        self.retry_policy.run(lambda: self._fulfill_invoice(invoice, lookups),
+                              on_conflict=lambda e: lookups.forget_inventory_items())
+
+    def _fulfill_invoice(self, invoice, lookups):
+        """
+        Fulfill the commitments for every line item of an invoice, then store the inventory items together.
+        On a conflict the inventory items are forgotten, so a retry finds what was stored by someone else.
+        """
+        inventory_items = {}
         for line_item in invoice.line_items:
-            inventory_item = self.inventory_repository.find(line_item.sku)
+            inventory_item = inventory_items[line_item.sku] = lookups.inventory_item(line_item.sku)
             success = inventory_item.fulfill_commitment(line_item.quantity,
                                                         invoice.order_id,
                                                         invoice.invoice_id)
@@ -91,27 +107,88 @@ class InvoicingService(Service):
                     invoice.invoice_id)
                 raise InvoicingError("Could not fulfill commitment for: {0}".format(message))
 
-    def invoice_delivery(self, delivery):
+        self.inventory_repository.store_many(inventory_items.values())
+
+    def invoice_delivery(self, delivery, orders=None):
+        """
+        Invoice every order in a delivery.
+        The customer, tax rate and inventory items are found once for the whole delivery, the inventory items
+        with a single find_many. Orders which were already found, e.g. concurrently, can be given as a dict of
+        order ID to Order so they are not found again.
+        """
         order_descriptors = delivery.get_order_descriptors()
+        lookups = self._delivery_lookups(delivery)
+        if orders:
+            lookups.orders.update(orders)
 
         invoices = []
         for order_id, descriptors in order_descriptors.iteritems():
-            invoice = self._invoice_order(order_id, descriptors=descriptors)
+            invoice = self._invoice_order(order_id, descriptors=descriptors, lookups=lookups)
             invoices.append(invoice)
 
         # Finalise
         for invoice in invoices:
-            self._finalise_invoice(invoice)
+            self._finalise_invoice(invoice, lookups)
         else:
             map(lambda invoice: delivery.add_invoice(invoice.invoice_id), invoices)
 
         return invoices
 
     def invoice_order(self, order_id):
-        invoice = self._invoice_order(order_id)
-        self._finalise_invoice(invoice)
+        lookups = _Lookups(self)
+        invoice = self._invoice_order(order_id, lookups=lookups)
+        self._finalise_invoice(invoice, lookups)
         return invoice
 
+    def _delivery_lookups(self, delivery):
+        lookups = _Lookups(self)
+        lookups.find_inventory_items(item["sku"] for item in delivery.items)
+        return lookups
+
+
+class _Lookups(object):
+    """
+    The orders, customers, tax rates and inventory items found while invoicing, each found once and then shared.
+    Lookups are not locked, each call into InvoicingService builds its own and uses it from a single thread.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self.orders = {}
+        self.customers = {}
+        self.tax_rates = {}
+        self.inventory_items = {}
+
+    def order(self, order_id):
+        if order_id not in self.orders:
+            self.orders[order_id] = self.service.order_repository.find(order_id)
+        return self.orders[order_id]
+
+    def customer(self, name):
+        if name not in self.customers:
+            self.customers[name] = self.service.customer_repository.find(name)
+        return self.customers[name]
+
+    def tax_rate(self, tax_category):
+        if tax_category not in self.tax_rates:
+            self.tax_rates[tax_category] = self.service.tax_rate_repository.find(tax_category)
+        return self.tax_rates[tax_category]
+
+    def inventory_item(self, sku):
+        if sku not in self.inventory_items:
+            self.inventory_items[sku] = self.service.inventory_repository.find(sku)
+        return self.inventory_items[sku]
+
+    def find_inventory_items(self, skus):
+        skus = set(sku for sku in skus if sku not in self.inventory_items)
+        if skus:
+            found = self.service.inventory_repository.find_many(skus)
+            for sku in skus:
+                self.inventory_items[sku] = found.get(sku)
+
+    def forget_inventory_items(self):
+        self.inventory_items.clear()
+
 
 class InvoicingError(Exception):
     """
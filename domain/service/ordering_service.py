@@ -1,22 +1,30 @@
+from collections import namedtuple, OrderedDict
 from datetime import datetime
-import operator
 
 from domain.shared.service import Service
+from domain.shared.concurrency import NullLock, RetryPolicy, ConcurrencyConflictError
+from domain.service.pricing_service import PricingError
 from domain.model.sales.order import Order
 
 
 class OrderingService(Service):
     """
     A domain service which creates and manages orders.
+    When orders are created from many threads, locks must be a StripedLockTable keyed by SKU, the same table
+    the inventory items' locks come from.
+    Committing to inventory items which were stored by someone else in the meantime is retried with fresh items,
+    according to retry_policy.
     """
 
     def __init__(self, customer_repository, product_repository, order_repository, inventory_repository,
-                 pricing_service):
+                 pricing_service, locks=None, retry_policy=None):
         self.customer_repository = customer_repository
         self.product_repository = product_repository
         self.order_repository = order_repository
         self.inventory_repository = inventory_repository
         self.pricing_service = pricing_service
+        self.locks = locks
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
 
     def create_order(self, customer, order_descriptors, customer_reference=None):
         """
@@ -25,65 +33,134 @@ class OrderingService(Service):
         2) Auto-acknowledges order if not inventory verification required
         order_descriptor is a list of tuples: [ (sku, quantity) ]
         """
-        customer_entity = self.customer_repository.find(customer)
+        return self._create_order(customer, self.customer_repository.find(customer), order_descriptors,
+                                  customer_reference, self.product_repository.find,
+                                  self.pricing_service.get_customer_discount, self.inventory_repository.find,
+                                  lambda skus: None)
+
+    def create_orders(self, batch):
+        """
+        Creates many orders at once, e.g. from an EDI import.
+        batch is a list of tuples: [ (customer, order_descriptors, customer_reference) ], see create_order.
+        Customers, products, discounts and inventory items are each looked up once for the whole batch.
+        Each order is created, or fails, on its own and an OrderResult is returned for every order in the batch.
+        """
+        customers = self.customer_repository.find_many(set(customer for customer, _, _ in batch))
+        skus = set(sku for _, order_descriptors, _ in batch for sku, _ in order_descriptors)
+        products = self.product_repository.find_many(skus)
+        inventory_items = self.inventory_repository.find_many(skus)
+
+        # Discounts only depend on the product's price category and the customer's discount tier
+        discounts = {}
+
+        def find_discount(product, customer_entity):
+            key = (product.price_category, customer_entity.discount_tier)
+            if key not in discounts:
+                discounts[key] = self.pricing_service.get_customer_discount(product, customer_entity)
+            return discounts[key]
+
+        def refresh_inventory_items(skus):
+            inventory_items.update(self.inventory_repository.find_many(skus))
+
+        results = []
+        for customer, order_descriptors, customer_reference in batch:
+            try:
+                order = self._create_order(customer, customers.get(customer), order_descriptors, customer_reference,
+                                           products.get, find_discount, inventory_items.get, refresh_inventory_items)
+            except (OrderingError, PricingError, ConcurrencyConflictError) as e:
+                results.append(OrderResult(None, str(e)))
+            else:
+                results.append(OrderResult(order, None))
+
+        return results
+
+    def _create_order(self, customer, customer_entity, order_descriptors, customer_reference,
+                      find_product, find_discount, find_inventory_item, refresh_inventory_items):
         if not customer_entity:
             raise OrderingError("Cannot find specified customer for order")
 
+        line_items = self._price_line_items(customer_entity, order_descriptors, find_product, find_discount)
+
+        # Only take an order ID once the order is known to be valid
         order = Order(self.order_repository.next_id(), customer, datetime.now(), customer_reference=customer_reference)
-        self._add_order_line_items(order, customer_entity, order_descriptors)
-        self._auto_acknowledge_order(order)
+        for line_item in line_items:
+            order.add_line_item(*line_item)
+        self._auto_acknowledge_order(order, find_inventory_item, refresh_inventory_items)
 
         customer_entity.submit_order(order.order_id)
 
         return order
 
-    def _add_order_line_items(self, order, customer, order_descriptors):
+    def _price_line_items(self, customer, order_descriptors, find_product, find_discount):
+        """
+        Look up the price and discount of each line item, returns a list of tuples: [ (sku, quantity, price, discount) ]
+        """
+        line_items = []
         for sku, quantity in order_descriptors:
-            product = self.product_repository.find(sku)
+            product = find_product(sku)
             if not product:
                 raise OrderingError("Unknown product SKU: {0}".format(sku))
 
-            discount = self.pricing_service.get_customer_discount(product, customer)
+            discount = find_discount(product, customer)
 
-            order.add_line_item(sku, quantity, product.get_price(), discount)
+            line_items.append((sku, quantity, product.get_price(), discount))
+        return line_items
 
-    def _auto_acknowledge_order(self, order):
+    def _auto_acknowledge_order(self, order, find_inventory_item, refresh_inventory_items):
         """
-        Acknowledge an order and commit its line items to the inventory.
+        Acknowledge an order and commit its line items to the inventory, one commit per SKU.
+        Stock for every SKU is reserved before any of it is committed, and the inventory items are stored together,
+        so either all line items are committed or none.
+        If any inventory item was stored by someone else in the meantime, the SKUs are refreshed and the commit retried.
         Acknowledgement fails if any inventory item needs verification.
         """
 
-        inventory_commits = []
-        inventory_verifications = []
-
+        quantities = OrderedDict()
         for line_item in order.line_items:
-            inventory_item = self.inventory_repository.find(line_item.sku)
-            if not inventory_item:
-                message = "Cannot find Inventory Item for SKU={0}".format(line_item.sku)
-                raise OrderingError(message)
-
-            # Delay commit and verification of inventory item
-            do_commit = lambda commit: inventory_item.commit(line_item.quantity, order.order_id, dry_run=not commit)
-            inventory_commits.append(do_commit)
-
-            needs_verify = lambda: inventory_item.needs_stock_verified(order.order_id)
-            inventory_verifications.append(needs_verify)
-
-        dry_run = map(lambda do_commit: do_commit(False), inventory_commits)
-        commits_will_succeed = reduce(operator.and_, dry_run, True)
-
-        # Inventory checks for all line items succeeded, proceed with commit
-        if commits_will_succeed:
-            map(lambda do_commit: do_commit(True), inventory_commits)
-        else:
-            raise OrderingError("Cannot commit all items in order to inventory")
-
-        can_acknowledge = reduce(operator.and_,
-                                 map(lambda verify: not verify(), inventory_verifications),
-                                 True)
+            quantities[line_item.sku] = quantities.get(line_item.sku, 0) + line_item.quantity
+
+        can_acknowledge = self.retry_policy.run(
+            lambda: self._commit_to_inventory(order, quantities, find_inventory_item),
+            on_conflict=lambda e: refresh_inventory_items(quantities.keys()))
         if can_acknowledge:
             order.acknowledge(datetime.now())
 
+    def _commit_to_inventory(self, order, quantities, find_inventory_item):
+        # Hold every SKU's lock from reservation until commit, taken in one go to avoid deadlocks
+        with self._locked(quantities.keys()):
+            reservations = []
+            for sku, quantity in quantities.iteritems():
+                inventory_item = find_inventory_item(sku)
+                if not inventory_item:
+                    message = "Cannot find Inventory Item for SKU={0}".format(sku)
+                    raise OrderingError(message)
+
+                reservation = inventory_item.reserve(quantity, order.order_id)
+                if reservation is None:
+                    raise OrderingError("Cannot commit all items in order to inventory")
+                reservations.append((inventory_item, reservation))
+
+            # Inventory checks for all line items succeeded, proceed with commit
+            for inventory_item, reservation in reservations:
+                inventory_item.commit_reservation(reservation)
+            self.inventory_repository.store_many([inventory_item for inventory_item, _ in reservations])
+
+            return not any(inventory_item.needs_stock_verified(order.order_id) for inventory_item, _ in reservations)
+
+    def _locked(self, skus):
+        return self.locks.locked(skus) if self.locks is not None else NullLock()
+
+
+class OrderResult(namedtuple("OrderResult", "order message")):
+    """
+    The result of creating one order in a batch.
+    If unsuccessful, order is None and the failure message can be checked for a reason.
+    """
+    __slots__ = ()
+
+    def succeeded(self):
+        return self.order is not None
+
 
 class OrderingError(Exception):
     """
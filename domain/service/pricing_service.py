@@ -1,13 +1,28 @@
+from itertools import islice
+
 from domain.shared.service import Service
+from domain.shared.cache import Cache
+from domain.model.pricing.discount_matrix import DiscountMatrix
 
 
 class PricingService(Service):
+    """
+    A domain service which prices products for customers.
+    Discounts are always found in the repository, unless given a discount_cache_size to cache up to that many by
+    product price category and customer discount tier, for up to discount_ttl seconds. When a cached discount is
+    changed, invalidate_discount must be called for it to be seen before then.
+    """
 
-    def __init__(self, discount_repository):
+    def __init__(self, discount_repository, discount_cache_size=0, discount_ttl=300):
         self.discount_repository = discount_repository
+        self.discounts = Cache(max_size=discount_cache_size, ttl=discount_ttl)
 
     def get_customer_discount(self, product, customer):
-        rate = self.discount_repository.find(product.price_category, customer.discount_tier)
+        find = lambda: self.discount_repository.find(product.price_category, customer.discount_tier)
+        if self.discounts.max_size:
+            rate = self.discounts.get_or_load((product.price_category, customer.discount_tier), find)
+        else:
+            rate = find()
 
         if not rate:
             message = "Product Category={0} Discount Tier={1}".format(product.price_category, customer.discount_tier)
@@ -15,9 +30,52 @@ class PricingService(Service):
 
         return rate.value
 
+    def price_list(self, products, tiers=None, date=None, chunk_size=1000):
+        """
+        Price every product for every customer discount tier (by default, every tier with a discount), at date.
+        All discounts are found with one repository call and held as a DiscountMatrix.
+        products may be any iterable, and is consumed chunk_size products at a time, yielding a PriceListChunk
+        for each so that only one chunk is held in memory.
+        """
+        matrix = DiscountMatrix(self.discount_repository.find_all(), tiers)
+
+        products = iter(products)
+        while True:
+            chunk = list(islice(products, chunk_size))
+            if not chunk:
+                break
+            yield matrix.price([product.sku for product in chunk],
+                               [product.get_price(date) for product in chunk],
+                               [product.price_category for product in chunk])
+
+    def warm(self):
+        """
+        Load every discount into the cache with one repository call. Does nothing when discounts are not cached.
+        """
+        if not self.discounts.max_size:
+            return
+
+        for discount in self.discount_repository.find_all():
+            self.discounts.put((discount.product_price_category, discount.customer_discount_tier), discount)
+
+    def invalidate_discount(self, discount):
+        """
+        Forget the cached discount for a changed (or removed) Discount.
+        """
+        self.discounts.invalidate((discount.product_price_category, discount.customer_discount_tier))
+
+    def invalidate_discounts(self):
+        self.discounts.clear()
+
+    def discount_cache_stats(self):
+        """
+        Returns a dict of the discount cache's size, hits, misses and evictions.
+        """
+        return self.discounts.stats()
+
 
 class PricingError(Exception):
     """
     Generic error if pricing service fails.
     """
-    pass
\ No newline at end of file
+    pass
@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class Cache(object):
+    """
+    A bounded, thread safe, least recently used cache.
+    Entries older than ttl seconds are treated as missing, a ttl of None keeps entries until they are evicted.
+    Counts hits, misses and evictions.
+    """
+
+    def __init__(self, max_size=1024, ttl=None, clock=time.time):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self.entries.pop(key, None)
+            if entry is None or self._expired(entry):
+                self.misses += 1
+                return default
+
+            # Re-insert to mark as most recently used
+            self.entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        with self._lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (value, self.clock())
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, load):
+        """
+        Return the value cached for key, otherwise the value returned by load(), which is cached unless None.
+        """
+        value = self.get(key)
+        if value is None:
+            value = load()
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self.entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def _expired(self, entry):
+        return self.ttl is not None and self.clock() - entry[1] > self.ttl
@@ -0,0 +1,161 @@
+import functools
+import threading
+from multiprocessing.pool import ThreadPool
+
+from domain.shared.repository import AsyncRepository
+
+
+class StripedLockTable(object):
+    """
+    A fixed number of re-entrant locks shared between any number of keys (e.g. SKUs), each key always maps to the
+    same lock. Locks for many keys must be taken with locked() so they are always acquired in the same order.
+    """
+
+    def __init__(self, stripes=64):
+        self.locks = [threading.RLock() for _ in xrange(stripes)]
+
+    def _stripe(self, key):
+        return hash(key) % len(self.locks)
+
+    def lock_for(self, key):
+        return self.locks[self._stripe(key)]
+
+    def locked(self, keys):
+        """
+        A context which holds the locks for all keys.
+        Keys sharing a lock only take it once, and locks are taken in stripe order so two threads can never each
+        hold a lock the other is waiting on.
+        """
+        return _MultiLock([self.locks[stripe] for stripe in sorted(set(self._stripe(key) for key in keys))])
+
+
+class _MultiLock(object):
+    def __init__(self, locks):
+        self.locks = locks
+
+    def __enter__(self):
+        for lock in self.locks:
+            lock.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for lock in reversed(self.locks):
+            lock.release()
+
+
+class NullLock(object):
+    """
+    A lock which does nothing, for objects which are only used by one thread.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def acquire(self, blocking=True):
+        return True
+
+    def release(self):
+        pass
+
+
+def synchronized(method):
+    """
+    Decorate a method to hold self.lock while it runs.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class ConcurrencyConflictError(Exception):
+    """
+    An entity was changed and stored by someone else since it was found, so changes made to it cannot be stored.
+    """
+    pass
+
+
+class RetryPolicy(object):
+    """
+    Runs a unit of work, trying it again when it conflicts with a concurrent change, up to attempts times in all.
+    Counts the conflicts, retries and units of work which still conflicted on their last attempt.
+    """
+
+    def __init__(self, attempts=3):
+        self.attempts = attempts
+        self.conflicts = 0
+        self.retries = 0
+        self.failures = 0
+        self._counters_lock = threading.Lock()
+
+    def run(self, work, on_conflict=None):
+        """
+        Returns the result of work().
+        on_conflict is called with the ConcurrencyConflictError before each retry, e.g. to discard stale entities.
+        """
+        for attempt in xrange(1, self.attempts + 1):
+            try:
+                return work()
+            except ConcurrencyConflictError as e:
+                if attempt == self.attempts:
+                    self._count(conflicts=1, failures=1)
+                    raise
+                self._count(conflicts=1, retries=1)
+                if on_conflict:
+                    on_conflict(e)
+
+    def counters(self):
+        with self._counters_lock:
+            return {"conflicts": self.conflicts, "retries": self.retries, "failures": self.failures}
+
+    def _count(self, conflicts=0, retries=0, failures=0):
+        with self._counters_lock:
+            self.conflicts += conflicts
+            self.retries += retries
+            self.failures += failures
+
+
+class AsyncExecutor(object):
+    """
+    Runs work in the background, returning futures whose get() waits for and returns the result (or raises).
+    Calls into services run on a pool of workers, repository lookups run on a pool of their own.
+    Work running on the service pool may wait on lookups, but lookups must never wait on anything else,
+    so a full service pool can never deadlock waiting on lookups queued behind it.
+    """
+
+    def __init__(self, workers=4, lookup_workers=16):
+        self.pool = ThreadPool(workers)
+        self.lookup_pool = ThreadPool(lookup_workers)
+
+    def submit(self, func, *args, **kwargs):
+        return self.pool.apply_async(func, args, kwargs)
+
+    def lookup(self, repository, *key):
+        """
+        Start finding an entity by its key.
+        An AsyncRepository is asked with find_async, otherwise find runs on the lookup pool.
+        """
+        if isinstance(repository, AsyncRepository):
+            return repository.find_async(*key)
+        return self.lookup_pool.apply_async(repository.find, key)
+
+    def lookup_call(self, func, *args):
+        """
+        Start a call which only looks things up, e.g. a PricingService query.
+        """
+        return self.lookup_pool.apply_async(func, args)
+
+    def gather(self, futures):
+        """
+        Wait for a dict of key to future, returns a dict of key to result.
+        """
+        return dict((key, future.get()) for key, future in futures.iteritems())
+
+    def close(self):
+        for pool in (self.pool, self.lookup_pool):
+            pool.close()
+            pool.join()
@@ -1,3 +1,6 @@
+from bisect import bisect_left, bisect_right
+
+
 class HistoricalValue(object):
     '''
     An (immutable) Value at a given datetime.
@@ -13,22 +16,69 @@ class HistoricalValue(object):
 class HistoricalValueCollection(object):
     '''
     A set of values, each associated with a specific datetime.
-    Allow querying for values at a given datetime.
+    Allow querying for values at a given datetime, or between two datetimes (also by slicing, e.g. values[start:end]).
+    Values are kept in date order alongside a list of their dates, which is binary searched.
+    Appending values in date order (e.g. a new price) is the fast path and keeps them sorted, values appended out of
+    order are set aside and sorted in with a single sort when next queried.
     '''
 
     def __init__(self):
-        self.history = []
+        self.dates = []
+        self.values = []
+        # Values appended out of date order, in the order they were appended
+        self.unsorted = []
 
     def __getitem__(self, item):
+        if isinstance(item, slice):
+            return self.in_range(item.start, item.stop)
         return self.at_date(item)
 
+    def __len__(self):
+        return len(self.values) + len(self.unsorted)
+
+    @property
+    def history(self):
+        # Newest first
+        self._sort()
+        return self.values[::-1]
+
     def append(self, value):
-        self.history.append(value)
-        self.history.sort(reverse=True)
+        if not self.unsorted and (not self.dates or value.date > self.dates[-1]):
+            self.dates.append(value.date)
+            self.values.append(value)
+        else:
+            self.unsorted.append(value)
+
+    def _sort(self):
+        if not self.unsorted:
+            return
+
+        # Each value goes before any appended earlier with the same date, so the first appended stays the one found
+        # at that date. Everything set aside was appended after the sorted values, and the sort is stable.
+        values = self.unsorted[::-1] + self.values
+        values.sort(key=lambda value: value.date)
+        self.values = values
+        self.dates = [value.date for value in values]
+        self.unsorted = []
 
     def at_date(self, date):
-        # Get the first value in the history whose date is lte to the provided one
-        return next((value for value in self.history if value.date <= date), None)
+        # Get the last value whose date is lte to the provided one
+        self._sort()
+        index = bisect_right(self.dates, date)
+        return self.values[index - 1] if index else None
+
+    def after(self, date):
+        # Get the first value whose date is gt the provided one, i.e. the next to take effect
+        self._sort()
+        index = bisect_right(self.dates, date)
+        return self.values[index] if index < len(self.values) else None
 
     def in_range(self, start, end):
-        return next((value for value in self.history if start <= value.date <= end), None)
+        """
+        Every value dated between start and end inclusive, newest first.
+        Either may be None to leave the range open.
+        """
+        self._sort()
+        low = bisect_left(self.dates, start) if start is not None else 0
+        high = bisect_right(self.dates, end) if end is not None else len(self.dates)
+        return self.values[low:high][::-1]
@@ -13,4 +13,16 @@ class Repository(object):
         raise NotImplementedError()
 
     def delete(self, id):
-        raise NotImplementedError()
\ No newline at end of file
+        raise NotImplementedError()
+
+
+class AsyncRepository(Repository):
+    """
+    Abstract base class for repositories which can look entities up without blocking.
+    """
+
+    def find_async(self, id):
+        """
+        Start finding an entity, returns a future whose get() waits for and returns it.
+        """
+        raise NotImplementedError()
@@ -26,6 +26,16 @@ class DeliveryTestCase(TestCase):
         self.assertEquals(10, order_1.get("deliver_quantity"), "Wrong delivery qty set for ORD001")
         self.assertEquals(2, order_2.get("deliver_quantity"), "Wrong delivery qty set for ORD002")
 
+    def test_delivery_duplicate_items(self):
+        delivery = DeliveryFactory.build()
+
+        delivery.add_item("PROD001", 10, "ORD001")
+        delivery.add_item("PROD001", 5, "ORD001")
+        delivery.adjust_deliver_quantity("PROD001", 7, "ORD001")
+
+        self.assertEquals([7, 0], [item["deliver_quantity"] for item in delivery.items],
+                          "First item added should be adjusted")
+
     @raises(KeyError)
     def test_adjust_nonexistent_item(self):
         delivery = DeliveryFactory.build()
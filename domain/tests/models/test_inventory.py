@@ -1,10 +1,15 @@
 import datetime
+import threading
 
 from unittest import TestCase, skip
 from nose.tools import raises
 
+from domain.shared.concurrency import StripedLockTable
 from domain.tests.factories.inventory import InventoryItemFactory
 from domain.model.inventory.tracking_state_machine import *
+from domain.model.inventory.item_store import ColumnarItemStore
+from domain.model.inventory.inventory_journal import InventoryJournal
+from domain.model.inventory.inventory_items import InventoryItem
 
 
 class InventoryStatesTestCase(TestCase):
@@ -32,6 +37,18 @@ class InventoryStatesTestCase(TestCase):
         transition = self.machine.transition("foobar", None, None)
         self.assertIsInstance(transition, type(lambda: None), "Transition was not a null op")
 
+    @raises(TransitionValidationError)
+    def test_perform_transition_invalid_item(self):
+        self.machine.state("OnHand").track({"quantity": 10})
+        self.machine.transition("commit", {"quantity": -1}, {"quantity": 1, "order_id": "ORD001"})
+
+    def test_transition_is_compiled(self):
+        plan = self.machine.transitions.get("commit")
+
+        self.assertIsInstance(plan, TransitionPlan, "Transition was not compiled into a plan")
+        self.assertEquals(self.machine.state("OnHand"), plan.from_state, "Plan bound to wrong from-state")
+        self.assertEquals(self.machine.state("Committed"), plan.to_state, "Plan bound to wrong to-state")
+
     @raises(TransitionActionError)
     def test_invalid_action(self):
         self.machine.add_action("foobar", "OnHand")
@@ -73,6 +90,267 @@ class InventoryStatesTestCase(TestCase):
         self.assertEquals(10, self.machine.state("Committed").quantity(), "Wrong number of items committed")
 
 
+    def test_prepare_transition(self):
+        self.machine.state("OnHand").track({"quantity": 10})
+        now = datetime.datetime.now()
+
+        mutation = self.machine.prepare("commit", {"quantity": 4}, {"quantity": 4, "order_id": "ORD001", "date": now})
+
+        self.assertEquals(10, self.machine.state("OnHand").quantity(), "Prepare should not change On Hand quantity")
+        self.assertEquals(0, self.machine.state("Committed").quantity(), "Prepare should not commit items")
+
+        mutation.apply()
+
+        self.assertEquals(6, self.machine.state("OnHand").quantity(), "On Hand quantity not reduced")
+        self.assertEquals(4, self.machine.state("Committed").quantity(), "Wrong number of items committed")
+
+    @raises(TransitionValidationError)
+    def test_prepare_invalid_transition(self):
+        self.machine.state("OnHand").track({"quantity": 1})
+        self.machine.prepare("commit", {"quantity": 4}, {"quantity": 4, "order_id": "ORD001",
+                                                         "date": datetime.datetime.now()})
+
+    @raises(TransitionFatalError)
+    def test_apply_stale_prepared_transition(self):
+        self.machine.state("OnHand").track({"quantity": 5})
+        now = datetime.datetime.now()
+
+        first = self.machine.prepare("commit", {"quantity": 4}, {"quantity": 4, "order_id": "ORD001", "date": now})
+        second = self.machine.prepare("commit", {"quantity": 4}, {"quantity": 4, "order_id": "ORD002", "date": now})
+        first.apply()
+
+        try:
+            second.apply()
+        finally:
+            self.assertEquals(1, self.machine.state("OnHand").quantity(), "Stale mutation should not reduce On Hand")
+            self.assertEquals(4, self.machine.state("Committed").quantity(), "Stale mutation should not commit")
+
+    def _fulfillment(self, item, quantity, invoice_id):
+        now = datetime.datetime.now()
+        return item.tracker.prepare("fulfill", {"quantity": quantity, "order_id": "ORD001", "date": now},
+                                    {"quantity": quantity, "order_id": "ORD001", "invoice_id": invoice_id,
+                                     "date": now})
+
+    @raises(TransitionFatalError)
+    def test_apply_all_stale_partial_fulfillments(self):
+        item = InventoryItemFactory.build()
+        item.enter_stock_on_hand(10)
+        item.commit(5, "ORD001")
+
+        try:
+            apply_all([self._fulfillment(item, 3, "INV001"), self._fulfillment(item, 3, "INV002")])
+        finally:
+            self.assertEquals(2, item.committed.quantity(), "Stale fulfillment should not reduce commitment")
+            self.assertEquals(3, item.fulfilled.quantity(), "Stale fulfillment should not be fulfilled")
+
+    @raises(TransitionFatalError)
+    def test_apply_stale_full_fulfillment(self):
+        item = InventoryItemFactory.build()
+        item.enter_stock_on_hand(10)
+        item.commit(5, "ORD001")
+
+        first = self._fulfillment(item, 5, "INV001")
+        second = self._fulfillment(item, 5, "INV002")
+        first.apply()
+
+        try:
+            second.apply()
+        finally:
+            self.assertEquals(0, item.committed.quantity(), "Commitment should only be fulfilled once")
+            self.assertEquals(5, item.fulfilled.quantity(), "Stale fulfillment should not be fulfilled")
+
+    @raises(TransitionFatalError)
+    def test_apply_stale_fulfillment_checks_both_states(self):
+        item = InventoryItemFactory.build()
+        item.enter_stock_on_hand(10)
+        item.commit(5, "ORD001")
+
+        first = self._fulfillment(item, 2, "INV001")
+        second = self._fulfillment(item, 2, "INV001")
+        first.apply()
+
+        try:
+            second.apply()
+        finally:
+            self.assertEquals(3, item.committed.quantity(), "Commitment should not be reduced for an existing invoice")
+            self.assertEquals(2, item.fulfilled.quantity(), "Invoice should only be fulfilled once")
+
+    def test_apply_all_prepared(self):
+        other = TrackingStateMachine()
+        other.add_state(OnHandState("OnHand"))
+        other.add_state(CommittedState("Committed"))
+        other.add_transition("commit", "OnHand", "Committed")
+
+        now = datetime.datetime.now()
+        mutations = []
+        for machine in (self.machine, other):
+            machine.state("OnHand").track({"quantity": 3})
+            mutations.append(machine.prepare("commit", {"quantity": 2},
+                                             {"quantity": 2, "order_id": "ORD001", "date": now}))
+
+        apply_all(mutations)
+
+        for machine in (self.machine, other):
+            self.assertEquals(1, machine.state("OnHand").quantity(), "On Hand quantity not reduced")
+            self.assertEquals(2, machine.state("Committed").quantity(), "Wrong number of items committed")
+
+    def test_transition_many(self):
+        self.machine.state("OnHand").track({"quantity": 10})
+        now = datetime.datetime.now()
+
+        results = self.machine.transition_many([
+            ("commit", {"quantity": 4}, {"quantity": 4, "order_id": "ORD001", "date": now}),
+            ("commit", {"quantity": 7}, {"quantity": 7, "order_id": "ORD002", "date": now}),
+            ("foobar", {"quantity": 1}, {"quantity": 1, "order_id": "ORD003", "date": now}),
+            ("commit", {"quantity": 6}, {"quantity": 6, "order_id": "ORD004", "date": now}),
+        ])
+
+        self.assertEquals([True, False, False, True], [result.succeeded() for result in results],
+                          "Wrong movements succeeded")
+        self.assertIsNotNone(results[1].message, "Failed movement should explain why")
+        self.assertEquals(0, self.machine.state("OnHand").quantity(), "On Hand quantity not reduced")
+        self.assertEquals(10, self.machine.state("Committed").quantity(), "Wrong number of items committed")
+        self.assertIsNone(self.machine.state("Committed").get("ORD002"), "Failed movement was applied")
+
+        # Compiled transitions still act on the same states after a batch
+        self.machine.state("OnHand").track({"quantity": 1})
+        self.machine.transition("commit", {"quantity": 1}, {"quantity": 1, "order_id": "ORD005", "date": now})
+        self.assertEquals(11, self.machine.state("Committed").quantity(), "Wrong number of items committed")
+
+    def test_transition_many_dry_run(self):
+        self.machine.state("OnHand").track({"quantity": 10})
+        now = datetime.datetime.now()
+
+        results = self.machine.transition_many([
+            ("commit", {"quantity": 4}, {"quantity": 4, "order_id": "ORD001", "date": now}),
+            ("commit", {"quantity": 7}, {"quantity": 7, "order_id": "ORD002", "date": now}),
+        ], dry_run=True)
+
+        self.assertEquals([True, False], [result.succeeded() for result in results], "Wrong movements succeeded")
+        self.assertEquals(10, self.machine.state("OnHand").quantity(), "Dry run changed On Hand quantity")
+        self.assertEquals(0, self.machine.state("Committed").quantity(), "Dry run committed items")
+
+
+class TrackingItemTestCase(TestCase):
+
+    def test_item_validations(self):
+        now = datetime.datetime.now()
+
+        self.assertTrue(CommittedState.CommittedItem({"quantity": 1, "order_id": "ORD001", "date": now}).validate(),
+                        "Valid item failed validation")
+        self.assertFalse(CommittedState.CommittedItem({"quantity": 0, "order_id": "ORD001", "date": now}).validate(),
+                         "Item with no quantity passed validation")
+        self.assertFalse(CommittedState.CommittedItem({"quantity": 1, "date": now}).validate(),
+                         "Item with no order passed validation")
+
+    def test_item_export(self):
+        now = datetime.datetime.now()
+        item = FulfilledState.FulfilledItem({"quantity": 1, "order_id": "ORD001", "invoice_id": "INV001", "date": now})
+
+        self.assertEquals({"quantity": 1, "order_id": "ORD001", "invoice_id": "INV001", "date": now}, item.export(),
+                          "Exported item has wrong properties")
+        self.assertFalse(hasattr(item, "__dict__"), "Items should only store their declared properties")
+
+    @raises(ValueError)
+    def test_item_invalid_validation_operator(self):
+        class FooItem(TrackingState.TrackingItem):
+            __slots__ = ("foo",)
+            validations = (("foo", "in", ()),)
+
+
+class ColumnarItemStoreTestCase(TestCase):
+
+    def setUp(self):
+        self.store = ColumnarItemStore(CommittedState.CommittedItem, "order_id", ("quantity", "unverified_quantity"))
+        self.date = datetime.datetime(2013, 4, 1, 9, 30, 15, 123456)
+
+        for n in range(3):
+            self.store.put(CommittedState.CommittedItem({"quantity": n + 1, "unverified_quantity": n,
+                                                         "order_id": "ORD00{0}".format(n), "date": self.date}))
+
+    def test_get_materialises_item(self):
+        item = self.store.get("ORD001")
+
+        self.assertEquals({"quantity": 2, "unverified_quantity": 1, "order_id": "ORD001", "date": self.date},
+                          item.export(), "Materialised item does not match stored item")
+        self.assertIsNone(self.store.get("ORDXXX"), "Should not have found item")
+
+    def test_update_values(self):
+        self.store.add_value("ORD001", "quantity", 5)
+        self.store.set_value("ORD001", "unverified_quantity", 0)
+
+        self.assertEquals(7, self.store.value("ORD001", "quantity"), "Quantity was not updated")
+        self.assertEquals(0, self.store.get("ORD001").unverified_quantity, "Unverified quantity was not updated")
+        self.assertEquals(6, sum(self.store.column("quantity")) - 5, "Other rows should not have changed")
+
+    def test_remove(self):
+        self.store.remove("ORD000")
+
+        self.assertEquals(2, len(self.store), "Item was not removed")
+        self.assertFalse("ORD000" in self.store, "Item was not removed")
+        self.assertEquals(3, self.store.value("ORD002", "quantity"), "Moved row has wrong quantity")
+        self.assertEquals(["ORD002", "ORD001"], list(self.store), "Last row should fill the removed row")
+
+        self.store.remove("ORD001")
+        self.store.remove("ORD002")
+        self.assertEquals(0, len(self.store), "Store should be empty")
+
+    def test_large_values(self):
+        date = datetime.datetime(2200, 1, 1)
+        self.store.put(CommittedState.CommittedItem({"quantity": 2 ** 40, "unverified_quantity": 0,
+                                                     "order_id": "ORD003", "date": date}))
+
+        self.assertEquals({"quantity": 2 ** 40, "unverified_quantity": 0, "order_id": "ORD003", "date": date},
+                          self.store.get("ORD003").export(), "Large values should be stored without overflowing")
+
+    def test_timezone_aware_date(self):
+        class AEST(datetime.tzinfo):
+            def utcoffset(self, date):
+                return datetime.timedelta(hours=10)
+
+        self.store.put(CommittedState.CommittedItem({"quantity": 1, "unverified_quantity": 0, "order_id": "ORD003",
+                                                     "date": datetime.datetime(2013, 4, 1, 19, 30, tzinfo=AEST())}))
+
+        self.assertEquals(datetime.datetime(2013, 4, 1, 9, 30), self.store.value("ORD003", "date"),
+                          "Aware dates should be stored as their UTC time")
+
+
+class InventoryRunningTotalsTestCase(TestCase):
+
+    def setUp(self):
+        TrackingState.check_totals = True
+
+    def tearDown(self):
+        TrackingState.check_totals = False
+
+    def test_totals_match_recount(self):
+        item = InventoryItemFactory.build(on_hand_buffer=1)
+        item.enter_stock_on_hand(5)
+        item.purchase_item(4, "PO001")
+        item.purchase_item(2, "PO002")
+
+        item.commit(3, "ORD001")
+        item.commit(4, "ORD002")
+        item.fulfill_commitment(1, "ORD001", "INV001")
+        item.backorder_commitment(1, "ORD001")
+        item.deliver_purchase_order(3, "PO001")
+        item.cancel_purchase_order("PO002")
+        item.fulfill_backorder(2, "ORD002")
+        item.cancel_backorder("ORD001")
+        item.verify_stock_level(3)
+
+        for state in (item.committed, item.backorders, item.fulfilled, item.purchase_orders, item.lost, item.found):
+            self.assertEquals(state._recount(), state.quantity(), "Running total for {0} is wrong".format(state.name))
+
+    @raises(StateConsistencyError)
+    def test_diverged_total(self):
+        item = InventoryItemFactory.build()
+        item.commit(3, "ORD001")
+
+        item.backorders.total += 1
+        item.quantity_backordered()
+
+
 class InventoryOnHandTestCase(TestCase):
 
     def test_enter_stock_on_hand(self):
@@ -330,6 +608,107 @@ class InventoryCommitWithBufferTestCase(TestCase):
         item.verify_stock_level(6)
 
 
+class InventoryUnverifiedIndexTestCase(TestCase):
+
+    def test_unverified_index(self):
+        item = InventoryItemFactory.build(on_hand_buffer=2)
+        item.enter_stock_on_hand(5)
+
+        item.commit(2, "ORD001")
+        item.commit(2, "ORD0021")
+
+        self.assertFalse(item.needs_stock_verified("ORD001"), "ORD001 was committed from verified stock")
+        self.assertTrue(item.needs_stock_verified("ORD0021"), "ORD0021 should require verification")
+        self.assertFalse(item.needs_stock_verified("ORD002"), "Orders are only matched on their whole ID")
+        self.assertEquals(["ORD0021"], [i.order_id for i in item.committed.get_unverified()],
+                          "Wrong commitments need verification")
+
+        item.verify_stock_level(5)
+
+        for order_id in ("ORD001", "ORD002", "ORD0021"):
+            self.assertFalse(item.needs_stock_verified(order_id), "{0} should be verified".format(order_id))
+        self.assertEquals([], item.committed.get_unverified(), "No commitments should need verification")
+
+
+class InventoryVerifyOldestFirstTestCase(TestCase):
+
+    def setUp(self):
+        self.committed = CommittedState("Committed")
+        now = datetime.datetime.now()
+
+        # Tracked out of date order
+        for order_id, days_ago in (("ORD002", 2), ("ORD003", 1), ("ORD001", 3)):
+            self.committed.track({"quantity": 2, "order_id": order_id,
+                                  "date": now - datetime.timedelta(days=days_ago)})
+
+    def test_verify_oldest_first(self):
+        self.committed.verify({"quantity": 3})
+
+        self.assertTrue(self.committed.is_verified("ORD001"), "Oldest commitment should be verified")
+        self.assertFalse(self.committed.is_verified("ORD002"), "ORD002 should be partially unverified")
+        self.assertFalse(self.committed.is_verified("ORD003"), "Newest commitment should be unverified")
+
+        self.assertEquals(1, self.committed.get("ORD002")["quantity"], "ORD002 should keep 1 verified")
+        self.assertEquals(1, self.committed.get("ORD002")["unverified_quantity"], "ORD002 should have 1 unverified")
+        self.assertEquals(2, self.committed.get("ORD003")["unverified_quantity"], "ORD003 should be all unverified")
+        self.assertEquals(6, self.committed.quantity(), "Verify should not change the committed quantity")
+
+    def test_verify_again(self):
+        self.committed.verify({"quantity": 2})
+        self.committed.track({"quantity": 2, "order_id": "ORD004", "date": datetime.datetime.now()})
+        self.committed.verify({"quantity": 6})
+
+        for order_id in ("ORD001", "ORD002", "ORD003"):
+            self.assertTrue(self.committed.is_verified(order_id), "{0} should be verified".format(order_id))
+        self.assertEquals(2, self.committed.get("ORD004")["unverified_quantity"], "Newest commitment is unverified")
+        self.assertEquals(8, self.committed.quantity(), "Verify should not change the committed quantity")
+
+        self.committed.verify({"quantity": 2})
+        self.assertFalse(self.committed.is_verified("ORD002"), "ORD002 should be unverified by a short count again")
+
+    def test_verify_recommitted_order(self):
+        self.committed.fulfill(CommittedState.CommittedItem({"quantity": 2, "order_id": "ORD001"})).apply()
+        self.committed.track({"quantity": 2, "order_id": "ORD001", "date": datetime.datetime.now()})
+        self.committed.verify({"quantity": 4})
+
+        self.assertFalse(self.committed.is_verified("ORD001"), "Recommitted order is now the newest commitment")
+        self.assertTrue(self.committed.is_verified("ORD002"), "ORD002 is now the oldest commitment")
+        self.assertTrue(self.committed.is_verified("ORD003"), "ORD003 should be verified")
+        self.assertEquals(len(self.committed.items), len(self.committed.oldest_first),
+                          "Date heap should have one entry per commitment")
+
+    def test_oldest_first_after_removals(self):
+        now = datetime.datetime.now()
+        days_ago = [(n * 7) % 40 for n in xrange(40)]
+        for n, days in enumerate(days_ago):
+            self.committed.track({"quantity": 1, "order_id": "ORD1{0:02d}".format(n),
+                                  "date": now - datetime.timedelta(days=days, hours=1)})
+        for n in xrange(0, 40, 3):
+            fulfilled = CommittedState.CommittedItem({"quantity": 1, "order_id": "ORD1{0:02d}".format(n)})
+            self.committed.fulfill(fulfilled).apply()
+
+        expected = sorted(self.committed.items, key=lambda order_id: self.committed.items.value(order_id, "date"))
+        keys = self.committed.items.keys
+        self.assertEquals(expected, [keys[row] for row in self.committed._iter_oldest_first()],
+                          "Commitments should be iterated oldest first")
+        self.assertEquals(range(len(keys)), [self.committed.oldest_first[position]
+                                             for position in self.committed.heap_positions],
+                          "Heap positions should point back at their rows")
+
+    def test_unverified_oldest_first(self):
+        self.committed.verify({"quantity": 0})
+
+        self.assertEquals(["ORD001", "ORD002", "ORD003"], [i.order_id for i in self.committed.get_unverified()],
+                          "Unverified commitments should be listed oldest first")
+
+    def test_verify_after_fulfill(self):
+        self.committed.fulfill(CommittedState.CommittedItem({"quantity": 2, "order_id": "ORD001"})).apply()
+        self.committed.verify({"quantity": 2})
+
+        self.assertTrue(self.committed.is_verified("ORD002"), "ORD002 is now the oldest commitment")
+        self.assertFalse(self.committed.is_verified("ORD003"), "Newest commitment should be unverified")
+
+
 class InventoryBackordersTestCase(TestCase):
 
     def test_fulfill_backorder_partial(self):
@@ -475,6 +854,197 @@ class InventoryPurchaseOrderTestCase(TestCase):
         self.assertEquals(14, item.effective_quantity_on_hand(), "Should now be 14 items on hand")
 
 
+class InventoryTransitionManyTestCase(TestCase):
+
+    def test_transition_many(self):
+        item = InventoryItemFactory.build()
+        item.enter_stock_on_hand(5)
+        item.purchase_item(10, "PO001")
+
+        results = item.transition_many([
+            ("delivery", {"quantity": 10, "purchase_order_id": "PO001"}, {"quantity": 10}),
+            ("commit", {"quantity": 12}, {"quantity": 12, "order_id": "ORD001"}),
+            ("fulfill", {"quantity": 5, "order_id": "ORD001"},
+             {"quantity": 5, "order_id": "ORD001", "invoice_id": "INV001"}),
+            ("fulfill", {"quantity": 50, "order_id": "ORD001"},
+             {"quantity": 50, "order_id": "ORD001", "invoice_id": "INV002"}),
+        ])
+
+        self.assertEquals([True, True, True, False], [result.succeeded() for result in results],
+                          "Wrong movements succeeded")
+        self.assertEquals(0, item.quantity_purchased(), "Purchase order was not delivered")
+        self.assertEquals(3, item.effective_quantity_on_hand(), "Incorrect on hand count")
+        self.assertEquals(7, item.quantity_committed(), "Incorrect committed count")
+        self.assertEquals(5, item.quantity_fulfilled(), "Incorrect fulfilled count")
+        self.assertEquals(item.find_committed_for_order("ORD001")["date"],
+                          item.find_fulfillment_for_invoice("INV001")["date"],
+                          "Movements in a batch should share a date")
+
+
+class InventoryReservationTestCase(TestCase):
+
+    def test_reserve(self):
+        item = InventoryItemFactory.build(journal=InventoryJournal())
+        item.enter_stock_on_hand(10)
+
+        reservation = item.reserve(12, "ORD001")
+        self.assertIsNotNone(reservation, "Reservation should have succeeded")
+        self.assertEquals(10, item.effective_quantity_on_hand(), "Reserving should not change on hand quantity")
+        self.assertEquals(0, item.quantity_backordered(), "Reserving should not create backorders")
+
+        item.commit_reservation(reservation)
+        self.assertEquals(0, item.effective_quantity_on_hand(), "On hand quantity was not committed")
+        self.assertEquals(10, item.quantity_committed(), "Incorrect committed count")
+        self.assertEquals(2, item.quantity_backordered(), "Incorrect backordered count")
+        self.assertEquals(["OnHand", "Backorder", "commit"], [entry.name for entry in item.journal.entries],
+                          "Committed reservation was not journalled")
+
+    def test_reserve_fails(self):
+        item = InventoryItemFactory.build(on_hand_buffer=5)
+        item.enter_stock_on_hand(5)
+
+        # Nothing can be committed as verified, so the commitment would be empty
+        self.assertIsNone(item.reserve(2, "ORD001"), "Reservation should have failed")
+
+    @raises(TransitionValidationError)
+    def test_reservation_out_of_date(self):
+        item = InventoryItemFactory.build()
+        item.enter_stock_on_hand(10)
+
+        reservation = item.reserve(8, "ORD001")
+        item.commit(8, "ORD002")
+        item.commit_reservation(reservation)
+
+    def test_failed_reservation_changes_nothing(self):
+        item = InventoryItemFactory.build(journal=InventoryJournal())
+        item.enter_stock_on_hand(10)
+
+        # Backorders 2 then commits 10, which will no longer be on hand
+        reservation = item.reserve(12, "ORD001")
+        item.tracker.prepare("commit", {"quantity": 5},
+                             {"quantity": 5, "order_id": "ORD002", "date": datetime.datetime.now()}).apply()
+
+        with self.assertRaises(TransitionFatalError):
+            item.commit_reservation(reservation)
+
+        self.assertEquals(0, item.quantity_backordered(), "Failed reservation should not backorder")
+        self.assertEquals(5, item.quantity_committed(), "Failed reservation should not commit")
+        self.assertEquals(5, item.effective_quantity_on_hand(), "Failed reservation should not change on hand")
+        self.assertEquals(1, item.version, "Failed reservation should not change the version")
+        self.assertEquals(["OnHand"], [entry.name for entry in item.journal.entries],
+                          "Failed reservation should not be journalled")
+
+
+class InventoryConcurrencyTestCase(TestCase):
+
+    def test_striped_locks(self):
+        locks = StripedLockTable(stripes=4)
+
+        self.assertIs(locks.lock_for("PROD001"), locks.lock_for("PROD001"), "SKU should always have the same lock")
+
+        held = locks.locked(["PROD003", "PROD001", "PROD002", "PROD001"]).locks
+        self.assertEquals(len(held), len(set(held)), "Shared locks should only be taken once")
+        self.assertEquals(sorted(held, key=locks.locks.index), held, "Locks should be taken in stripe order")
+
+    def test_concurrent_commits(self):
+        locks = StripedLockTable()
+        item = InventoryItemFactory.build(lock=locks.lock_for("PROD001"))
+        item.enter_stock_on_hand(100)
+
+        def commit_many(worker):
+            for n in xrange(50):
+                item.commit(1, "ORD{0}-{1}".format(worker, n))
+
+        workers = [threading.Thread(target=commit_many, args=(worker,)) for worker in xrange(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEquals(0, item.effective_quantity_on_hand(), "All stock should have been committed")
+        self.assertEquals(100, item.quantity_committed(), "Stock was committed more than once")
+        self.assertEquals(100, item.quantity_backordered(), "Remaining orders should have been backordered")
+
+
+class InventoryJournalTestCase(TestCase):
+
+    def _movements(self, item):
+        item.enter_stock_on_hand(5)
+        item.purchase_item(4, "PO001")
+        item.purchase_item(2, "PO002")
+
+        item.commit(3, "ORD001")
+        item.commit(4, "ORD002")
+        item.fulfill_commitment(1, "ORD001", "INV001")
+        item.backorder_commitment(1, "ORD001")
+        item.deliver_purchase_order(3, "PO001")
+        item.cancel_purchase_order("PO002")
+        item.fulfill_backorder(2, "ORD002")
+        item.cancel_backorder("ORD001")
+        item.verify_stock_level(3)
+
+    def assertSameItem(self, expected, actual):
+        for name, state in expected.tracker.states.iteritems():
+            self.assertEquals(state.quantity(), actual.tracker.state(name).quantity(),
+                              "Rebuilt {0} has the wrong quantity".format(name))
+
+        for order_id in ("ORD001", "ORD002"):
+            self.assertEquals(expected.find_committed_for_order(order_id), actual.find_committed_for_order(order_id),
+                              "Rebuilt commitment for {0} is wrong".format(order_id))
+            self.assertEquals(expected.find_backorder_for_order(order_id), actual.find_backorder_for_order(order_id),
+                              "Rebuilt backorder for {0} is wrong".format(order_id))
+
+    def test_journal_records_movements(self):
+        item = InventoryItemFactory.build(journal=InventoryJournal())
+        item.enter_stock_on_hand(5)
+        item.commit(2, "ORD001")
+        item.verify_stock_level(3)
+
+        self.assertEquals([(InventoryJournal.TRACK, "OnHand"), (InventoryJournal.TRANSITION, "commit"),
+                           (InventoryJournal.ACTION, "verify"), (InventoryJournal.TRANSITION, "lost")],
+                          [(entry.kind, entry.name) for entry in item.journal.entries],
+                          "Wrong movements were journalled")
+
+    def test_not_journalled_by_default(self):
+        item = InventoryItemFactory.build()
+        item.enter_stock_on_hand(5)
+
+        self.assertIsNone(item.journal, "Items should not be journalled unless given a journal")
+        self.assertEquals(1, item.version, "Movements should still be versioned")
+
+    def test_failed_movement_not_recorded(self):
+        item = InventoryItemFactory.build(journal=InventoryJournal())
+        item.enter_stock_on_hand(5)
+
+        self.assertFalse(item.revert(1, "ORD001"), "Revert of bogus commitment did not fail")
+        item.commit(2, "ORD001", dry_run=True)
+
+        self.assertEquals(1, len(item.journal), "Only entering stock should have been journalled")
+
+    def test_rebuild(self):
+        item = InventoryItemFactory.build(on_hand_buffer=1, journal=InventoryJournal())
+        self._movements(item)
+
+        self.assertIsNone(item.journal.snapshot, "No snapshot should have been taken yet")
+        self.assertSameItem(item, InventoryItem.rebuild(item.sku, item.journal, on_hand_buffer=1))
+
+    def test_rebuild_from_snapshot(self):
+        item = InventoryItemFactory.build(on_hand_buffer=1, journal=InventoryJournal(snapshot_interval=4))
+        self._movements(item)
+
+        self.assertEquals(len(item.journal) // 4 * 4, item.journal.snapshot_sequence, "Snapshot was not taken")
+        self.assertEquals(len(item.journal) % 4, len(item.journal.entries),
+                          "Only entries since the snapshot should be kept")
+        self.assertEquals(item.version, len(item.journal), "Every movement should be counted")
+        rebuilt = InventoryItem.rebuild(item.sku, item.journal, on_hand_buffer=1)
+        self.assertSameItem(item, rebuilt)
+
+        # The snapshot is unaffected by changes to the rebuilt states
+        rebuilt.on_hand.track({"quantity": 10})
+        rebuilt.committed.verify({"quantity": 0})
+        self.assertSameItem(item, InventoryItem.rebuild(item.sku, item.journal, on_hand_buffer=1))
+
+
 class InventoryLostAndFoundTestCase(TestCase):
 
     def test_lost_and_found(self):
@@ -1,5 +1,6 @@
 import datetime
 
+from mock import patch
 from unittest import TestCase
 from nose.tools import raises
 
@@ -48,6 +49,60 @@ class ProductPriceTestCase(TestCase):
 
         self.assertIsNone(p.get_price(date=now - datetime.timedelta(weeks=2)), "Price 2 weeks ago no undefined")
 
+    def test_product_prices_between(self):
+        now = datetime.datetime.now()
+        p = ProductFactory.build(price=PriceValueFactory.build(price=100.00, date=now))
+        for days, price in ((1, 150.00), (3, 130.00), (7, 120.00)):
+            p.set_price(PriceValueFactory.build(price=price, date=now - datetime.timedelta(days=days)))
+
+        self.assertEquals([150.00, 130.00],
+                          p.get_prices_between(now - datetime.timedelta(days=5), now - datetime.timedelta(days=1)),
+                          "Prices between 5 days and a day ago incorrect")
+        self.assertEquals([100.00, 150.00, 130.00, 120.00], p.get_prices_between(None, None),
+                          "All prices, newest first, incorrect")
+        self.assertEquals([], p.get_prices_between(now - datetime.timedelta(weeks=3), now - datetime.timedelta(weeks=2)),
+                          "No prices should be found")
+
+    def test_product_price_same_date(self):
+        now = datetime.datetime.now()
+        p = ProductFactory.build(price=PriceValueFactory.build(price=100.00, date=now))
+        p.set_price(PriceValueFactory.build(price=90.00, date=now))
+
+        self.assertEquals(100.00, p.get_price(date=now), "First price set for a date should be kept")
+
+    def test_product_price_same_date_out_of_order(self):
+        now = datetime.datetime.now()
+        last_week = now - datetime.timedelta(weeks=1)
+        p = ProductFactory.build(price=PriceValueFactory.build(price=100.00, date=now))
+        p.set_price(PriceValueFactory.build(price=130.00, date=last_week))
+        self.assertEquals(130.00, p.get_price(date=last_week), "Price set out of order incorrect")
+
+        p.set_price(PriceValueFactory.build(price=120.00, date=last_week))
+        p.set_price(PriceValueFactory.build(price=110.00, date=last_week - datetime.timedelta(days=1)))
+
+        self.assertEquals(130.00, p.get_price(date=last_week), "First price set for a date should be kept")
+        self.assertEquals([100.00, 130.00, 120.00, 110.00], p.get_prices_between(None, None),
+                          "All prices, newest first, incorrect")
+
+    def test_product_current_price_cached(self):
+        now = datetime.datetime.now()
+        p = ProductFactory.build(price=PriceValueFactory.build(price=100.00, date=now))
+        p.set_price(PriceValueFactory.build(price=80.00, date=now + datetime.timedelta(days=1)))
+
+        with patch("domain.model.product.product.datetime") as clock:
+            clock.now.return_value = now + datetime.timedelta(hours=1)
+            self.assertEquals(100.00, p.get_price(), "Current price incorrect")
+            self.assertEquals(now + datetime.timedelta(days=1), p._current_price[2],
+                              "Current price should be cached until the scheduled price")
+
+            clock.now.return_value = now + datetime.timedelta(days=2, hours=1)
+            self.assertEquals(80.00, p.get_price(), "Scheduled price should take effect")
+
+            p.set_price(PriceValueFactory.build(price=70.00, date=now + datetime.timedelta(days=2)))
+            self.assertEquals(70.00, p.get_price(), "Setting a price should replace the cached price")
+
+        self.assertEquals(100.00, p.get_price(date=now + datetime.timedelta(hours=1)), "Historical price incorrect")
+
 class ProductCollectionTestCase(TestCase):
 
     def test_product_collection_empty(self):
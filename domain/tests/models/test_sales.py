@@ -1,6 +1,7 @@
 from datetime import datetime
 from unittest import TestCase, skip
 
+from domain.model.sales.invoice_lines import InvoiceLines
 from domain.tests.factories.sales import OrderFactory, InvoiceFactory
 
 
@@ -36,6 +37,19 @@ class SalesOrderTestCase(TestCase):
 
         self.assertEquals(0.0, order.total_amount(), "Order amount should be zero, not negative")
 
+    def test_order_line_items_for_sku(self):
+        order = OrderFactory.build()
+        order.add_line_item("PROD000", 1, 100.00, 0.10)
+        order.add_line_item("PROD001", 1, 10.00, 0.00)
+        order.add_line_item("PROD000", 2, 90.00, 0.00)
+
+        line_items = order.get_line_items_for_sku("PROD000")
+        self.assertEquals([order.line_items[0], order.line_items[2]], line_items, "Incorrect line items for PROD000")
+        self.assertEquals([], order.get_line_items_for_sku("PRODXXX"), "Should not have found line items")
+
+        line_items.pop()
+        self.assertEquals(2, len(order.get_line_items_for_sku("PROD000")), "Line items should not be shared")
+
 
 class SalesInvoiceTestCase(TestCase):
     def test_invoice_is_accepted(self):
@@ -83,3 +97,67 @@ class SalesInvoiceTestCase(TestCase):
         invoice.add_line_item("PROD000", 1, 1.00, 2.0) # 200% discount
 
         self.assertEquals(0.0, invoice.total_amount(), "Invoice amount should be zero, not negative")
+
+    def test_invoice_line_items_for_sku(self):
+        invoice = InvoiceFactory.build()
+        invoice.add_line_item("PROD000", 1, 100.00, 0.20, tax_rate=0.10)
+        invoice.add_line_item("PROD001", 1, 10.00, 0.10)
+        invoice.add_line_item("PROD000", 2, 100.00, 0.20, tax_rate=0.10)
+
+        self.assertEquals([invoice.line_items[0], invoice.line_items[2]], invoice.get_line_items_for_sku("PROD000"),
+                          "Incorrect line items for PROD000")
+
+
+class InvoiceLinesTestCase(TestCase):
+    def setUp(self):
+        invoice1 = InvoiceFactory.build(customer="Customer A")
+        invoice1.add_line_item("PROD000", 1, 100.00, 0.20, tax_rate=0.10)
+        invoice1.add_line_item("PROD001", 1, 10.00, 0.10, tax_rate=None)
+
+        invoice2 = InvoiceFactory.build(customer="Customer B")
+        invoice2.add_line_item("PROD000", 2, 100.00, 0.20, tax_rate=0.10)
+        invoice2.add_line_item("PROD002", 1, 1.00, 2.0, tax_rate=0.20)
+
+        self.invoices = [invoice1, invoice2, InvoiceFactory.build(customer="Customer C")]
+
+    def test_invoice_lines_totals(self):
+        lines = InvoiceLines(self.invoices)
+
+        self.assertEquals(4, len(lines), "Incorrect number of lines")
+        self.assertEquals([80.00, 9.00, 160.00, 0.00], list(lines.subtotals()), "Incorrect line subtotals")
+        totals = lines.totals()
+        self.assertEquals(sum(invoice.subtotal() for invoice in self.invoices), totals.subtotal, "Incorrect subtotal")
+        self.assertEquals(sum(invoice.tax() for invoice in self.invoices), totals.tax, "Incorrect tax")
+        self.assertEquals(sum(invoice.total_amount() for invoice in self.invoices), totals.total, "Incorrect total")
+
+    def test_invoice_lines_totals_by(self):
+        lines = InvoiceLines(self.invoices)
+
+        by_customer = lines.totals_by("customer")
+        self.assertEquals(self.invoices[0].total_amount(), by_customer["Customer A"].total, "Incorrect total")
+        self.assertEquals(self.invoices[1].tax(), by_customer["Customer B"].tax, "Incorrect tax")
+        self.assertFalse("Customer C" in by_customer, "Customer without lines should not be totalled")
+
+        by_sku = lines.totals_by("sku")
+        self.assertEquals(240.00, by_sku["PROD000"].subtotal, "Incorrect subtotal for PROD000")
+
+        by_tax_rate = lines.totals_by("tax_rate")
+        self.assertEquals([None, 0.10, 0.20], sorted(by_tax_rate), "Incorrect tax rates")
+        self.assertEquals(9.00, by_tax_rate[None].total, "Untaxed lines total incorrect")
+
+        with self.assertRaises(ValueError):
+            lines.totals_by("invoice_date")
+
+    def test_invoice_lines_aggregate(self):
+        totals = InvoiceLines.aggregate(iter(self.invoices * 3), "customer")
+
+        self.assertEquals(3 * self.invoices[0].total_amount(), totals["Customer A"].total, "Incorrect total")
+        self.assertEquals(3 * self.invoices[1].subtotal(), totals["Customer B"].subtotal, "Incorrect subtotal")
+
+        lines = InvoiceLines(self.invoices)
+        for group_by in ("sku", "tax_rate"):
+            self.assertEquals(lines.totals_by(group_by), InvoiceLines.aggregate(self.invoices, group_by),
+                              "Aggregate by {0} should total as totals_by does".format(group_by))
+
+        with self.assertRaises(ValueError):
+            InvoiceLines.aggregate(self.invoices, "invoice_date")
@@ -0,0 +1,176 @@
+import threading
+
+from mock import Mock
+from unittest import TestCase
+
+from domain.shared.concurrency import AsyncExecutor
+from domain.shared.repository import AsyncRepository
+from domain.model.pricing.discount import Discount
+from domain.service.async_services import AsyncOrderingService, AsyncInvoicingService, AsyncPricingService
+from domain.service.invoicing_service import InvoicingService
+from domain.service.ordering_service import OrderingService, OrderingError
+from domain.service.pricing_service import PricingService, PricingError
+from domain.tests.factories.customer import CustomerFactory
+from domain.tests.factories.delivery import DeliveryFactory
+from domain.tests.factories.inventory import InventoryItemFactory
+from domain.tests.factories.product import ProductFactory, PriceValueFactory
+from domain.tests.factories.sales import OrderFactory
+
+
+class InMemoryAsyncRepository(AsyncRepository):
+
+    def __init__(self, entities):
+        self.entities = entities
+
+    def find(self, key):
+        return self.entities.get(key)
+
+    def find_async(self, key):
+        result = Mock()
+        result.get = Mock(return_value=self.entities.get(key))
+        return result
+
+
+class AsyncOrderingServiceTestCase(TestCase):
+
+    def setUp(self):
+        self.executor = AsyncExecutor(workers=2, lookup_workers=4)
+
+        discounts = {
+            ("MANF-A", "GRADE-A"): Discount(0.3, "MANF-A", "GRADE-A"),
+            ("MANF-B", "GRADE-A"): Discount(0.1, "MANF-B", "GRADE-A")
+        }
+        self.discount_repository = Mock()
+        self.discount_repository.find = Mock(side_effect=lambda category, tier: discounts.get((category, tier)))
+
+        self.customer_repository = Mock()
+        self.customer_repository.find = Mock(return_value=CustomerFactory.build(name="Customer"))
+
+        prod1 = ProductFactory.build(sku="PROD001", price_category="MANF-A")
+        prod1.set_price(PriceValueFactory.build(price=100.00))
+        prod2 = ProductFactory.build(sku="PROD002", price_category="MANF-B")
+        prod2.set_price(PriceValueFactory.build(price=20.00))
+        self.product_repository = Mock()
+        self.product_repository.find = Mock(side_effect={"PROD001": prod1, "PROD002": prod2}.get)
+
+        inv_prod1 = InventoryItemFactory.build(sku="PROD001")
+        inv_prod1.enter_stock_on_hand(10)
+        inv_prod2 = InventoryItemFactory.build(sku="PROD002")
+        inv_prod2.enter_stock_on_hand(10)
+        self.inventory_repository = InMemoryAsyncRepository({"PROD001": inv_prod1, "PROD002": inv_prod2})
+        self.inventory_repository.store_many = Mock()
+
+        self.order_repository = Mock()
+        self.order_repository.next_id = Mock(return_value="ORD001")
+
+        self.service = OrderingService(self.customer_repository, self.product_repository, self.order_repository,
+                                       self.inventory_repository, PricingService(self.discount_repository))
+
+    def tearDown(self):
+        self.executor.close()
+
+    def test_create_order(self):
+        service = AsyncOrderingService(self.service, self.executor)
+
+        order = service.create_order("Customer", [("PROD001", 1), ("PROD002", 3), ("PROD001", 2)]).get()
+
+        self.assertTrue(order.is_acknowledged(), "Order should have been acknowledged")
+        self.assertEquals(3, len(order.line_items), "Order should contain 3 line items")
+        self.assertEquals([0.3, 0.1, 0.3], [line_item.discount for line_item in order.line_items],
+                          "Incorrect discounts")
+        self.assertEquals(3, self.inventory_repository.entities["PROD001"].quantity_committed(),
+                          "Incorrect quantity committed for PROD001")
+        self.assertEquals(2, self.product_repository.find.call_count, "Each product should be looked up once")
+        self.assertEquals(2, self.discount_repository.find.call_count, "Each discount should be looked up once")
+
+    def test_create_order_fails(self):
+        service = AsyncOrderingService(self.service, self.executor)
+
+        result = service.create_order("Customer", [("PROD999", 1)])
+
+        with self.assertRaises(OrderingError):
+            result.get()
+
+    def test_create_order_sync_api(self):
+        order = self.service.create_order("Customer", [("PROD001", 1)])
+
+        self.assertTrue(order.is_acknowledged(), "Synchronous API should still create orders")
+
+
+class AsyncInvoicingServiceTestCase(TestCase):
+
+    def setUp(self):
+        self.executor = AsyncExecutor(workers=2, lookup_workers=4)
+
+    def tearDown(self):
+        self.executor.close()
+
+    def test_invoice_delivery(self):
+        customer_repository = Mock()
+        customer_repository.find = Mock(return_value=CustomerFactory.build(name="Customer"))
+        tax_rate = Mock()
+        tax_rate.rate = 0.1
+        tax_repository = Mock()
+        tax_repository.find = Mock(return_value=tax_rate)
+
+        order1 = OrderFactory.build(order_id="ORD001")
+        order1.customer = "Customer"
+        order1.add_line_item("PROD001", 1, 100.00, 0.10)
+        order1.is_acknowledged = Mock(return_value=True)
+        order2 = OrderFactory.build(order_id="ORD002")
+        order2.customer = "Customer"
+        order2.add_line_item("PROD001", 2, 100.00, 0.10)
+        order2.is_acknowledged = Mock(return_value=True)
+        order_repository = Mock()
+        order_repository.find = Mock(side_effect={"ORD001": order1, "ORD002": order2}.get)
+
+        inventory_item = InventoryItemFactory.build(sku="PROD001")
+        inventory_item.enter_stock_on_hand(10)
+        inventory_item.commit(1, "ORD001")
+        inventory_item.commit(2, "ORD002")
+        inventory_repository = Mock()
+        inventory_repository.find = Mock(return_value=inventory_item)
+        inventory_repository.find_many = Mock(return_value={"PROD001": inventory_item})
+
+        invoice_ids = iter(["INV001", "INV002"])
+        id_threads = []
+
+        def next_id():
+            id_threads.append(threading.current_thread())
+            return next(invoice_ids)
+        invoice_repository = Mock()
+        invoice_repository.next_id = Mock(side_effect=next_id)
+
+        delivery = DeliveryFactory.build()
+        delivery.add_item("PROD001", 1, "ORD001")
+        delivery.add_item("PROD001", 2, "ORD002")
+        delivery.adjust_deliver_quantity("PROD001", 1, "ORD001")
+        delivery.adjust_deliver_quantity("PROD001", 2, "ORD002")
+
+        service = AsyncInvoicingService(InvoicingService(customer_repository, invoice_repository, order_repository,
+                                                         inventory_repository, tax_repository), self.executor)
+
+        invoices = service.invoice_delivery(delivery).get()
+
+        self.assertEquals(["ORD001", "ORD002"], sorted(invoice.order_id for invoice in invoices),
+                          "Each order should be invoiced")
+        self.assertEquals(sorted(["INV001", "INV002"]), sorted(delivery.invoice_ids),
+                          "Invoices should be added to the delivery")
+        self.assertEquals(0, inventory_item.quantity_committed(), "Commitments should have been fulfilled")
+        self.assertFalse(set(id_threads) & set(self.executor.lookup_pool._pool),
+                         "Invoices should not be built on the lookup pool")
+
+
+class AsyncPricingServiceTestCase(TestCase):
+
+    def test_get_customer_discount_fails(self):
+        executor = AsyncExecutor(workers=1, lookup_workers=1)
+        discount_repository = Mock()
+        discount_repository.find = Mock(return_value=None)
+        service = AsyncPricingService(PricingService(discount_repository), executor)
+
+        result = service.get_customer_discount(ProductFactory.build(), CustomerFactory.build())
+
+        with self.assertRaises(PricingError):
+            result.get()
+        executor.close()
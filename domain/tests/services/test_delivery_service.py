@@ -2,8 +2,10 @@ from mock import Mock, call
 from nose.tools import raises
 from unittest import TestCase
 
+from domain.shared.concurrency import AsyncExecutor
 from domain.service.delivery_service import DeliveryService
 from domain.tests.factories.inventory import InventoryItemFactory
+from domain.tests.factories.sales import OrderFactory
 
 
 class DeliveryServiceTestCase(TestCase):
@@ -84,3 +86,70 @@ class DeliveryServiceTestCase(TestCase):
 
         for sku in ["PROD001", "PROD002"]:
             self.assertIsNotNone(delivery._find_item(sku, "ORD001"), "Could not find {0} in delivery".format(sku))
+
+
+class PlanDeliveriesTestCase(TestCase):
+
+    def setUp(self):
+        orders = {}
+        for order_id, lines in (("ORD001", [("PROD001", 1), ("PROD002", 3)]),
+                                ("ORD002", [("PROD001", 2)]),
+                                ("ORD003", [("PROD003", 2)]),
+                                ("ORD004", [("PROD002", 1)])):
+            orders[order_id] = OrderFactory.build(order_id=order_id)
+            for sku, quantity in lines:
+                orders[order_id].add_line_item(sku, quantity, 10.00, 0.00)
+        self.order_repository = Mock()
+        self.order_repository.find = Mock(side_effect=lambda order_id: orders.get(order_id))
+
+        inventory = {}
+        for sku, on_hand_buffer in (("PROD001", 0), ("PROD002", 0), ("PROD003", 9)):
+            inventory[sku] = InventoryItemFactory.build(sku=sku, on_hand_buffer=on_hand_buffer)
+            inventory[sku].enter_stock_on_hand(10)
+        inventory["PROD001"].commit(1, "ORD001")
+        inventory["PROD002"].commit(3, "ORD001")
+        inventory["PROD001"].commit(2, "ORD002")
+        # Dips into the on hand buffer, so needs verification
+        inventory["PROD003"].commit(2, "ORD003")
+        self.inventory_repository = Mock()
+        self.inventory_repository.find_many = Mock(
+            side_effect=lambda skus: dict((sku, inventory[sku]) for sku in skus if sku in inventory))
+
+        self.customer_repository = Mock()
+        self.customer_repository.find_many = Mock(
+            side_effect=lambda customers: dict((customer, True) for customer in customers if customer != "Unknown"))
+
+    def test_plan_deliveries(self):
+        service = DeliveryService(self.customer_repository, self.order_repository, self.inventory_repository)
+
+        results = service.plan_deliveries({"Customer A": ["ORD001"],
+                                           "Customer B": ["ORD002", "ORD001"],
+                                           "Customer C": ["ORD003"],
+                                           "Customer D": ["ORD004"],
+                                           "Unknown": ["ORD002"]})
+
+        self.assertEquals(["Customer A", "Customer B", "Customer C", "Customer D", "Unknown"], sorted(results),
+                          "Every customer should have a result")
+        self.assertTrue(results["Customer A"].succeeded(), "Delivery for Customer A should have been planned")
+        self.assertEquals(3, results["Customer B"].delivery._find_item("PROD002", "ORD001")["quantity"],
+                          "Incorrect quantity for PROD002")
+        self.assertEquals("Customer B", results["Customer B"].delivery.customer, "Delivery for wrong customer")
+        self.assertFalse(results["Customer C"].succeeded(), "Unverified order should not be delivered")
+        self.assertFalse(results["Customer D"].succeeded(), "Uncommitted order should not be delivered")
+        self.assertFalse(results["Unknown"].succeeded(), "Unknown customer should not be delivered to")
+
+        self.assertEquals(1, self.customer_repository.find_many.call_count, "Customers should be found once")
+        self.assertEquals(1, self.inventory_repository.find_many.call_count, "Inventory should be found once")
+        self.assertEquals(4, self.order_repository.find.call_count, "Each order should be found once")
+
+    def test_plan_deliveries_on_executor(self):
+        service = DeliveryService(self.customer_repository, self.order_repository, self.inventory_repository)
+        executor = AsyncExecutor(workers=2, lookup_workers=1)
+
+        try:
+            results = service.plan_deliveries({"Customer A": ["ORD001"], "Customer D": ["ORD004"]}, executor=executor)
+        finally:
+            executor.close()
+
+        self.assertTrue(results["Customer A"].succeeded(), "Delivery for Customer A should have been planned")
+        self.assertFalse(results["Customer D"].succeeded(), "Uncommitted order should not be delivered")
@@ -2,6 +2,7 @@ from mock import Mock, call
 from nose.tools import raises
 from unittest import TestCase, skip
 
+from domain.shared.concurrency import RetryPolicy, ConcurrencyConflictError
 from domain.service.invoicing_service import InvoicingService
 from domain.service.invoicing_service import InvoicingError, OrderUnacknowledgedError, OrderDescriptorError
 from domain.tests.factories.customer import CustomerFactory
@@ -84,6 +85,8 @@ class InvoicingServiceTestCase(TestCase):
 
         self.inventory_repository = Mock()
         self.inventory_repository.find = Mock(side_effect=lambda sku: inventory.get(sku))
+        self.inventory_repository.find_many = Mock(
+            side_effect=lambda skus: dict((sku, inventory[sku]) for sku in skus if sku in inventory))
 
         self.invoice_repository = Mock()
         invoice_ids = ["INV002", "INV001"]
@@ -201,6 +204,27 @@ class InvoicingServiceTestCase(TestCase):
         self.assertEquals(242.00, inv_ord002.total_amount(), "Invoice total is incorrect")
         self.assertFalse(inv_ord002.finalised, "Invoice should not yet be finalised")
 
+    def test_invoice_delivery_shares_lookups(self):
+        delivery = DeliveryFactory.build()
+        delivery.add_item("PROD001", 1, "ORD001")
+        delivery.add_item("PROD002", 3, "ORD001")
+        delivery.add_item("PROD001", 2, "ORD002")
+        delivery.add_item("PROD002", 4, "ORD002")
+        delivery.adjust_deliver_quantity("PROD001", 1, "ORD001")
+        delivery.adjust_deliver_quantity("PROD002", 3, "ORD001")
+        delivery.adjust_deliver_quantity("PROD001", 2, "ORD002")
+        delivery.adjust_deliver_quantity("PROD002", 4, "ORD002")
+
+        service = InvoicingService(self.customer_repository, self.invoice_repository, self.order_repository,
+                                   self.inventory_repository, self.tax_repository)
+
+        service.invoice_delivery(delivery)
+
+        self.assertEquals(1, self.customer_repository.find.call_count, "Customer should be found once")
+        self.assertEquals(1, self.tax_repository.find.call_count, "Tax rate should be found once")
+        self.assertEquals(1, self.inventory_repository.find_many.call_count, "Inventory should be found once")
+        self.assertFalse(self.inventory_repository.find.called, "Inventory items should not be found one by one")
+
     def test_invoice_order(self):
         service = InvoicingService(self.customer_repository, self.invoice_repository, self.order_repository,
                                    self.inventory_repository, self.tax_repository)
@@ -218,4 +242,25 @@ class InvoicingServiceTestCase(TestCase):
         service = InvoicingService(self.customer_repository, self.invoice_repository, self.order_repository,
                                    self.inventory_repository, self.tax_repository)
 
-        invoice = service.invoice_order("ORD003")
\ No newline at end of file
+        invoice = service.invoice_order("ORD003")
+
+    def test_invoice_order_retries_conflict(self):
+        # Every find returns the item as it was stored, so a retry starts from unfulfilled commitments
+        def find(sku):
+            inventory_item = InventoryItemFactory.build(sku=sku)
+            inventory_item.enter_stock_on_hand(10)
+            inventory_item.commit({"PROD001": 1, "PROD002": 3}[sku], "ORD001")
+            return inventory_item
+        self.inventory_repository.find = Mock(side_effect=find)
+        self.inventory_repository.store_many = Mock(side_effect=[ConcurrencyConflictError(), None])
+        retry_policy = RetryPolicy()
+        service = InvoicingService(self.customer_repository, self.invoice_repository, self.order_repository,
+                                   self.inventory_repository, self.tax_repository, retry_policy=retry_policy)
+
+        invoice = service.invoice_order("ORD001")
+
+        self.assertEquals("INV001", invoice.invoice_id, "Wrong Invoice ID assigned")
+        self.assertEquals(2, self.inventory_repository.store_many.call_count, "Inventory should be stored twice")
+        stored = self.inventory_repository.store_many.call_args[0][0]
+        self.assertEquals(2, len(stored), "Each inventory item should be stored once")
+        self.assertEquals(1, retry_policy.retries, "Conflict should have been retried")
@@ -1,6 +1,9 @@
+import threading
+
 from mock import Mock, call
 from unittest import TestCase, skip
 
+from domain.shared.concurrency import StripedLockTable, RetryPolicy, ConcurrencyConflictError
 from domain.model.pricing.discount import Discount
 from domain.service.pricing_service import PricingService
 from domain.service.ordering_service import OrderingService, OrderingError
@@ -26,6 +29,8 @@ class OrderingServiceTestCase(TestCase):
         }
         self.customer_repository = Mock()
         self.customer_repository.find = Mock(side_effect=lambda sku: customers.get(sku))
+        self.customer_repository.find_many = Mock(
+            side_effect=lambda names: dict((name, customers[name]) for name in names if name in customers))
 
         tax_rate = Mock()
         tax_rate.rate = 0.1
@@ -42,6 +47,8 @@ class OrderingServiceTestCase(TestCase):
         }
         self.product_repository = Mock()
         self.product_repository.find = Mock(side_effect=lambda sku: self.products.get(sku))
+        self.product_repository.find_many = Mock(
+            side_effect=lambda skus: dict((sku, self.products[sku]) for sku in skus if sku in self.products))
 
         inv_prod1 = InventoryItemFactory.build(sku="PROD001")
         inv_prod1.enter_stock_on_hand(10)
@@ -55,6 +62,8 @@ class OrderingServiceTestCase(TestCase):
         }
         self.inventory_repository = Mock()
         self.inventory_repository.find = Mock(side_effect=lambda sku: self.inventory.get(sku))
+        self.inventory_repository.find_many = Mock(
+            side_effect=lambda skus: dict((sku, self.inventory[sku]) for sku in skus if sku in self.inventory))
 
         self.order_descriptors = {
             "ORD001": [
@@ -175,3 +184,162 @@ class OrderingServiceTestCase(TestCase):
                 self.assertEquals(0.1, line_item.discount, "Incorrect discount for PROD002")
             else:
                 self.assert_("Unknown item found in order")
+
+    def test_create_orders(self):
+        service = OrderingService(self.customer_repository,
+                                  self.product_repository,
+                                  self.order_repository,
+                                  self.inventory_repository,
+                                  self.pricing_service)
+
+        order_ids = ["ORD004", "ORD003", "ORD002", "ORD001"]
+        self.order_repository.next_id = Mock(side_effect=lambda: order_ids.pop())
+
+        results = service.create_orders([
+            ("Customer", self.order_descriptors["ORD001"], "Customer-PO-Ref"),
+            ("Customer", [("PROD001", 1), ("PROD-FAKE", 1)], None),
+            ("Fake Customer", self.order_descriptors["ORD001"], None),
+            ("Customer", [("PROD001", 2), ("PROD001", 3)], None),
+        ])
+
+        self.assertEquals([True, False, False, True], [result.succeeded() for result in results],
+                          "Wrong orders succeeded")
+        self.assertIsNotNone(results[1].message, "Failed order should explain why")
+        self.assertEquals("Customer-PO-Ref", results[0].order.customer_reference,
+                          "Customer reference not set correctly")
+        self.assertEquals(2, len(results[3].order.line_items), "Wrong number of line items")
+        self.assertEquals("ORD002", results[3].order.order_id, "Failed orders should not take an order ID")
+
+        # Each lookup is only made once for the whole batch
+        self.assertEquals(1, self.customer_repository.find_many.call_count, "Customers were not found in one call")
+        self.assertEquals(1, self.product_repository.find_many.call_count, "Products were not found in one call")
+        self.assertFalse(self.customer_repository.find.called, "Customers were looked up one at a time")
+        self.assertFalse(self.product_repository.find.called, "Products were looked up one at a time")
+        self.assertEquals(2, self.discount_repository.find.call_count, "Discounts were looked up more than once")
+        self.assertEquals(1, self.inventory_repository.find_many.call_count, "Inventory was not found in one call")
+        self.assertFalse(self.inventory_repository.find.called, "Inventory items were looked up one at a time")
+
+    def test_create_orders_groups_skus(self):
+        service = OrderingService(self.customer_repository,
+                                  self.product_repository,
+                                  self.order_repository,
+                                  self.inventory_repository,
+                                  self.pricing_service)
+
+        results = service.create_orders([
+            ("Customer", [("PROD001", 1), ("PROD001", 2)], None),
+        ])
+
+        self.assertTrue(results[0].succeeded(), "Order should have been created")
+        self.assertEquals(3, self.inventory["PROD001"].find_committed_for_order("ORD001")["quantity"],
+                          "Line items for the same SKU should be committed together")
+
+    def test_order_commits_each_sku(self):
+        service = OrderingService(self.customer_repository,
+                                  self.product_repository,
+                                  self.order_repository,
+                                  self.inventory_repository,
+                                  self.pricing_service)
+
+        service.create_order("Customer", self.order_descriptors["ORD001"])
+
+        self.assertEquals(1, self.inventory["PROD001"].quantity_committed(), "Incorrect committed count for PROD001")
+        self.assertEquals(3, self.inventory["PROD002"].quantity_committed(), "Incorrect committed count for PROD002")
+
+    def test_order_commits_nothing_on_failure(self):
+        service = OrderingService(self.customer_repository,
+                                  self.product_repository,
+                                  self.order_repository,
+                                  self.inventory_repository,
+                                  self.pricing_service)
+
+        # PROD002 cannot commit anything as verified
+        self.inventory["PROD002"].on_hand_buffer = 10
+
+        with self.assertRaises(OrderingError):
+            service.create_order("Customer", self.order_descriptors["ORD001"])
+
+        self.assertEquals(0, self.inventory["PROD001"].quantity_committed(), "PROD001 should not have been committed")
+
+    def test_order_creation_with_locks(self):
+        locks = StripedLockTable()
+        for sku, inventory_item in self.inventory.iteritems():
+            inventory_item.lock = locks.lock_for(sku)
+
+        service = OrderingService(self.customer_repository,
+                                  self.product_repository,
+                                  self.order_repository,
+                                  self.inventory_repository,
+                                  self.pricing_service,
+                                  locks=locks)
+
+        order = service.create_order("Customer", self.order_descriptors["ORD001"])
+
+        self.assertTrue(order.is_acknowledged(), "Order should have been acknowledged")
+        # Locks are re-entrant, so check they are free from another thread
+        released = []
+        checker = threading.Thread(target=lambda: released.extend(lock.acquire(False) for lock in locks.locks))
+        checker.start()
+        checker.join()
+        self.assertTrue(all(released), "Locks should have been released")
+
+    def _conflict_once(self):
+        # The first store finds the items were stored by someone else, who has taken 5 units of PROD001
+        conflicts = []
+
+        def store_many(items):
+            if not conflicts:
+                conflicts.append(items)
+                for sku in self.inventory:
+                    inventory_item = InventoryItemFactory.build(sku=sku)
+                    inventory_item.enter_stock_on_hand(10)
+                    self.inventory[sku] = inventory_item
+                self.inventory["PROD001"].commit(5, "ORD999")
+                raise ConcurrencyConflictError()
+        self.inventory_repository.store_many = Mock(side_effect=store_many)
+
+    def test_order_creation_retries_conflict(self):
+        self._conflict_once()
+        retry_policy = RetryPolicy()
+        service = OrderingService(self.customer_repository,
+                                  self.product_repository,
+                                  self.order_repository,
+                                  self.inventory_repository,
+                                  self.pricing_service,
+                                  retry_policy=retry_policy)
+
+        order = service.create_order("Customer", [("PROD001", 1)])
+
+        self.assertTrue(order.is_acknowledged(), "Order should have been acknowledged")
+        self.assertEquals(2, self.inventory_repository.store_many.call_count, "Inventory should be stored twice")
+        self.assertEquals(6, self.inventory["PROD001"].quantity_committed(),
+                          "Order should be committed to the refreshed inventory item")
+        self.assertEquals({"conflicts": 1, "retries": 1, "failures": 0}, retry_policy.counters())
+
+    def test_create_orders_retries_conflict(self):
+        self._conflict_once()
+        service = OrderingService(self.customer_repository,
+                                  self.product_repository,
+                                  self.order_repository,
+                                  self.inventory_repository,
+                                  self.pricing_service)
+
+        results = service.create_orders([("Customer", [("PROD001", 1)], None)])
+
+        self.assertTrue(results[0].succeeded(), "Order should have been created")
+        self.assertEquals(6, self.inventory["PROD001"].quantity_committed(),
+                          "Order should be committed to the refreshed inventory item")
+
+    def test_order_creation_conflicts_exhausted(self):
+        self.inventory_repository.store_many = Mock(side_effect=ConcurrencyConflictError())
+        retry_policy = RetryPolicy(attempts=2)
+        service = OrderingService(self.customer_repository,
+                                  self.product_repository,
+                                  self.order_repository,
+                                  self.inventory_repository,
+                                  self.pricing_service,
+                                  retry_policy=retry_policy)
+
+        with self.assertRaises(ConcurrencyConflictError):
+            service.create_order("Customer", [("PROD001", 1)])
+        self.assertEquals({"conflicts": 2, "retries": 1, "failures": 1}, retry_policy.counters())
@@ -1,3 +1,5 @@
+import math
+
 from mock import Mock
 from unittest import TestCase
 
@@ -5,7 +7,7 @@ from domain.model.pricing.discount import Discount
 from domain.service.pricing_service import PricingService, PricingError
 
 from domain.tests.factories.customer import CustomerFactory
-from domain.tests.factories.product import ProductFactory
+from domain.tests.factories.product import ProductFactory, PriceValueFactory
 
 
 class PricingServiceTestCase(TestCase):
@@ -18,8 +20,10 @@ class PricingServiceTestCase(TestCase):
         discounts = {
             ("MANF-A", "GRADE-A"): Discount(0.3, "MANF-A", "GRADE-A")
         }
+        self.discounts = discounts
 
         self.service = PricingService(self.repo)
+        self.cached_service = PricingService(self.repo, discount_cache_size=1024)
 
     def test_customer_discount(self):
         product = ProductFactory.build(price_category="MANF-A")
@@ -38,4 +42,100 @@ class PricingServiceTestCase(TestCase):
 
         with self.assertRaises(PricingError):
             self.service.get_customer_discount(ProductFactory.build(price_category="FAKE"),
-                                               CustomerFactory.build(discount_tier="GRADE-A"))
\ No newline at end of file
+                                               CustomerFactory.build(discount_tier="GRADE-A"))
+
+    def test_discount_not_cached_by_default(self):
+        product = ProductFactory.build(price_category="MANF-A")
+        customer = CustomerFactory.build(discount_tier="GRADE-A")
+        self.service.get_customer_discount(product, customer)
+
+        self.discounts[("MANF-A", "GRADE-A")] = Discount(0.2, "MANF-A", "GRADE-A")
+
+        self.assertEquals(0.2, self.service.get_customer_discount(product, customer), "Changed discount not seen")
+        self.assertEquals(2, self.repo.find.call_count, "Discount should be found every time")
+
+    def test_discount_cached(self):
+        product = ProductFactory.build(price_category="MANF-A")
+        customer = CustomerFactory.build(discount_tier="GRADE-A")
+
+        self.cached_service.get_customer_discount(product, customer)
+        discount = self.cached_service.get_customer_discount(product, customer)
+
+        self.assertEquals(0.3, discount, "Wrong discount calculated")
+        self.assertEquals(1, self.repo.find.call_count, "Discount should only be found once")
+        self.assertEquals({"size": 1, "hits": 1, "misses": 1, "evictions": 0},
+                          self.cached_service.discount_cache_stats())
+
+    def test_discount_cache_expires(self):
+        now = [0]
+        self.cached_service.discounts.clock = lambda: now[0]
+        product = ProductFactory.build(price_category="MANF-A")
+        customer = CustomerFactory.build(discount_tier="GRADE-A")
+
+        self.cached_service.get_customer_discount(product, customer)
+        now[0] = self.cached_service.discounts.ttl + 1
+        self.cached_service.get_customer_discount(product, customer)
+
+        self.assertEquals(2, self.repo.find.call_count, "Expired discount should be found again")
+
+    def test_discount_cache_bounded(self):
+        service = PricingService(self.repo, discount_cache_size=1)
+        self.discounts[("MANF-B", "GRADE-A")] = Discount(0.1, "MANF-B", "GRADE-A")
+        customer = CustomerFactory.build(discount_tier="GRADE-A")
+
+        service.get_customer_discount(ProductFactory.build(price_category="MANF-A"), customer)
+        service.get_customer_discount(ProductFactory.build(price_category="MANF-B"), customer)
+
+        self.assertEquals(1, service.discount_cache_stats()["size"], "Cache should hold a single discount")
+        self.assertEquals(1, service.discount_cache_stats()["evictions"], "Least recently used should be evicted")
+
+    def test_invalidate_discount(self):
+        product = ProductFactory.build(price_category="MANF-A")
+        customer = CustomerFactory.build(discount_tier="GRADE-A")
+        self.cached_service.get_customer_discount(product, customer)
+
+        changed = Discount(0.2, "MANF-A", "GRADE-A")
+        self.discounts[("MANF-A", "GRADE-A")] = changed
+        self.cached_service.invalidate_discount(changed)
+
+        self.assertEquals(0.2, self.cached_service.get_customer_discount(product, customer),
+                          "Changed discount not seen")
+
+    def test_warm(self):
+        self.repo.find_all = Mock(return_value=self.discounts.values())
+
+        self.cached_service.warm()
+        discount = self.cached_service.get_customer_discount(ProductFactory.build(price_category="MANF-A"),
+                                                             CustomerFactory.build(discount_tier="GRADE-A"))
+
+        self.assertEquals(0.3, discount, "Wrong discount calculated")
+        self.assertFalse(self.repo.find.called, "Warmed discount should not be found again")
+
+    def test_warm_without_cache(self):
+        self.repo.find_all = Mock(return_value=self.discounts.values())
+
+        self.service.warm()
+
+        self.assertFalse(self.repo.find_all.called, "Discounts should not be found when they are not cached")
+        self.assertEquals(0, self.service.discount_cache_stats()["evictions"], "Nothing should be evicted")
+
+    def test_price_list(self):
+        self.discounts[("MANF-B", "GRADE-B")] = Discount(0.5, "MANF-B", "GRADE-B")
+        self.repo.find_all = Mock(return_value=self.discounts.values())
+        products = []
+        for n, category in enumerate(["MANF-A", "MANF-B", "MANF-A"]):
+            product = ProductFactory.build(sku="PROD00{0}".format(n), price_category=category)
+            product.set_price(PriceValueFactory.build(price=10.00 * (n + 1)))
+            products.append(product)
+
+        chunks = list(self.service.price_list(products, chunk_size=2))
+
+        self.assertEquals(2, len(chunks), "Price list should be in chunks of 2 products")
+        self.assertEquals(1, self.repo.find_all.call_count, "Discounts should be found once")
+        rows = [row for chunk in chunks for row in chunk.rows()]
+        self.assertEquals(["PROD000", "PROD001", "PROD002"], [sku for sku, _ in rows], "Products out of order")
+        self.assertEquals(["GRADE-A", "GRADE-B"], chunks[0].tiers, "Tiers out of order")
+        self.assertAlmostEqual(7.00, chunks[0].net_price(0, "GRADE-A"))
+        self.assertAlmostEqual(10.00, chunks[0].net_price(1, "GRADE-B"))
+        self.assertAlmostEqual(21.00, chunks[1].net_price(0, "GRADE-A"))
+        self.assertTrue(math.isnan(chunks[0].net_price(1, "GRADE-A")), "Missing discount should not be priced")
@@ -0,0 +1,32 @@
+"""index customer lookups
+
+Revision ID: 1c4e9a2f7d05
+Revises: 51d7b3e2c8a4
+Create Date: 2026-10-18 06:12:48.340117
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1c4e9a2f7d05'
+down_revision = '51d7b3e2c8a4'
+
+from alembic import op
+
+
+INDEXES = (
+    ('ix_customer_name', 'customer', 'name'),
+    ('ix_address_customer_id', 'address', 'customer_id'),
+    ('ix_contact_customer_id', 'contact', 'customer_id'),
+    ('ix_contact_phones_contact_id', 'contact_phones', 'contact_id'),
+    ('ix_contact_roles_association_contact_id', 'contact_roles_association', 'contact_id'),
+)
+
+
+def upgrade():
+    for name, table, column in INDEXES:
+        op.create_index(name, table, [column])
+
+
+def downgrade():
+    for name, table, column in reversed(INDEXES):
+        op.drop_index(name, table)
@@ -0,0 +1,47 @@
+"""add inventory tables
+
+Revision ID: 2f1e5c7a9b3d
+Revises: 3830063c1b00
+Create Date: 2026-10-18 04:10:12.508231
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '2f1e5c7a9b3d'
+down_revision = '3830063c1b00'
+
+from alembic import op
+from sqlalchemy import Column, Integer, String, Enum, ForeignKey, DateTime
+
+
+def upgrade():
+    op.create_table('inventory_item',
+                    Column('sku', String, primary_key=True),
+                    Column('on_hand_buffer', Integer)
+                    )
+
+    enum_states = Enum("OnHand", "Committed", "Backorder", "Fulfilled", "PurchaseOrder", "Lost", "Found",
+                       name='inventory_states')
+    enum_states.create(op.get_bind(), checkfirst=False)
+
+    op.create_table('inventory_state_item',
+                    Column('id', Integer, primary_key=True),
+                    Column('sku', String, ForeignKey('inventory_item.sku')),
+                    Column('state', enum_states),
+                    Column('quantity', Integer),
+                    Column('unverified_quantity', Integer),
+                    Column('allocated', Integer),
+                    Column('order_id', String),
+                    Column('invoice_id', String),
+                    Column('purchase_order_id', String),
+                    Column('date', DateTime),
+                    Column('eta_date', DateTime)
+                    )
+    op.create_index('ix_inventory_state_item_sku', 'inventory_state_item', ['sku'])
+
+
+def downgrade():
+    op.drop_index('ix_inventory_state_item_sku', 'inventory_state_item')
+    op.drop_table('inventory_state_item')
+    Enum(name="inventory_states").drop(op.get_bind(), checkfirst=False)
+    op.drop_table('inventory_item')
@@ -0,0 +1,22 @@
+"""add inventory version
+
+Revision ID: 51d7b3e2c8a4
+Revises: 2f1e5c7a9b3d
+Create Date: 2026-10-18 05:02:37.118904
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '51d7b3e2c8a4'
+down_revision = '2f1e5c7a9b3d'
+
+from alembic import op
+from sqlalchemy import Column, Integer
+
+
+def upgrade():
+    op.add_column('inventory_item', Column('version', Integer, nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('inventory_item', 'version')
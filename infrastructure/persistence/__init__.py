@@ -1,6 +1,35 @@
-from sqlalchemy import MetaData
+import sqlalchemy
+from sqlalchemy import MetaData, event
 
 metadata = MetaData()
 
+
+def create_engine(url, **kwargs):
+    """
+    Create an engine as sqlalchemy.create_engine does, ready for the repositories to use.
+    SQLite engines have use_sqlite_savepoints applied, so every engine should be created here.
+    """
+    engine = sqlalchemy.create_engine(url, **kwargs)
+    if engine.dialect.name == "sqlite":
+        use_sqlite_savepoints(engine)
+    return engine
+
+
+def use_sqlite_savepoints(engine):
+    """
+    Let SQLAlchemy begin SQLite transactions itself, as pysqlite begins them late and commits before a SAVEPOINT,
+    which breaks the savepoints stores are made in (see InventoryRepository.store_many).
+    Call once on every SQLite engine, before it is first connected, which create_engine does.
+    """
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def begin(connection):
+        connection.execute("BEGIN")
+
+    return engine
+
 # Finally import all models so mappings are created
-import models
\ No newline at end of file
+import models
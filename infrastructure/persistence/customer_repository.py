@@ -1,16 +1,127 @@
+from sqlalchemy import select, func
+from sqlalchemy.orm import joinedload, joinedload_all, subqueryload, subqueryload_all
+
 from infrastructure.persistence.repository import Repository
+from infrastructure.persistence.models import customer, address, contact, contact_roles, \
+    contact_roles_association, contact_phones
 from domain.model.customer.customer import Customer
 
 
 class CustomerRepository(Repository):
-    def __init__(self, session):
-        super(CustomerRepository, self).__init__(session)
+    """
+    Customers are found with their addresses, contacts and contacts' roles and phones loaded according to a
+    loading profile:
+        lazy        each collection is loaded when it is first used, one query per customer and contact
+        joined      everything is loaded with the customer in one query, but the collections are joined side by
+                    side, multiplying the rows returned (addresses x contacts x roles x phones), so it is only
+                    faster than lazy for a single customer when each query's round trip costs more than those rows
+        subquery    each collection is loaded for every customer found in one more query, best for many customers
+    Given a UnitOfWork, stores are committed in its batches rather than one commit per customer.
+    """
+
+    PROFILES = {
+        "lazy": (),
+        "joined": (joinedload(Customer.addresses),
+                   joinedload_all("contacts.roles"),
+                   joinedload_all("contacts.phones")),
+        "subquery": (subqueryload(Customer.addresses),
+                     subqueryload_all("contacts.roles"),
+                     subqueryload_all("contacts.phones")),
+    }
+
+    # Keep each IN clause within SQLite's limit on bound parameters
+    chunk_size = 500
 
-    def find(self, customer_name):
-        query = self.session.query(Customer).filter(Customer.name == customer_name)
+    def __init__(self, session, profile="lazy", unit_of_work=None):
+        super(CustomerRepository, self).__init__(session, unit_of_work)
+        self.profile = profile
+
+    def find(self, customer_name, profile=None):
+        query = self._query(profile or self.profile).filter(Customer.name == customer_name)
 
         return super(CustomerRepository, self).find(query)
 
+    def find_many(self, customer_names, profile="subquery"):
+        """
+        Find many customers at once, by default with the subquery profile, so each chunk_size customers are loaded
+        with all their details in a fixed number of queries however many customers and contacts there are.
+        Returns a dict of name to Customer, names without a customer are left out.
+        """
+        customer_names = list(set(customer_names))
+        customers = {}
+
+        for start in xrange(0, len(customer_names), self.chunk_size):
+            chunk = customer_names[start:start + self.chunk_size]
+            for customer in self._query(profile).filter(Customer.name.in_(chunk)):
+                customers[customer.name] = customer
+
+        return customers
+
     def store(self, customer_entity):
         self.session.add(customer_entity)
-        self.session.commit()
+        self.commit()
+
+    def insert_many(self, customers):
+        """
+        Insert many new customers with their addresses and contacts, e.g. for an import of customer master data.
+        Rather than the ORM inserting, and fetching the ID of, one row at a time, IDs are allocated up front and
+        each table's rows are inserted with a single executemany.
+        The customers are not added to the session, so find them again to make changes.
+        IDs are allocated from the highest ID already in each table, not from any sequence the database keeps, so
+        insert_many needs exclusive write access to the customer tables for its transaction: run it as an import
+        with no other writers, never alongside the ORM's inserts from other sessions.
+        """
+        customers = list(customers)
+        if not customers:
+            return
+
+        # Anything pending must be flushed first so the IDs allocated here don't clash with it
+        self.session.flush()
+        next_id = dict((table, self._max_id(table) + 1) for table in (customer, contact, contact_roles))
+        rows = dict((table, []) for table in (customer, address, contact, contact_roles,
+                                              contact_roles_association, contact_phones))
+
+        for customer_entity in customers:
+            customer_id = next_id[customer]
+            next_id[customer] += 1
+            rows[customer].append({"id": customer_id, "name": customer_entity.name,
+                                   "discount_tier": customer_entity.discount_tier,
+                                   "tax_category": customer_entity.tax_category})
+
+            for address_entity in customer_entity.addresses:
+                rows[address].append({"customer_id": customer_id, "type": address_entity.type,
+                                      "line1": address_entity.line1, "line2": address_entity.line2,
+                                      "suburb": address_entity.suburb, "postcode": address_entity.postcode,
+                                      "state": address_entity.state, "country": address_entity.country})
+
+            for contact_entity in customer_entity.contacts:
+                contact_id = next_id[contact]
+                next_id[contact] += 1
+                rows[contact].append({"id": contact_id, "customer_id": customer_id,
+                                      "firstname": contact_entity.firstname, "lastname": contact_entity.lastname,
+                                      "email": contact_entity.email})
+
+                for role in contact_entity.roles:
+                    role_id = next_id[contact_roles]
+                    next_id[contact_roles] += 1
+                    rows[contact_roles].append({"id": role_id, "role": role.role})
+                    rows[contact_roles_association].append({"contact_id": contact_id, "contact_roles_id": role_id})
+
+                for phone in contact_entity.phones.itervalues():
+                    rows[contact_phones].append({"contact_id": contact_id, "type": phone.type,
+                                                 "number": phone.number})
+
+        # Parents before children, for the foreign keys
+        for table in (customer, address, contact, contact_roles, contact_roles_association, contact_phones):
+            if rows[table]:
+                self.session.execute(table.insert(), rows[table])
+
+        self.commit(len(customers))
+
+    def _query(self, profile):
+        if profile not in self.PROFILES:
+            raise ValueError("Unknown loading profile {0}".format(profile))
+        return self.session.query(Customer).options(*self.PROFILES[profile])
+
+    def _max_id(self, table):
+        return self.session.execute(select([func.max(table.c.id)])).scalar() or 0
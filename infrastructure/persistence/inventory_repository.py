@@ -0,0 +1,175 @@
+from collections import Counter
+import weakref
+
+from sqlalchemy import select, and_
+from sqlalchemy.exc import IntegrityError
+
+from infrastructure.persistence.repository import Repository
+from infrastructure.persistence.models import inventory_item, inventory_state_item
+from domain.shared.concurrency import ConcurrencyConflictError
+from domain.model.inventory.inventory_items import InventoryItem
+
+
+class InventoryRepository(Repository):
+    """
+    Stores each InventoryItem as a row, and every item tracked in its states as a row of inventory_state_item.
+    Inventory items are rebuilt by loading those rows back into their states, each given its lock from locks
+    if they will be shared between threads.
+    Items are versioned, the version an item was found or committed at is kept as its persisted_version.
+    Every find builds new items, so items which failed to store can be found again as they were stored.
+    The rows each item was found or stored with are remembered, so storing it again only deletes and inserts the rows
+    which changed rather than rewriting its whole history.
+    Given a UnitOfWork, stores are committed in its batches rather than each store_many committing on its own. Until
+    then, what was stored is remembered as uncommitted, so the items can be stored again in the same unit of work.
+    """
+
+    # Keep each IN clause within SQLite's limit on bound parameters
+    chunk_size = 500
+
+    # Columns of inventory_state_item holding the properties of tracked items
+    ITEM_COLUMNS = tuple(column.name for column in inventory_state_item.c if column.name not in ("id", "sku", "state"))
+
+    def __init__(self, session, locks=None, unit_of_work=None):
+        super(InventoryRepository, self).__init__(session, unit_of_work)
+        self.locks = locks
+        # item: (version, {state: Counter of row values}) as last found or committed
+        self.persisted_rows = weakref.WeakKeyDictionary()
+        # item: (version, {state: Counter of row values}) as stored since the last commit
+        self.uncommitted_rows = weakref.WeakKeyDictionary()
+
+    def find(self, sku):
+        return self.find_many([sku]).get(sku, None)
+
+    def find_many(self, skus):
+        """
+        Find the inventory items for many SKUs at once.
+        The items and their tracked items are loaded with two queries per chunk_size SKUs, rather than per SKU.
+        Returns a dict of SKU to InventoryItem, SKUs without an inventory item are left out.
+        """
+        skus = list(set(skus))
+        items = {}
+
+        for start in xrange(0, len(skus), self.chunk_size):
+            chunk = skus[start:start + self.chunk_size]
+
+            query = select([inventory_item]).where(inventory_item.c.sku.in_(chunk))
+            for row in self.session.execute(query):
+                lock = self.locks.lock_for(row.sku) if self.locks is not None else None
+                item = InventoryItem(row.sku, on_hand_buffer=row.on_hand_buffer, lock=lock, version=row.version)
+                item.persisted_version = row.version
+                items[row.sku] = item
+
+            tracked = {}
+            query = select([inventory_state_item]) \
+                .where(inventory_state_item.c.sku.in_(chunk)) \
+                .order_by(inventory_state_item.c.id)
+            for row in self.session.execute(query):
+                tracked.setdefault((row.sku, row.state), []).append(row)
+
+            persisted = dict((sku, {}) for sku in chunk if sku in items)
+            for (sku, state_name), rows in tracked.iteritems():
+                state = items[sku].tracker.state(state_name)
+                state.load(dict((field, row[field]) for field in state.item_type.fields) for row in rows)
+                persisted[sku][state_name] = Counter(tuple(row[column] for column in self.ITEM_COLUMNS)
+                                                     for row in rows)
+
+            for sku, rows in persisted.iteritems():
+                self.persisted_rows[items[sku]] = (items[sku].version, rows)
+
+        return items
+
+    def store(self, item):
+        """
+        Store an inventory item, replacing everything previously stored for its SKU.
+        See store_many.
+        """
+        self.store_many([item])
+
+    def store_many(self, items):
+        """
+        Store many inventory items in one transaction, replacing everything previously stored for their SKUs.
+        Each item is only written if its stored version is still the one it was found at (compare-and-swap),
+        otherwise nothing is stored and ConcurrencyConflictError is raised. The items are stored in a savepoint,
+        so a conflict only rolls back this store and not the rest of a unit of work's batch.
+        The items' persisted_version is only updated once they are committed.
+        Savepoints only work on SQLite engines made by infrastructure.persistence.create_engine.
+        """
+        savepoint = self.session.begin_nested()
+        stored_rows = []
+        try:
+            for item in items:
+                stored_rows.append(self._store(item))
+        except (ConcurrencyConflictError, IntegrityError):
+            savepoint.rollback()
+            raise ConcurrencyConflictError("Inventory item {0} was changed since it was found".format(item.sku))
+        savepoint.commit()
+
+        for item, rows in zip(items, stored_rows):
+            self.uncommitted_rows[item] = (item.version, rows)
+        self.commit(len(items), on_commit=self._committed, on_rollback=self.uncommitted_rows.clear)
+
+    def _committed(self):
+        for item, (version, rows) in self.uncommitted_rows.items():
+            item.persisted_version = version
+            self.persisted_rows[item] = (version, rows)
+        self.uncommitted_rows.clear()
+
+    def _store(self, item):
+        # An item stored again before it was committed replaces what it stored then
+        if item in self.uncommitted_rows:
+            persisted_version, previous_rows = self.uncommitted_rows[item]
+        else:
+            persisted_version = item.persisted_version
+            version, previous_rows = self.persisted_rows.get(item, (None, None))
+            if version != persisted_version:
+                previous_rows = None
+
+        if persisted_version is None:
+            # A new item, which conflicts with anyone else adding the same SKU
+            self.session.execute(inventory_item.insert().values(
+                sku=item.sku, on_hand_buffer=item.on_hand_buffer, version=item.version))
+        else:
+            result = self.session.execute(inventory_item.update()
+                                          .where(inventory_item.c.sku == item.sku)
+                                          .where(inventory_item.c.version == persisted_version)
+                                          .values(on_hand_buffer=item.on_hand_buffer, version=item.version))
+            if result.rowcount == 0:
+                raise ConcurrencyConflictError()
+
+        rows = {}
+        for state_name, state in item.tracker.states.iteritems():
+            rows[state_name] = Counter(tuple(tracked_item.export().get(column) for column in self.ITEM_COLUMNS)
+                                       for tracked_item in state.tracked_items())
+
+        # Rows remembered for the version being replaced are what is stored, anything else is rewritten in full
+        if previous_rows is None:
+            self.session.execute(inventory_state_item.delete().where(inventory_state_item.c.sku == item.sku))
+            previous_rows = {}
+
+        inserts = []
+        for state_name, state_rows in rows.iteritems():
+            self._store_changed_rows(item.sku, state_name, previous_rows.get(state_name, Counter()), state_rows,
+                                     inserts)
+        if inserts:
+            self.session.execute(inventory_state_item.insert(), inserts)
+
+        return rows
+
+    def _store_changed_rows(self, sku, state_name, previous_rows, rows, inserts):
+        """
+        Delete the stored rows of a state whose values are no longer tracked the same number of times, and add those
+        to insert again to inserts.
+        """
+        for values in set(previous_rows) | set(rows):
+            if previous_rows[values] == rows[values]:
+                continue
+
+            if previous_rows[values]:
+                condition = [inventory_state_item.c.sku == sku, inventory_state_item.c.state == state_name]
+                condition.extend(inventory_state_item.c[column] == value
+                                 for column, value in zip(self.ITEM_COLUMNS, values))
+                self.session.execute(inventory_state_item.delete().where(and_(*condition)))
+
+            row = dict(zip(self.ITEM_COLUMNS, values))
+            row.update(sku=sku, state=state_name)
+            inserts.extend(dict(row) for _ in xrange(rows[values]))
@@ -1,4 +1,4 @@
-from sqlalchemy import Table, Column, ForeignKey, Integer, String, Enum
+from sqlalchemy import Table, Column, ForeignKey, Integer, String, Enum, DateTime
 from sqlalchemy.orm import mapper, relationship
 from sqlalchemy.orm.collections import attribute_mapped_collection
 
@@ -14,7 +14,7 @@ from domain.model.customer.contact import ContactRole
 customer = \
     Table('customer', metadata,
           Column('id', Integer, primary_key=True),
-          Column('name', String),
+          Column('name', String, index=True),
           Column('discount_tier', String),
           Column('tax_category', String)
           )
@@ -23,7 +23,7 @@ from domain.model.customer.address import Address
 address = \
     Table('address', metadata,
           Column('id', Integer, primary_key=True),
-          Column('customer_id', Integer, ForeignKey('customer.id')),
+          Column('customer_id', Integer, ForeignKey('customer.id'), index=True),
           Column('type', Enum(*Address.TYPE, name='address_types')),
           Column('line1', String),
           Column('line2', String),
@@ -43,14 +43,14 @@ mapper(ContactRole, contact_roles)
 # M2M association between contact and contact roles
 contact_roles_association = \
     Table('contact_roles_association', metadata,
-          Column('contact_id', Integer, ForeignKey('contact.id')),
+          Column('contact_id', Integer, ForeignKey('contact.id'), index=True),
           Column('contact_roles_id', Integer, ForeignKey('contact_roles.id'))
           )
 
 contact_phones = \
     Table('contact_phones', metadata,
           Column('id', Integer, primary_key=True,),
-          Column('contact_id', Integer, ForeignKey('contact.id')),
+          Column('contact_id', Integer, ForeignKey('contact.id'), index=True),
           Column('type', Enum(*ContactPhone.PHONES, name='phone_types')),
           Column('number', String)
           )
@@ -59,7 +59,7 @@ mapper(ContactPhone, contact_phones)
 contact = \
     Table('contact', metadata,
           Column('id', Integer, primary_key=True),
-          Column('customer_id', Integer, ForeignKey('customer.id')),
+          Column('customer_id', Integer, ForeignKey('customer.id'), index=True),
           Column('firstname', String),
           Column('lastname', String),
           Column('email', String),
@@ -74,5 +74,31 @@ mapper(Address, address)
 mapper(Contact, contact, properties={
     'roles': relationship(ContactRole, secondary=contact_roles_association),
     'phones': relationship(ContactPhone,
-                           collection_class=attribute_mapped_collection(contact_phones.c.type))
+                           collection_class=attribute_mapped_collection('type'))
 })
+
+# Inventory items are rebuilt from their tracked items by the InventoryRepository, so are not mapped
+INVENTORY_STATES = ("OnHand", "Committed", "Backorder", "Fulfilled", "PurchaseOrder", "Lost", "Found")
+
+inventory_item = \
+    Table('inventory_item', metadata,
+          Column('sku', String, primary_key=True),
+          Column('on_hand_buffer', Integer),
+          Column('version', Integer, nullable=False, server_default='0')
+          )
+
+# One row per item tracked in each state, columns not used by a state's items are left null
+inventory_state_item = \
+    Table('inventory_state_item', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('sku', String, ForeignKey('inventory_item.sku'), index=True),
+          Column('state', Enum(*INVENTORY_STATES, name='inventory_states')),
+          Column('quantity', Integer),
+          Column('unverified_quantity', Integer),
+          Column('allocated', Integer),
+          Column('order_id', String),
+          Column('invoice_id', String),
+          Column('purchase_order_id', String),
+          Column('date', DateTime),
+          Column('eta_date', DateTime)
+          )
@@ -2,8 +2,13 @@ from sqlalchemy.orm.exc import NoResultFound
 
 
 class Repository(object):
-    def __init__(self, session):
+    """
+    Each store is committed straight away, unless the repository is given a UnitOfWork to batch its commits.
+    """
+
+    def __init__(self, session, unit_of_work=None):
         self.session = session
+        self.unit_of_work = unit_of_work
 
     def find(self, query):
         try:
@@ -11,4 +16,27 @@ class Repository(object):
         except NoResultFound:
             return None
         except:
-            raise
\ No newline at end of file
+            raise
+
+    def commit(self, count=1, on_commit=None, on_rollback=None):
+        """
+        Commit count stored aggregates, calling on_commit once they are committed, see UnitOfWork.stored.
+        """
+        if self.unit_of_work is not None:
+            self.unit_of_work.stored(count, on_commit=on_commit, on_rollback=on_rollback)
+            return
+
+        try:
+            self.session.commit()
+        except Exception:
+            if on_rollback is not None:
+                on_rollback()
+            raise
+        if on_commit is not None:
+            on_commit()
+
+    def rollback(self):
+        if self.unit_of_work is not None:
+            self.unit_of_work.rollback()
+        else:
+            self.session.rollback()
@@ -0,0 +1,66 @@
+class UnitOfWork(object):
+    """
+    Groups the stores of any repositories sharing a session into batches, committing once every batch_size
+    aggregates stored rather than once for each, and committing what is left when the unit of work ends.
+    If it ends with an exception, or a repository rolls back, everything stored since the last commit is
+    rolled back. A repository which only needs to undo its own store, e.g. on a conflict, should roll back a
+    savepoint instead. Repositories can be told when what they stored is committed, or rolled back, see stored.
+
+        with UnitOfWork(session, batch_size=1000) as unit_of_work:
+            customers = CustomerRepository(session, unit_of_work=unit_of_work)
+            for customer in imported:
+                customers.store(customer)
+    """
+
+    def __init__(self, session, batch_size=1000):
+        if batch_size < 1:
+            raise ValueError("Batch size must be at least 1")
+
+        self.session = session
+        self.batch_size = batch_size
+        self.pending = 0
+        self.commits = 0
+        self.on_commit = []
+        self.on_rollback = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+    def stored(self, count=1, on_commit=None, on_rollback=None):
+        """
+        Called by a repository once it has stored count aggregates, committing if a batch is complete.
+        on_commit is called once they have been committed, or on_rollback once they have been rolled back,
+        each only once however many stores since the last commit gave it.
+        """
+        for callback, callbacks in ((on_commit, self.on_commit), (on_rollback, self.on_rollback)):
+            if callback is not None and callback not in callbacks:
+                callbacks.append(callback)
+        self.pending += count
+        if self.pending >= self.batch_size:
+            self.commit()
+
+    def commit(self):
+        if self.pending:
+            self.session.commit()
+            self.commits += 1
+        self.pending = 0
+        self._finish(self.on_commit)
+
+    def rollback(self):
+        self.session.rollback()
+        self.pending = 0
+        self._finish(self.on_rollback)
+
+    def _finish(self, callbacks):
+        callbacks = list(callbacks)
+        del self.on_commit[:]
+        del self.on_rollback[:]
+        for callback in callbacks:
+            callback()
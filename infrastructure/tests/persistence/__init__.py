@@ -1,9 +1,8 @@
 import os
 
 from unittest import TestCase
-from sqlalchemy import create_engine
 
-from infrastructure.persistence import metadata
+from infrastructure.persistence import metadata, create_engine
 
 
 # Testing database engine:
@@ -1,4 +1,5 @@
 from nose.tools import raises
+from sqlalchemy import event
 from sqlalchemy.exc import IntegrityError
 from nose_alembic_attrib import alembic_attr
 
@@ -6,12 +7,19 @@ from domain.tests.factories.customer import CustomerFactory, AddressFactory, Con
 
 from infrastructure.tests.persistence import PersistenceTestCase
 from infrastructure.persistence.customer_repository import CustomerRepository
+from infrastructure.persistence.unit_of_work import UnitOfWork
 
 
 class CustomerRepositoryTestCase(PersistenceTestCase):
     def setUp(self):
         super(CustomerRepositoryTestCase, self).setUp()
         self.repository = CustomerRepository(self.session)
+        self.queries = None
+
+    def tearDown(self):
+        # Stop counting, as listeners cannot be removed in this version of SQLAlchemy
+        self.queries = None
+        super(CustomerRepositoryTestCase, self).tearDown()
 
     @alembic_attr(minimum_revision="4b9a79b051c6")
     def test_add_customer(self):
@@ -79,3 +87,108 @@ class CustomerRepositoryTestCase(PersistenceTestCase):
 
         customer.add_contact(contact)
         self.repository.store(customer)
+
+    def _store_customers_with_contacts(self, count):
+        for customer in self._build_customers_with_contacts(count):
+            self.repository.store(customer)
+        self.session.expunge_all()
+
+    def _build_customers_with_contacts(self, count, start=0):
+        customers = []
+        for n in xrange(start, start + count):
+            customer = CustomerFactory.build(name="Customer {0}".format(n))
+            customer.add_address(AddressFactory.build(type="BILLING"))
+            for role in ("SALES", "ACCOUNTS"):
+                contact = ContactFactory.build(firstname=role)
+                contact.add_role(role)
+                contact.add_phone("OFFICE", "+6129000000")
+                contact.add_phone("MOBILE", "+61400000000")
+                customer.add_contact(contact)
+            customers.append(customer)
+        return customers
+
+    def _count_queries(self):
+        if self.queries is None:
+            event.listen(self.connection, "before_cursor_execute", self._count_query)
+        self.queries = []
+        return self.queries
+
+    def _count_query(self, connection, cursor, statement, *args):
+        if self.queries is not None:
+            self.queries.append(statement)
+
+    def _use_all_details(self, customer):
+        return [(len(customer.addresses), [(contact.has_role("SALES"), contact.get_phone("MOBILE").number)
+                                           for contact in customer.contacts])]
+
+    @alembic_attr(minimum_revision="1c4e9a2f7d05")
+    def test_find_many(self):
+        self._store_customers_with_contacts(3)
+        queries = self._count_queries()
+
+        customers = self.repository.find_many(["Customer 0", "Customer 2", "Customer X"])
+        details = [self._use_all_details(customers[name]) for name in ("Customer 0", "Customer 2")]
+
+        self.assertEquals(["Customer 0", "Customer 2"], sorted(customers), "Wrong customers found")
+        self.assertEquals([(1, [(True, "+61400000000"), (False, "+61400000000")])], details[0],
+                          "Customer details not loaded correctly")
+        self.assertEquals(5, len(queries), "Customers and their details should be loaded with 5 queries")
+
+    @alembic_attr(minimum_revision="1c4e9a2f7d05")
+    def test_find_joined(self):
+        self._store_customers_with_contacts(2)
+        queries = self._count_queries()
+
+        customer = self.repository.find("Customer 1", profile="joined")
+        details = self._use_all_details(customer)
+
+        self.assertEquals([(1, [(True, "+61400000000"), (False, "+61400000000")])], details,
+                          "Customer details not loaded correctly")
+        self.assertEquals(1, len(queries), "Customer and its details should be loaded with 1 query")
+
+    @raises(ValueError)
+    def test_find_unknown_profile(self):
+        self.repository.find("Customer", profile="eager")
+
+    @alembic_attr(minimum_revision="1c4e9a2f7d05")
+    def test_store_in_unit_of_work(self):
+        with UnitOfWork(self.session, batch_size=2) as unit_of_work:
+            repository = CustomerRepository(self.session, unit_of_work=unit_of_work)
+            for customer in self._build_customers_with_contacts(5):
+                repository.store(customer)
+            self.assertEquals(2, unit_of_work.commits, "Only complete batches should be committed")
+
+        self.assertEquals(3, unit_of_work.commits, "Remaining customers should be committed at the end")
+        self.assertEquals(5, len(self.repository.find_many("Customer {0}".format(n) for n in xrange(5))))
+
+    @alembic_attr(minimum_revision="1c4e9a2f7d05")
+    def test_unit_of_work_rolled_back(self):
+        try:
+            with UnitOfWork(self.session) as unit_of_work:
+                CustomerRepository(self.session, unit_of_work=unit_of_work).store(CustomerFactory.build())
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+
+        self.assertIsNone(self.repository.find("Customer Name"), "Customer should have been rolled back")
+
+    @alembic_attr(minimum_revision="1c4e9a2f7d05")
+    def test_insert_many(self):
+        queries = self._count_queries()
+        self.repository.insert_many(self._build_customers_with_contacts(3))
+        self.assertEquals(9, len(queries), "Customers should be inserted with one query per table")
+
+        customers = self.repository.find_many(["Customer 0", "Customer 1", "Customer 2"])
+        self.assertEquals([(1, [(True, "+61400000000"), (False, "+61400000000")])],
+                          self._use_all_details(customers["Customer 2"]), "Customer details not inserted correctly")
+        self.assertEquals(["SALES", "ACCOUNTS"], [contact.firstname for contact in customers["Customer 2"].contacts])
+
+    @alembic_attr(minimum_revision="1c4e9a2f7d05")
+    def test_insert_many_after_store(self):
+        self.repository.store(self._build_customers_with_contacts(1)[0])
+        self.repository.insert_many(self._build_customers_with_contacts(2, start=1))
+
+        customers = self.repository.find_many(["Customer 0", "Customer 1", "Customer 2"])
+        self.assertEquals(3, len(customers))
+        self.assertEquals(6, len(set(contact.id for customer in customers.values() for contact in customer.contacts)),
+                          "Inserted contacts should not clash with stored ones")
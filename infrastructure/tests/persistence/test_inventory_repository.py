@@ -0,0 +1,215 @@
+from nose.tools import raises
+from sqlalchemy import event, select
+from nose_alembic_attrib import alembic_attr
+
+from domain.shared.concurrency import ConcurrencyConflictError
+
+from domain.tests.factories.inventory import InventoryItemFactory
+
+from infrastructure.tests.persistence import PersistenceTestCase
+from infrastructure.persistence.inventory_repository import InventoryRepository
+from infrastructure.persistence.models import inventory_state_item
+from infrastructure.persistence.unit_of_work import UnitOfWork
+
+
+class InventoryRepositoryTestCase(PersistenceTestCase):
+    def setUp(self):
+        super(InventoryRepositoryTestCase, self).setUp()
+        self.repository = InventoryRepository(self.session)
+
+        self.queries = []
+        event.listen(self.connection, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: self.queries.append(statement))
+
+    def _stocked_item(self, sku):
+        item = InventoryItemFactory.build(sku=sku, on_hand_buffer=1)
+        item.enter_stock_on_hand(5)
+        item.purchase_item(4, "PO001")
+        item.purchase_item(2, "PO002")
+
+        item.commit(3, "ORD001")
+        item.commit(4, "ORD002")
+        item.fulfill_commitment(1, "ORD001", "INV001")
+        item.deliver_purchase_order(3, "PO001")
+        item.verify_stock_level(3)
+        return item
+
+    @alembic_attr(minimum_revision="2f1e5c7a9b3d")
+    def test_store_inventory_item(self):
+        item = self._stocked_item("PROD001")
+        self.repository.store(item)
+
+        i = self.repository.find("PROD001")
+        self.assertIsNotNone(i)
+        self.assertEquals(1, i.on_hand_buffer, "On hand buffer was not stored")
+
+        for name, state in item.tracker.states.iteritems():
+            self.assertEquals(state.quantity(), i.tracker.state(name).quantity(),
+                              "Stored {0} has the wrong quantity".format(name))
+
+        for order_id in ("ORD001", "ORD002"):
+            self.assertEquals(item.find_committed_for_order(order_id), i.find_committed_for_order(order_id),
+                              "Stored commitment for {0} is wrong".format(order_id))
+            self.assertEquals(item.find_backorder_for_order(order_id), i.find_backorder_for_order(order_id),
+                              "Stored backorder for {0} is wrong".format(order_id))
+        self.assertEquals(item.find_fulfillment_for_invoice("INV001"), i.find_fulfillment_for_invoice("INV001"),
+                          "Stored fulfillment is wrong")
+        self.assertEquals(item.find_purchase_order("PO002"), i.find_purchase_order("PO002"),
+                          "Stored purchase order is wrong")
+
+    @alembic_attr(minimum_revision="2f1e5c7a9b3d")
+    def test_store_replaces_inventory_item(self):
+        item = self._stocked_item("PROD001")
+        self.repository.store(item)
+
+        item.cancel_purchase_order("PO002")
+        self.repository.store(item)
+
+        i = self.repository.find("PROD001")
+        self.assertIsNone(i.find_purchase_order("PO002"), "Cancelled purchase order should not be stored")
+        self.assertEquals(item.quantity_purchased(), i.quantity_purchased(), "Purchase orders were stored twice")
+        self.assertEquals(item.quantity_committed(), i.quantity_committed(), "Commitments were stored twice")
+
+    @alembic_attr(minimum_revision="51d7b3e2c8a4")
+    def test_store_only_changed_rows(self):
+        self.repository.store(self._stocked_item("PROD001"))
+        item = self.repository.find("PROD001")
+
+        def stored_rows():
+            query = select([inventory_state_item.c.id, inventory_state_item.c.state]) \
+                .where(inventory_state_item.c.sku == "PROD001")
+            return dict((row.id, row.state) for row in self.session.execute(query))
+
+        before = stored_rows()
+        item.fulfill_commitment(1, "ORD002", "INV002")
+        self.repository.store(item)
+        after = stored_rows()
+
+        self.assertEquals(["Committed"], [before[row] for row in set(before) - set(after)],
+                          "Only the fulfilled commitment's row should have been deleted")
+        self.assertEquals(["Fulfilled"], [after[row] for row in set(after) - set(before)],
+                          "Only the new fulfillment's row should have been inserted")
+
+        i = self.repository.find("PROD001")
+        self.assertEquals(item.find_committed_for_order("ORD002"), i.find_committed_for_order("ORD002"),
+                          "Changed commitment was not stored")
+        self.assertEquals(item.quantity_fulfilled(), i.quantity_fulfilled(), "Fulfillments were not stored")
+
+    @alembic_attr(minimum_revision="2f1e5c7a9b3d")
+    def test_find_missing_inventory_item(self):
+        self.assertIsNone(self.repository.find("PRODXXX"))
+
+    @alembic_attr(minimum_revision="2f1e5c7a9b3d")
+    def test_find_many(self):
+        stored = {}
+        for sku in ("PROD001", "PROD002", "PROD003"):
+            stored[sku] = self._stocked_item(sku)
+            self.repository.store(stored[sku])
+
+        del self.queries[:]
+        items = self.repository.find_many(["PROD001", "PROD002", "PROD003", "PRODXXX", "PROD001"])
+
+        self.assertEquals(["PROD001", "PROD002", "PROD003"], sorted(items.keys()), "Wrong inventory items found")
+        self.assertEquals(2, len(self.queries), "Inventory items should be loaded in 2 queries")
+        for sku, item in items.iteritems():
+            self.assertEquals(sku, item.sku)
+            self.assertEquals(stored[sku].quantity_committed(), item.quantity_committed(),
+                              "{0} has the wrong committed quantity".format(sku))
+
+    @alembic_attr(minimum_revision="2f1e5c7a9b3d")
+    def test_find_many_in_chunks(self):
+        for sku in ("PROD001", "PROD002", "PROD003"):
+            self.repository.store(self._stocked_item(sku))
+
+        self.repository.chunk_size = 2
+        del self.queries[:]
+        items = self.repository.find_many(["PROD001", "PROD002", "PROD003"])
+
+        self.assertEquals(3, len(items), "Wrong number of inventory items found")
+        self.assertEquals(4, len(self.queries), "Each chunk of SKUs should be loaded in 2 queries")
+
+    @alembic_attr(minimum_revision="51d7b3e2c8a4")
+    def test_store_version(self):
+        item = self._stocked_item("PROD001")
+        self.repository.store(item)
+
+        i = self.repository.find("PROD001")
+        self.assertEquals(item.version, i.version, "Version was not stored")
+
+        i.commit(1, "ORD003")
+        self.assertEquals(item.version + 1, i.version, "Commit should increment the version")
+        self.repository.store(i)
+        self.assertEquals(i.version, self.repository.find("PROD001").version, "Version was not updated")
+
+    @alembic_attr(minimum_revision="51d7b3e2c8a4")
+    @raises(ConcurrencyConflictError)
+    def test_store_conflict(self):
+        self.repository.store(self._stocked_item("PROD001"))
+
+        first = self.repository.find("PROD001")
+        second = self.repository.find("PROD001")
+
+        first.commit(1, "ORD003")
+        self.repository.store(first)
+
+        second.commit(1, "ORD004")
+        self.repository.store(second)
+
+    @alembic_attr(minimum_revision="51d7b3e2c8a4")
+    @raises(ConcurrencyConflictError)
+    def test_store_new_conflict(self):
+        self.repository.store(self._stocked_item("PROD001"))
+        self.repository.store(self._stocked_item("PROD001"))
+
+    @alembic_attr(minimum_revision="51d7b3e2c8a4")
+    def test_store_conflict_in_unit_of_work(self):
+        for sku in ("PROD001", "PROD002"):
+            self.repository.store(self._stocked_item(sku))
+        stale = self.repository.find("PROD002")
+        changed = self.repository.find("PROD002")
+        changed.commit(1, "ORD003")
+        self.repository.store(changed)
+
+        with UnitOfWork(self.session) as unit_of_work:
+            repository = InventoryRepository(self.session, unit_of_work=unit_of_work)
+            first = repository.find("PROD001")
+            first.commit(1, "ORD004")
+            repository.store(first)
+
+            stale.commit(1, "ORD005")
+            with self.assertRaises(ConcurrencyConflictError):
+                repository.store(stale)
+
+            retried = repository.find("PROD002")
+            retried.commit(1, "ORD005")
+            repository.store(retried)
+
+            # Stored again before it was committed
+            first.commit(1, "ORD006")
+            repository.store(first)
+            self.assertEquals(first.version - 2, first.persisted_version,
+                              "Version should only be persisted once committed")
+
+        self.assertEquals(first.version, first.persisted_version, "Committed version was not persisted")
+        items = self.repository.find_many(["PROD001", "PROD002"])
+        self.assertEquals(first.version, items["PROD001"].version, "Store before the conflict was rolled back")
+        self.assertEquals(first.quantity_committed(), items["PROD001"].quantity_committed(),
+                          "Store before the conflict was rolled back")
+        self.assertEquals(retried.quantity_committed(), items["PROD002"].quantity_committed(),
+                          "Retried store was not committed")
+
+    @alembic_attr(minimum_revision="51d7b3e2c8a4")
+    def test_unit_of_work_rolled_back_keeps_version(self):
+        self.repository.store(self._stocked_item("PROD001"))
+        item = self.repository.find("PROD001")
+        version = item.version
+
+        try:
+            with UnitOfWork(self.session) as unit_of_work:
+                item.commit(1, "ORD003")
+                InventoryRepository(self.session, unit_of_work=unit_of_work).store(item)
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+
+        self.assertEquals(version, item.persisted_version, "Rolled back version should not be persisted")
@@ -0,0 +1,66 @@
+from unittest import TestCase
+from mock import Mock
+from nose.tools import raises
+
+from infrastructure.persistence.unit_of_work import UnitOfWork
+
+
+class UnitOfWorkTestCase(TestCase):
+    def setUp(self):
+        self.session = Mock()
+
+    def test_commits_in_batches(self):
+        with UnitOfWork(self.session, batch_size=3) as unit_of_work:
+            for _ in xrange(7):
+                unit_of_work.stored()
+            self.assertEquals(2, self.session.commit.call_count, "Only complete batches should be committed")
+
+        self.assertEquals(3, self.session.commit.call_count, "Remaining stores should be committed at the end")
+        self.assertEquals(3, unit_of_work.commits)
+
+    def test_stored_many_at_once(self):
+        unit_of_work = UnitOfWork(self.session, batch_size=10)
+        unit_of_work.stored(25)
+
+        self.assertEquals(1, self.session.commit.call_count)
+        self.assertEquals(0, unit_of_work.pending)
+
+    def test_nothing_to_commit(self):
+        with UnitOfWork(self.session):
+            pass
+
+        self.assertFalse(self.session.commit.called, "Nothing was stored so nothing should be committed")
+
+    def test_rolled_back_on_error(self):
+        try:
+            with UnitOfWork(self.session) as unit_of_work:
+                unit_of_work.stored()
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+
+        self.assertTrue(self.session.rollback.called)
+        self.assertFalse(self.session.commit.called)
+        self.assertEquals(0, unit_of_work.pending)
+
+    def test_callbacks(self):
+        on_commit = Mock()
+        on_rollback = Mock()
+        unit_of_work = UnitOfWork(self.session, batch_size=3)
+
+        unit_of_work.stored(on_commit=on_commit, on_rollback=on_rollback)
+        unit_of_work.stored(on_commit=on_commit, on_rollback=on_rollback)
+        self.assertFalse(on_commit.called, "Nothing has been committed yet")
+
+        unit_of_work.stored()
+        self.assertEquals(1, on_commit.call_count, "Callbacks should be called once per commit")
+        self.assertFalse(on_rollback.called)
+
+        unit_of_work.stored(on_commit=on_commit, on_rollback=on_rollback)
+        unit_of_work.rollback()
+        self.assertEquals(1, on_commit.call_count, "Rolled back stores should not be committed")
+        self.assertEquals(1, on_rollback.call_count)
+
+    @raises(ValueError)
+    def test_invalid_batch_size(self):
+        UnitOfWork(self.session, batch_size=0)